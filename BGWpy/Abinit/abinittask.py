@@ -43,6 +43,9 @@ class AbinitTask(DFTTask, IOTask):
             as a fraction of the smallest division along that direction.
         qshift : list(3), float, optional
             Absolute shift of the k-points grid along each direction.
+        kpt_range : (int, int), optional
+            Keep only the k-points with indices in range(start, stop),
+            e.g. to compute a grid by chunks.
         input_variables : dict
             Any other input variables for the Abinit input file.
 
@@ -68,10 +71,13 @@ class AbinitTask(DFTTask, IOTask):
         nsym = len(symrel)
         if not kwargs.get('symkpt', True):
             kpt, wtk = self.kgridtask.get_kpt_grid_nosym()
+        if kwargs.get('kpt_range') is not None:
+            start, stop = kwargs['kpt_range']
+            kpt, wtk = kpt[start:stop], wtk[start:stop]
 
         # Transpose all symmetry matrices
         symrel = np.linalg.inv(symrel.reshape((-1,3,3)).transpose((0,2,1)))
-        symrel = np.array(symrel, dtype=np.int)
+        symrel = np.array(symrel, dtype=int)
 
         # A 2pi factor is added to tnons by kgrid for phase factor calculations
         tnons = np.round(tnons / (2*np.pi),5)
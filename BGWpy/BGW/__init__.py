@@ -7,14 +7,22 @@ from . import bgwtask
 # Public
 from .kgrid import *
 from .epsilontask import *
+from .epsmatmergetask import *
 from .sigmatask import *
+from .sigmamergetask import *
 from .kerneltask import *
 from .absorptiontask import *
 from .vmtxeltask import *
 
 from .inteqptask import *
+from .wfnmergetask import *
+from .parabandstask import *
+from .costestimator import *
 
-__all__ = (epsilontask.__all__ + sigmatask.__all__ +
+__all__ = (epsilontask.__all__ + epsmatmergetask.__all__ +
+           sigmatask.__all__ + sigmamergetask.__all__ +
            kerneltask.__all__ + absorptiontask.__all__  +
-           kgrid.__all__ + inteqptask.__all__ + vmtxeltask.__all__)
+           kgrid.__all__ + inteqptask.__all__ + vmtxeltask.__all__ +
+           wfnmergetask.__all__ + parabandstask.__all__ +
+           costestimator.__all__)
 
@@ -1,4 +1,8 @@
 from __future__ import print_function
+import os
+
+import numpy as np
+
 from ..config import flavors
 from ..core import MPITask, IOTask
 
@@ -10,4 +14,45 @@ class BGWTask(MPITask, IOTask):
     _TAG_JOB_COMPLETED = 'TOTAL'
     _use_hdf5 = flavors['use_hdf5']
     _flavor_complex = flavors['flavor_complex']
+    _RESTART_DIRNAME = 'restart_{:02}'
+
+    def get_restart_dirnames(self):
+        """
+        Return the directories in which the partial outputs
+        of the previous runs were kept for a restart, in order.
+        """
+        dirnames = list()
+        while True:
+            dirname = os.path.join(
+                self.dirname, self._RESTART_DIRNAME.format(len(dirnames) + 1))
+            if not os.path.isdir(dirname):
+                break
+            dirnames.append(dirname)
+        return dirnames
+
+    def _make_restart_dirname(self):
+        """Create and return the directory for the outputs of the last run."""
+        dirname = os.path.join(self.dirname, self._RESTART_DIRNAME.format(
+                               len(self.get_restart_dirnames()) + 1))
+        os.makedirs(dirname)
+        return dirname
+
+    def _set_restart_lines(self, lines):
+        """
+        Set the commands that merge the partial outputs,
+        executed at the end of the runscript.
+        """
+        for line in getattr(self, '_restart_lines', []):
+            self.runscript.main.remove(line)
+        self._restart_lines = list(lines)
+        self.runscript.extend(self._restart_lines)
 
+    @staticmethod
+    def _get_remaining_points(points, completed, tol=1e-5):
+        """Return the points that are not among the completed ones."""
+        completed = np.asarray(completed, dtype=float).reshape((-1, 3))
+        remaining = list()
+        for point in np.asarray(points, dtype=float).reshape((-1, 3)):
+            if not np.any(np.all(np.abs(completed - point) < tol, axis=1)):
+                remaining.append(point)
+        return np.array(remaining, dtype=float).reshape((-1, 3))
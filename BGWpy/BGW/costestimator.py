@@ -0,0 +1,557 @@
+"""Estimates of the cost of the BerkeleyGW calculations."""
+from __future__ import print_function
+import os
+import re
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import flavors
+from .kgrid import KgridTask
+from .epsilontask import EpsilonTask
+from .sigmatask import SigmaTask
+from .kerneltask import KernelTask
+from .absorptiontask import AbsorptionTask
+
+# Public
+__all__ = ['CostEstimator', 'get_number_of_gvectors',
+           'get_number_of_valence_electrons']
+
+# Bohr radius, in angstrom
+_bohr_to_ang = 0.52917721067
+
+
+def get_number_of_gvectors(volume, ecut):
+    """
+    Return the number of G-vectors within a kinetic energy cutoff,
+    that is, with |G|^2 < ecut, for a unit cell of a given volume.
+
+    Arguments
+    ---------
+
+    volume : float
+        Volume of the unit cell, in bohr^3.
+    ecut : float
+        Energy cutoff, in Ry.
+    """
+    return int(round(volume * ecut ** 1.5 / (6 * np.pi ** 2)))
+
+
+def get_number_of_valence_electrons(structure, pseudos, pseudo_dir=''):
+    """
+    Return the number of valence electrons of the unit cell,
+    from the valence charge of the pseudopotentials.
+
+    Arguments
+    ---------
+
+    structure : pymatgen.Structure
+        Structure object containing information on the unit cell.
+    pseudos : list, str
+        Pseudopotential files, one for each species,
+        in the order of their first appearance in the structure.
+        Both the UPF and the Abinit formats are read.
+
+    Keyword arguments
+    -----------------
+
+    pseudo_dir : str ('')
+        Directory in which pseudopotential files are found.
+    """
+    if isinstance(pseudos, str):
+        pseudos = [pseudos]
+    species = sorted(set(structure.species), key=structure.species.index)
+    if len(pseudos) != len(species):
+        raise ValueError('Expected {} pseudopotentials, got {}.'.format(
+                        len(species), len(pseudos)))
+
+    zion = dict()
+    for specie, pseudo in zip(species, pseudos):
+        zion[specie] = _read_valence_charge(os.path.join(pseudo_dir, pseudo))
+
+    return sum(zion[specie] for specie in structure.species)
+
+
+def _read_valence_charge(fname):
+    """Return the valence charge of a UPF or Abinit pseudopotential file."""
+    with open(fname, 'rb') as f:
+        lines = f.read().decode('latin-1').splitlines()
+
+    for line in lines:
+        # UPF version 2
+        match = re.search(r'z_valence\s*=\s*"\s*([^"\s]+)', line, re.I)
+        if match:
+            return float(match.group(1).replace('D', 'E').replace('d', 'e'))
+        # UPF version 1
+        if 'z valence' in line.lower():
+            return float(line.split()[0])
+
+    # Abinit: zatom, zion, pspdat on the second line
+    if len(lines) > 1 and 'zion' in lines[1]:
+        return float(lines[1].split()[1])
+
+    raise ValueError('Could not read the valence charge of {}.'.format(fname))
+
+
+class CostEstimator(object):
+    """
+    Estimates of the floating point operations, memory and disk
+    of the epsilon, sigma, kernel and absorption calculations,
+    from the leading terms of their scaling laws.
+
+    The number of G-vectors within each cutoff is obtained
+    from the volume of the unit cell. The matrix elements are computed
+    with FFTs on a box containing the sphere of the density cutoff
+    (four times the wavefunctions cutoff).
+
+    Each estimate is multiplied by a constant, which may be calibrated
+    against the measured wall time or memory of a previous run.
+    The estimates are indicative only: they do not account
+    for the parallel efficiency, the communications or the I/O.
+    """
+
+    default_constants = OrderedDict([
+        ('flops_per_second', 1e9),
+        ('epsilon_flops', 1.),
+        ('epsilon_memory', 1.),
+        ('epsilon_disk', 1.),
+        ('sigma_flops', 1.),
+        ('sigma_memory', 1.),
+        ('sigma_disk', 1.),
+        ('kernel_flops', 1.),
+        ('kernel_memory', 1.),
+        ('kernel_disk', 1.),
+        ('absorption_flops', 1.),
+        ('absorption_memory', 1.),
+        ('absorption_disk', 1.),
+        ])
+
+    _stages = ('epsilon', 'sigma', 'kernel', 'absorption')
+
+    def __init__(self, structure, ecutwfc, constants=None):
+        """
+        Arguments
+        ---------
+
+        structure : pymatgen.Structure
+            Structure object containing information on the unit cell.
+        ecutwfc : float
+            Energy cutoff for the wavefunctions, in Ry.
+
+        Keyword arguments
+        -----------------
+
+        constants : dict, optional
+            Values overriding the default_constants:
+                flops_per_second : float (1e9)
+                    Floating point operations per second of a single core.
+                <stage>_flops, <stage>_memory, <stage>_disk : float (1.)
+                    Prefactors of the estimates of each stage.
+
+        Properties
+        ----------
+
+        volume : float
+            Volume of the unit cell, in bohr^3.
+        bytes_per_number : int
+            Size of a matrix element, complex or real
+            according to the flavor.
+
+        """
+        self.structure = structure
+        self.ecutwfc = ecutwfc
+        self.constants = OrderedDict(self.default_constants)
+        self.constants.update(constants or {})
+        self.bytes_per_number = 16 if flavors['flavor_complex'] else 8
+
+    @property
+    def volume(self):
+        return self.structure.lattice.volume / _bohr_to_ang ** 3
+
+    def get_ngvectors(self, ecut):
+        """Return the number of G-vectors within a cutoff, in Ry."""
+        return get_number_of_gvectors(self.volume, ecut)
+
+    @property
+    def ng_wfn(self):
+        """Number of G-vectors of the wavefunctions."""
+        return self.get_ngvectors(self.ecutwfc)
+
+    @property
+    def nfft(self):
+        """Number of points of the FFT box."""
+        return int(self.get_ngvectors(4 * self.ecutwfc) * 6 / np.pi)
+
+    @property
+    def _fft_flops(self):
+        """Floating point operations of a single FFT."""
+        return 5 * self.nfft * np.log2(max(self.nfft, 2))
+
+    def get_nkpt(self, ngkpt, **kwargs):
+        """
+        Return the number of irreducible k-points of a grid,
+        and the number of k-points in the full Brillouin zone.
+        Keyword arguments are passed to KgridTask.
+        """
+        kgridtask = KgridTask(structure=self.structure, ngkpt=ngkpt, **kwargs)
+        kpts, wtks = kgridtask.get_kpoints()
+        return len(kpts), int(np.prod(ngkpt))
+
+    def _make_estimate(self, stage, flops, memory, disk, nproc):
+        flops *= self.constants[stage + '_flops']
+        estimate = OrderedDict()
+        estimate['flops'] = flops
+        estimate['walltime'] = flops / (self.constants['flops_per_second']
+                                        * nproc)
+        estimate['memory'] = memory * self.constants[stage + '_memory']
+        estimate['disk'] = disk * self.constants[stage + '_disk']
+        return estimate
+
+    def estimate_epsilon(self, ecuteps, nbnd, nq, nkpt, nbnd_occ=None,
+                         nfreq=1, nproc=1):
+        """
+        Estimate the cost of an epsilon calculation.
+
+        Arguments
+        ---------
+
+        ecuteps : float
+            Energy cutoff for the dielectric function, in Ry.
+        nbnd : int
+            Number of bands summed over.
+        nq : int
+            Number of q-points, including the one used to treat Gamma.
+        nkpt : int
+            Number of k-points in the full Brillouin zone.
+
+        Keyword arguments
+        -----------------
+
+        nbnd_occ : int, optional
+            Number of occupied bands. Defaults to nbnd / 2,
+            which maximizes the number of transitions.
+        nfreq : int (1)
+            Number of frequencies.
+        nproc : int (1)
+            Number of MPI processes.
+
+        Returns
+        -------
+
+        estimate : OrderedDict
+            flops : float
+                Number of floating point operations.
+            walltime : float
+                Wall time, in seconds.
+            memory : float
+                Memory per process, in bytes.
+            disk : float
+                Size of the files written, in bytes.
+        """
+        ng_eps = self.get_ngvectors(ecuteps)
+        nv = nbnd_occ or nbnd // 2
+        nc = max(nbnd - nv, 0)
+        b = self.bytes_per_number
+
+        # Matrix elements, sum over transitions and inversion.
+        ntrans = nq * nkpt * nv * nc
+        flops = (ntrans * (2 * self._fft_flops + 8 * nfreq * ng_eps ** 2)
+                 + nq * nfreq * 8 * ng_eps ** 3)
+
+        memory = ((nfreq * ng_eps ** 2 + nkpt * nbnd * self.ng_wfn) * b / nproc
+                  + 2 * self.nfft * b)
+
+        disk = nq * nfreq * ng_eps ** 2 * b
+
+        return self._make_estimate('epsilon', flops, memory, disk, nproc)
+
+    def estimate_sigma(self, ecuteps, nbnd, nbnd_sigma, nkpt_sigma, nq,
+                       nfreq=1, nproc=1):
+        """
+        Estimate the cost of a sigma calculation.
+
+        Arguments
+        ---------
+
+        ecuteps : float
+            Energy cutoff for the screened Coulomb interaction, in Ry.
+        nbnd : int
+            Number of bands summed over.
+        nbnd_sigma : int
+            Number of bands with GW corrections.
+        nkpt_sigma : int
+            Number of k-points with GW corrections.
+        nq : int
+            Number of q-points in the full Brillouin zone.
+
+        Keyword arguments
+        -----------------
+
+        nfreq : int (1)
+            Number of frequencies of the dielectric matrix.
+        nproc : int (1)
+            Number of MPI processes.
+
+        Returns
+        -------
+
+        estimate : OrderedDict
+            See estimate_epsilon.
+        """
+        ng_eps = self.get_ngvectors(ecuteps)
+        b = self.bytes_per_number
+
+        nelements = nkpt_sigma * nbnd_sigma * nq * nbnd
+        flops = nelements * (self._fft_flops + 8 * nfreq * ng_eps ** 2)
+
+        memory = ((nfreq * ng_eps ** 2 + nq * nbnd * self.ng_wfn) * b / nproc
+                  + 2 * self.nfft * b)
+
+        # sigma_hp.log, eqp0.dat and eqp1.dat
+        disk = nkpt_sigma * nbnd_sigma * 300
+
+        return self._make_estimate('sigma', flops, memory, disk, nproc)
+
+    def estimate_kernel(self, ecuteps, nkpt, nbnd_val, nbnd_cond, nproc=1):
+        """
+        Estimate the cost of a kernel calculation.
+
+        Arguments
+        ---------
+
+        ecuteps : float
+            Energy cutoff for the screened Coulomb interaction, in Ry.
+        nkpt : int
+            Number of k-points in the full Brillouin zone.
+        nbnd_val : int
+            Number of valence bands.
+        nbnd_cond : int
+            Number of conduction bands.
+
+        Keyword arguments
+        -----------------
+
+        nproc : int (1)
+            Number of MPI processes.
+
+        Returns
+        -------
+
+        estimate : OrderedDict
+            See estimate_epsilon.
+        """
+        ng_eps = self.get_ngvectors(ecuteps)
+        nv, nc = nbnd_val, nbnd_cond
+        b = self.bytes_per_number
+
+        # Matrix elements, screening of the direct term
+        # and contraction of the direct and exchange terms.
+        npair = nkpt ** 2
+        flops = npair * ((nv ** 2 + nc ** 2 + nv * nc) * self._fft_flops
+                         + 8 * (nv ** 2 + nc ** 2) * ng_eps ** 2
+                         + 2 * 8 * nv ** 2 * nc ** 2 * ng_eps)
+
+        memory = ((ng_eps ** 2 + nkpt * (nv + nc) * self.ng_wfn) * b / nproc
+                  + 2 * self.nfft * b)
+
+        # Head, wings, body and exchange blocks of bsemat.
+        disk = 4 * npair * (nv * nc) ** 2 * b
+
+        return self._make_estimate('kernel', flops, memory, disk, nproc)
+
+    def estimate_absorption(self, nkpt_fine, nbnd_val_fine, nbnd_cond_fine,
+                            nkpt, nbnd_val, nbnd_cond, nproc=1):
+        """
+        Estimate the cost of an absorption calculation,
+        with the full diagonalization of the BSE Hamiltonian.
+
+        Arguments
+        ---------
+
+        nkpt_fine : int
+            Number of k-points of the fine grid in the full Brillouin zone.
+        nbnd_val_fine : int
+            Number of valence bands on the fine grid.
+        nbnd_cond_fine : int
+            Number of conduction bands on the fine grid.
+        nkpt : int
+            Number of k-points of the coarse grid in the full Brillouin zone.
+        nbnd_val : int
+            Number of valence bands on the coarse grid.
+        nbnd_cond : int
+            Number of conduction bands on the coarse grid.
+
+        Keyword arguments
+        -----------------
+
+        nproc : int (1)
+            Number of MPI processes.
+
+        Returns
+        -------
+
+        estimate : OrderedDict
+            See estimate_epsilon.
+        """
+        b = self.bytes_per_number
+        nhamiltonian = nkpt_fine * nbnd_val_fine * nbnd_cond_fine
+        ncoarse = nbnd_val * nbnd_cond
+
+        # Interpolation of the kernel and diagonalization.
+        flops = (8 * nhamiltonian ** 2 * ncoarse
+                 + 8 * 4. / 3. * nhamiltonian ** 3)
+
+        memory = ((2 * nhamiltonian ** 2 + 4 * (nkpt * ncoarse) ** 2) * b
+                  / nproc)
+
+        # Eigenvectors
+        disk = nhamiltonian ** 2 * b
+
+        return self._make_estimate('absorption', flops, memory, disk, nproc)
+
+    def estimate(self, stage, **kwargs):
+        """
+        Estimate the cost of a stage: 'epsilon', 'sigma',
+        'kernel' or 'absorption'. Keyword arguments are passed
+        to the corresponding estimate function.
+        """
+        if stage not in self._stages:
+            raise Exception('Unknown stage: {}. Available stages: {}.'
+                            .format(stage, self._stages))
+        return getattr(self, 'estimate_' + stage)(**kwargs)
+
+    def estimate_task(self, task, nbnd, nkpt, ecuteps=None, nkpt_fine=None,
+                      nbnd_occ=None):
+        """
+        Estimate the cost of an EpsilonTask, SigmaTask, KernelTask
+        or AbsorptionTask, from its input and its number of processes.
+
+        Arguments
+        ---------
+
+        task : Task
+            The task.
+        nbnd : int
+            Number of bands, unless set by the variable number_bands
+            of the input.
+        nkpt : int
+            Number of k-points of the (coarse) grid
+            in the full Brillouin zone, which is also the number
+            of q-points.
+
+        Keyword arguments
+        -----------------
+
+        ecuteps : float, optional
+            Energy cutoff for the screened Coulomb interaction, in Ry,
+            unless set by the variable epsilon_cutoff
+            or screened_coulomb_cutoff of the input.
+        nkpt_fine : int, optional
+            Number of k-points of the fine grid
+            in the full Brillouin zone, for absorption.
+        nbnd_occ : int, optional
+            Number of occupied bands, for epsilon.
+
+        Returns
+        -------
+
+        estimate : OrderedDict
+            See estimate_epsilon, or None for the other tasks.
+        """
+        if not hasattr(task, 'input'):
+            return None
+
+        variables = task.input.variables
+        kwargs = dict(nproc=int(getattr(task, 'nproc', 1) or 1))
+        for key in ('epsilon_cutoff', 'screened_coulomb_cutoff'):
+            if key in variables:
+                ecuteps = float(variables[key])
+        nbnd = int(variables.get('number_bands', nbnd))
+
+        if isinstance(task, EpsilonTask):
+            nq = len(np.reshape(task.input.qpts, (-1, 3)))
+            nq += task.input.q0 is not None
+            return self.estimate_epsilon(
+                ecuteps, nbnd, nq, nkpt, nbnd_occ=nbnd_occ,
+                nfreq=int(variables.get('number_frequencies', 1)), **kwargs)
+
+        elif isinstance(task, SigmaTask):
+            return self.estimate_sigma(
+                ecuteps, nbnd,
+                int(variables['band_index_max'])
+                - int(variables['band_index_min']) + 1,
+                len(np.reshape(task.input.kpts, (-1, 3))), nkpt,
+                nfreq=int(variables.get('number_frequencies', 1)), **kwargs)
+
+        elif isinstance(task, KernelTask):
+            return self.estimate_kernel(
+                ecuteps, nkpt, int(variables['number_val_bands']),
+                int(variables['number_cond_bands']), **kwargs)
+
+        elif isinstance(task, AbsorptionTask):
+            return self.estimate_absorption(
+                nkpt_fine or nkpt,
+                int(variables['number_val_bands_fine']),
+                int(variables['number_cond_bands_fine']),
+                nkpt,
+                int(variables['number_val_bands_coarse']),
+                int(variables['number_cond_bands_coarse']), **kwargs)
+
+        return None
+
+    def calibrate(self, stage, walltime=None, memory=None, **kwargs):
+        """
+        Set the prefactors of a stage so that its estimates match
+        the wall time and the memory per process measured for a run.
+        Keyword arguments are the parameters of that run,
+        passed to the corresponding estimate function.
+        Return the prefactors.
+        """
+        prefactors = OrderedDict()
+        for key, measured in (('flops', walltime), ('memory', memory)):
+            if measured is None:
+                continue
+            name = '{}_{}'.format(stage, key)
+            self.constants[name] = 1.
+            key = 'walltime' if key == 'flops' else key
+            estimated = self.estimate(stage, **kwargs)[key]
+            self.constants[name] = measured / estimated
+            prefactors[name] = self.constants[name]
+        return prefactors
+
+    @staticmethod
+    def format_estimates(estimates):
+        """
+        Return a table of the estimates of several stages,
+        given as a dictionary.
+        """
+        lines = ['{:<12} {:>12} {:>14} {:>14} {:>14}'.format(
+                 'Stage', 'GFLOP', 'Wall time (s)', 'Memory (GB)',
+                 'Disk (GB)')]
+        for stage, estimate in estimates.items():
+            lines.append('{:<12} {:>12.4g} {:>14.4g} {:>14.4g} {:>14.4g}'.format(
+                         stage, estimate['flops'] / 1e9, estimate['walltime'],
+                         estimate['memory'] / 1e9, estimate['disk'] / 1e9))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def check_estimates(estimates, max_memory=None, max_walltime=None):
+        """
+        Issue a warning for each estimate, given as a dictionary,
+        whose memory per process or wall time exceeds a limit.
+        Return True if all estimates are within the limits.
+        """
+        within_limits = True
+        for name, estimate in estimates.items():
+            for key, limit, unit, scale in (
+                ('memory', max_memory, 'GB', 1e9),
+                ('walltime', max_walltime, 's', 1.)):
+                if limit is None or estimate[key] <= limit:
+                    continue
+                within_limits = False
+                warnings.warn('{}: estimated {} of {:.4g} {} exceeds '
+                              'the limit of {:.4g} {}.'.format(
+                              name, key, estimate[key] / scale, unit,
+                              limit / scale, unit))
+        return within_limits
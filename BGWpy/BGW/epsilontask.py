@@ -1,8 +1,11 @@
 from __future__ import print_function
 import os
 
+import numpy as np
+
 from .bgwtask import BGWTask
 from .kgrid   import KgridTask, get_kpt_grid
+from ..extractors.epsmat import EpsmatFile
 from .inputs  import EpsilonInput
 
 # Public
@@ -15,6 +18,7 @@ class EpsilonTask(BGWTask):
     _TASK_NAME = 'Epsilon'
     _input_fname  = 'epsilon.inp'
     _output_fname = 'epsilon.out'
+    _merge_executable = 'BGWpy_merge_epsmat.py'
 
     def __init__(self, dirname, **kwargs):
         """
@@ -38,6 +42,14 @@ class EpsilonTask(BGWTask):
             in a GW calculation.
         qshift : list(3), float
             Q-point used to treat the Gamma point.
+        qpts : 2D list(nqpt,3), float, optional
+            List of q-points other than the one used to treat
+            the Gamma point. Defaults to the irreducible q-points
+            of the grid ngkpt, excluding Gamma.
+        with_q0 : bool (True)
+            Compute the dielectric matrix at the q-point qshift.
+            When False, only the q-points of qpts are computed,
+            and no eps0mat file is produced.
         ecuteps : float
             Energy cutoff for the dielectric function, in Ry.
         wfn_fname : str
@@ -48,6 +60,9 @@ class EpsilonTask(BGWTask):
             Any other lines that should appear in the input file.
         extra_variables : dict, optional
             Any other variables that should be declared in the input file.
+        restart : bool (False)
+            When written, compute only the q-points that were not
+            completed by an unfinished run. See prepare_restart.
 
 
         Properties
@@ -72,16 +87,26 @@ class EpsilonTask(BGWTask):
         #ngkpt = kwargs['ngkpt']
         #kpts_ush, wtks_ush = get_kpt_grid(structure, ngkpt)
         kgrid_kwargs = dict()
-        for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after'):
+        for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after',
+                    'kgrid_backend'):
             if key in kwargs:
                 kgrid_kwargs[key] = kwargs[key]
         self.kgridtask = KgridTask(dirname=dirname, **kgrid_kwargs)
 
-        symkpt = kwargs.get('symkpt', True)
-        if symkpt:
-            kpts_ush, wtks_ush = self.kgridtask.get_kpoints()
+        if 'qpts' in kwargs:
+            qpts = kwargs['qpts']
+        else:
+            symkpt = kwargs.get('symkpt', True)
+            if symkpt:
+                kpts_ush, wtks_ush = self.kgridtask.get_kpoints()
+            else:
+                kpts_ush, wtks_ush = self.kgridtask.get_kpt_grid_nosym()
+            qpts = kpts_ush[1:]
+
+        if kwargs.get('with_q0', True):
+            q0 = kwargs['qshift']
         else:
-            kpts_ush, wtks_ush = self.kgridtask.get_kpt_grid_nosym()
+            q0 = None
 
         extra_lines = kwargs.get('extra_lines',[])
         extra_variables = kwargs.get('extra_variables',{})
@@ -89,13 +114,15 @@ class EpsilonTask(BGWTask):
         # Input file
         self.input = EpsilonInput(
             kwargs['ecuteps'],
-            kwargs['qshift'],
-            kpts_ush[1:],
+            q0,
+            qpts,
             *extra_lines,
             **extra_variables)
 
         self.input.fname = self._input_fname
 
+        self.restart = kwargs.get('restart', False)
+
         # Set up the run script
         self.wfn_fname = kwargs['wfn_fname']
         self.wfnq_fname = kwargs['wfnq_fname']
@@ -123,6 +150,8 @@ class EpsilonTask(BGWTask):
         self.update_link(value, 'WFNq')
 
     def write(self):
+        if self.restart:
+            self.prepare_restart()
         super(EpsilonTask, self).write()
         with self.exec_from_dirname():
             self.input.write()
@@ -138,3 +167,100 @@ class EpsilonTask(BGWTask):
         basename = 'epsmat.h5' if self._use_hdf5 else 'epsmat'
         return os.path.join(self.dirname, basename)
     
+
+    def get_eps0mat(self):
+        """Open the eps0mat.h5 file produced. Return an EpsmatFile."""
+        return self._get_epsmat_file(self.eps0mat_fname)
+
+    def get_epsmat(self):
+        """Open the epsmat.h5 file produced. Return an EpsmatFile."""
+        return self._get_epsmat_file(self.epsmat_fname)
+
+    def _get_epsmat_file(self, fname):
+        if not self._use_hdf5:
+            raise Exception('Reading the dielectric matrix '
+                            'requires the hdf5 format.')
+        return EpsmatFile(fname)
+
+    def get_completed_qpoints(self):
+        """
+        Return the q-points whose dielectric matrix has been written,
+        by the last run or by the previous runs kept for a restart,
+        as array(nq, 3). The q-point qshift is included once eps0mat
+        is complete.
+        """
+        fnames = [self.eps0mat_fname, self.epsmat_fname]
+        fnames += [os.path.join(dirname, os.path.basename(self.epsmat_fname))
+                   for dirname in self.get_restart_dirnames()]
+        qpts = list()
+        for fname in fnames:
+            if not os.path.exists(fname):
+                continue
+            with self._get_epsmat_file(fname) as epsmat:
+                qpts.extend(epsmat.qpts[epsmat.qpt_done])
+        return np.array(qpts, dtype=float).reshape((-1, 3))
+
+    def prepare_restart(self):
+        """
+        Restrict the calculation to the q-points that were not completed
+        by an unfinished run, e.g. one that reached its wall-time limit.
+
+        The partial epsmat.h5 file and the output of the last run are moved
+        to a new directory restart_NN, and the completed q-points of every
+        partial file are merged with those of the new run at the end
+        of the runscript. The q-points of the merged file are thus
+        not in the order of the input file.
+
+        The task is left unchanged if it is completed,
+        if no q-point was completed, or if none remains.
+        Must be called before writing the task.
+
+        Returns
+        -------
+
+        nremaining : int
+            Number of q-points that remain to be computed,
+            including qshift.
+        """
+        if self.get_status() == self._STATUS_COMPLETED:
+            return 0
+
+        completed = self.get_completed_qpoints()
+        qpts = self._get_remaining_points(self.input.qpts, completed)
+        q0 = self.input.q0
+        if q0 is not None and not len(self._get_remaining_points(q0, completed)):
+            q0 = None
+
+        nremaining = len(qpts) + (q0 is not None)
+        if not len(completed) or not nremaining:
+            return nremaining
+
+        if any(os.path.exists(fname)
+               for fname in (self.epsmat_fname, self.output_fname)):
+            dirname = self._make_restart_dirname()
+            for fname in (self.epsmat_fname, self.output_fname):
+                if os.path.exists(fname):
+                    os.rename(fname, os.path.join(dirname,
+                                                  os.path.basename(fname)))
+
+        self.input.q0 = q0
+        self.input.qpts = qpts
+
+        basename = os.path.basename(self.epsmat_fname)
+        fnames = list()
+        for dirname in self.get_restart_dirnames():
+            if os.path.exists(os.path.join(dirname, basename)):
+                fnames.append(os.path.join(os.path.basename(dirname), basename))
+        if len(qpts):
+            fnames.append(basename)
+
+        lines = list()
+        if fnames:
+            self.runscript['EPSMAT_MERGE'] = self._merge_executable
+            lines.append("grep -q '{}' {} && $EPSMAT_MERGE --completed-only "
+                         "-o {} {}".format(self._TAG_JOB_COMPLETED,
+                                           self._output_fname, basename,
+                                           ' '.join(fnames)))
+        self._set_restart_lines(lines)
+
+        return nremaining
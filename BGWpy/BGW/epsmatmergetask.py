@@ -0,0 +1,105 @@
+from __future__ import print_function
+import os
+
+from ..core import Task
+
+# Public
+__all__ = ['EpsmatMergeTask']
+
+
+class EpsmatMergeTask(Task):
+    """
+    Merge of the epsmat.h5 files produced by several epsilon runs
+    over different q-points.
+    """
+
+    _TASK_NAME = 'EpsmatMerge'
+    _merge_executable = 'BGWpy_merge_epsmat.py'
+
+    def __init__(self, dirname, **kwargs):
+        """
+        Arguments
+        ---------
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+
+
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        epsmat_fnames : list of str
+            Paths to the epsmat.h5 files to merge.
+            The q-points of the merged file are ordered as these files.
+        eps0mat_fname : str, optional
+            Path to the eps0mat.h5 file, which is linked
+            next to the merged file.
+        merge_executable : str ('BGWpy_merge_epsmat.py')
+            Command called as 'merge_executable -o output inputs...'.
+            The script epsmat_hdf5_merge.py of BerkeleyGW
+            may be used as well.
+
+
+        Properties
+        ----------
+
+        eps0mat_fname : str
+            Path to the eps0mat.h5 file.
+        epsmat_fname : str
+            Path to the merged epsmat.h5 file.
+
+        """
+
+        super(EpsmatMergeTask, self).__init__(dirname, **kwargs)
+
+        epsmat_fnames = kwargs['epsmat_fnames']
+        basenames = list()
+        for i, fname in enumerate(epsmat_fnames):
+            basename = 'epsmat_{:03}.h5'.format(i + 1)
+            self.update_link(fname, basename)
+            basenames.append(basename)
+
+        self.eps0mat_input_fname = kwargs.get('eps0mat_fname')
+
+        self.runscript['EPSMAT_MERGE'] = kwargs.get('merge_executable',
+                                                    self._merge_executable)
+        self.runscript.append('$EPSMAT_MERGE -o epsmat.h5 {}'.format(
+                              ' '.join(basenames)))
+
+    @property
+    def eps0mat_input_fname(self):
+        return self._eps0mat_input_fname
+
+    @eps0mat_input_fname.setter
+    def eps0mat_input_fname(self, value):
+        self._eps0mat_input_fname = value
+        self.update_link(value, 'eps0mat.h5')
+
+    @property
+    def eps0mat_fname(self):
+        return os.path.join(self.dirname, 'eps0mat.h5')
+
+    @property
+    def epsmat_fname(self):
+        return os.path.join(self.dirname, 'epsmat.h5')
+
+    def get_status(self, check_time=False, check_fingerprint=False):
+        """
+        Return the status of the task. Possible status are:
+        Completed, Unstarted.
+        The merged file is renamed to its final name once complete.
+
+        Keyword arguments
+        -----------------
+
+        check_time : bool (False)
+            Consider the task as unstarted if the merged file is older
+            than the files to merge.
+        check_fingerprint : bool (False)
+            Consider the task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
+        """
+        return self._get_file_status(self.epsmat_fname, check_time=check_time,
+                                     check_fingerprint=check_fingerprint)
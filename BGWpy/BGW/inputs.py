@@ -4,6 +4,7 @@ from collections import OrderedDict
 import numpy as np
 
 from ..core import BasicInputFile
+from ..core.F90io import array_lines
 
 
 class EpsilonInput(BasicInputFile):
@@ -24,14 +25,14 @@ class EpsilonInput(BasicInputFile):
     def __str__(self):
 
         qpt_block = '\nbegin qpoints\n'
-        for q0i in self.q0:
-            qpt_block += ' {:11.8f}'.format(q0i)
-        qpt_block += ' 1.0 1\n'
-
-        for q in self.qpts:
-            for qi in q:
-                qpt_block += ' {:11.8f}'.format(qi)
-            qpt_block += ' 1.0 0\n'
+        if self.q0 is not None:
+            for q0i in self.q0:
+                qpt_block += ' {:11.8f}'.format(q0i)
+            qpt_block += ' 1.0 1\n'
+
+        qpt_block += ''.join(array_lines(
+            np.asarray(self.qpts, dtype=float).reshape((-1, 3)),
+            prefix=' ', fmt='%11.8f', suffix=' 1.0 0'))
         qpt_block += 'end\n'
 
         return super(EpsilonInput, self).__str__() + qpt_block
@@ -68,10 +69,9 @@ class SigmaInput(BasicInputFile):
         S = super(SigmaInput, self).__str__()
 
         kpt_block = '\nbegin kpoints\n'
-        for k in self.kpts:
-            for ki in k:
-                kpt_block += ' {:11.8f}'.format(ki)
-            kpt_block += ' 1.0\n'
+        kpt_block += ''.join(array_lines(
+            np.asarray(self.kpts, dtype=float).reshape((-1, 3)),
+            prefix=' ', fmt='%11.8f', suffix=' 1.0'))
         kpt_block += 'end\n'
 
         S += kpt_block
@@ -126,3 +126,20 @@ class AbsorptionInput(BasicInputFile):
         super(AbsorptionInput, self).__init__(all_variables, keywords)
 
 
+
+
+class ParabandsInput(BasicInputFile):
+
+    def __init__(self, nbnd, *keywords, **variables):
+
+        all_variables = OrderedDict([
+            ('input_wfn_file' , 'WFN_in'),
+            ('output_wfn_file' , 'WFN_out'),
+            ('vsc_file' , 'VSC'),
+            ('vkb_file' , 'VKB'),
+            ('number_bands' , nbnd),
+            ])
+
+        all_variables.update(variables)
+
+        super(ParabandsInput, self).__init__(all_variables, keywords)
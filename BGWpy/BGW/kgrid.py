@@ -1,12 +1,17 @@
 
 import os
+import json
+import hashlib
+import tempfile
+import warnings
 import subprocess
 import numpy as np
+from ..config import default_kgrid
 from ..core import fortran_str
 from ..core import Task
 
 __all__ = ['get_kpt_grid', 'get_kgrid_input', 'get_kpoints', 'get_kqshift',
-           'get_kpt_grid_nosym', 'KgridTask']
+           'get_kpt_grid_nosym', 'iter_kpt_grid_nosym', 'KgridTask']
 
 
 class KgridTask(Task):
@@ -22,6 +27,9 @@ class KgridTask(Task):
                  rootname='tmp.kgrid',
                  clean_after=True,
                  dirname='',
+                 use_cache=None,
+                 cache_dir=None,
+                 kgrid_backend=None,
                  **kwargs):
         """
         Arguments
@@ -41,6 +49,22 @@ class KgridTask(Task):
             Number of points along each direction of the fft grid.
         use_tr : bool
             Use time reversal symmetry.
+        use_cache : bool, optional
+            Store the k-points and symmetries computed by kgrid.x
+            and reuse them for identical structures and grids.
+            Defaults to the 'use_cache' option of the [kgrid] section
+            of the configuration file.
+        cache_dir : str, optional
+            Directory of the cache. Defaults to the 'cache_dir' option
+            of the [kgrid] section of the configuration file.
+        kgrid_backend : str ['kgrid.x', 'numpy'], optional
+            Program used to compute the irreducible k-points.
+            With 'numpy', the k-points and symmetries are computed
+            in-process, without executing kgrid.x.
+            The irreducible k-points may differ from those of kgrid.x
+            by a symmetry operation, but their weights are identical.
+            Defaults to the 'backend' option of the [kgrid] section
+            of the configuration file.
         """
 
         rootname = os.path.join(dirname, rootname)
@@ -58,6 +82,21 @@ class KgridTask(Task):
         self.fft = fft
         self.use_tr = use_tr
 
+        if use_cache is None:
+            use_cache = default_kgrid['use_cache']
+        if cache_dir is None:
+            cache_dir = default_kgrid['cache_dir']
+        self.use_cache = use_cache
+        self.cache_dir = os.path.expanduser(cache_dir)
+
+        if kgrid_backend is None:
+            kgrid_backend = default_kgrid['backend']
+        if kgrid_backend not in ('kgrid.x', 'numpy'):
+            raise Exception(
+                "kgrid_backend must be 'kgrid.x' or 'numpy', not '{}'".format(
+                kgrid_backend))
+        self.kgrid_backend = kgrid_backend
+
     def read_kpoints(self):
         """Read a list of kpoints and their weights from kgrid.x output file."""
         with open(self.outputname, 'r') as f:
@@ -158,25 +197,18 @@ class KgridTask(Task):
 
     def get_kpt_grid_nosym(self):
         """
-        Return a list of kpoints generated with out any symmetry,
+        Return an array of kpoints generated with out any symmetry,
         along with their weights.
         """
-        ngkpt = self.ngkpt
-        kshift = self.kshift
-        qshift = self.qshift
-        nkx, nky, nkz = ngkpt
-    
-        kpoints = list()
-        weights = list()
-        for ikx in range(nkx):
-            for iky in range(nky):
-                for ikz in range(nkz):
-    
-                    k = (np.array([ikx, iky, ikz]) + kshift) / ngkpt + qshift
-                    kpoints.append(k)
-                    weights.append(1.)
-    
-        return np.array(kpoints), np.array(weights)
+        return get_kpt_grid_nosym(self.ngkpt, self.kshift, self.qshift)
+
+    def iter_kpt_grid_nosym(self, chunksize=None):
+        """
+        Iterate over chunks of the kpoints generated without any symmetry.
+        See iter_kpt_grid_nosym.
+        """
+        return iter_kpt_grid_nosym(self.ngkpt, self.kshift, self.qshift,
+                                   chunksize=chunksize)
 
     def read_symmetries(self):
         """Read the symmetries matrices and translation vectors."""
@@ -193,8 +225,8 @@ class KgridTask(Task):
                         line = next(f)
                         assert 'Space group' in line
 
-                        syms = np.zeros((nsym, 9), dtype=np.int)
-                        taus = np.zeros((nsym, 3), dtype=np.float)
+                        syms = np.zeros((nsym, 9), dtype=int)
+                        taus = np.zeros((nsym, 3), dtype=float)
 
                         for i in range(nsym):
                             line = next(f)
@@ -214,6 +246,10 @@ class KgridTask(Task):
 
     def get_kpoints(self):
         """Write, run and extract kpoints. Return kpt, wtk."""
+        if self.kgrid_backend == 'numpy':
+            return self.compute_kpoints()
+        if self.use_cache:
+            return self.get_kpoints_and_sym()[0]
         try:
             self.write()
             self.run()
@@ -224,6 +260,10 @@ class KgridTask(Task):
 
     def get_symmetries(self):
         """Write, run and extract symmetries."""
+        if self.kgrid_backend == 'numpy':
+            return self.compute_symmetries()
+        if self.use_cache:
+            return self.get_kpoints_and_sym()[1]
         try:
             self.write()
             self.run()
@@ -234,15 +274,236 @@ class KgridTask(Task):
 
     def get_kpoints_and_sym(self):
         """Write, run and extract kpoints and symmetries."""
+        if self.kgrid_backend == 'numpy':
+            return self.compute_kpoints(), self.compute_symmetries()
+        if self.use_cache:
+            cached = self.read_cache()
+            if cached is not None:
+                return cached
         try:
             self.write()
             self.run()
             outkpt = self.read_kpoints()
             outsym = self.read_symmetries()
-            return outkpt, outsym
         finally:
             if self.clean_after:
                 self.clean_up()
+        if self.use_cache:
+            self.write_cache(outkpt, outsym)
+        return outkpt, outsym
+
+    # =================================================================== #
+    """ NumPy backend                                                     """
+
+    # Tolerance on the atomic positions for the symmetry search.
+    symprec = 1e-5
+
+    def compute_symmetries(self):
+        """
+        Compute the symmetries matrices and translation vectors
+        of the crystal, in the same convention as kgrid.x,
+        without executing kgrid.x.
+        """
+        from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+        analyzer = SpacegroupAnalyzer(self.structure, symprec=self.symprec)
+        dataset = analyzer.get_symmetry_dataset()
+
+        # Real space rotations in reduced coordinates.
+        rotations = np.array(dataset.rotations, dtype=int)
+        translations = np.array(dataset.translations, dtype=float)
+
+        # kgrid.x reports the rotations acting on the reciprocal space
+        # reduced coordinates, inv(R)^T, flattened in Fortran order,
+        # and the translations multiplied by 2pi.
+        syms = np.rint(np.linalg.inv(rotations)).astype(int).reshape((-1, 9))
+        taus = 2 * np.pi * translations
+
+        return syms, taus
+
+    def get_kpoint_operations(self):
+        """
+        Return the rotations used to reduce the k-points,
+        as an array of shape (nop, 3, 3) acting on reduced coordinates.
+        Only the symmetries whose translation is commensurate
+        with the fft grid are retained, and time reversal is included
+        if use_tr is True.
+        """
+        syms, taus = self.compute_symmetries()
+        ops = syms.reshape((-1, 3, 3)).transpose((0,2,1))
+
+        fft = np.array(self.fft)
+        if np.any(fft):
+            frac = taus / (2 * np.pi) * fft
+            keep = np.all(np.abs(frac - np.rint(frac)) < 1e-6, axis=1)
+            ops = ops[keep]
+
+        if self.use_tr:
+            ops = np.concatenate((ops, -ops))
+
+        return ops
+
+    def get_grid_operations(self):
+        """
+        Return the rotations used to reduce the k-points of the grid,
+        that is, the operations of get_kpoint_operations that map
+        the shifted grid onto itself, as done by kgrid.x.
+        The other ones may send only some of the grid points
+        onto the grid, and do not form a group acting on it.
+        """
+        ops = self.get_kpoint_operations()
+
+        ngkpt = np.array(self.ngkpt, dtype=int)
+        kshift = np.array(self.kshift, dtype=float)
+        indices = np.indices(ngkpt).reshape((3, -1)).T
+        kpoints = (indices + kshift) / ngkpt
+
+        images = np.einsum('sij,kj->ski', ops, kpoints) * ngkpt - kshift
+        keep = np.all(np.abs(images - np.rint(images)) < 1e-6, axis=(1,2))
+        return ops[keep]
+
+    @staticmethod
+    def find_representatives(kpoints, ops):
+        """
+        Find the symmetry-equivalent kpoints.
+
+        Arguments
+        ---------
+
+        kpoints : array(nk, 3)
+            K-points in reduced coordinates.
+        ops : array(nop, 3, 3)
+            Rotations acting on the reduced coordinates.
+            They must form a group.
+
+        Returns
+        -------
+
+        irep : array(nk), int
+            For each k-point, the index of the first k-point
+            of the list that is equivalent to it.
+        """
+        kpoints = np.asarray(kpoints, dtype=float)
+        nk = len(kpoints)
+
+        # Images of all k-points by all operations, folded into [0,1).
+        images = np.einsum('sij,kj->ski', ops, kpoints).reshape((-1, 3))
+        allpoints = np.concatenate((kpoints, images))
+        allpoints -= np.floor(allpoints + 1e-8)
+        keys = np.rint(allpoints * 1e8).astype(np.int64)
+        keys[keys == 10**8] = 0
+
+        # Label each distinct point, and map the labels
+        # back to the index of the k-point, if any.
+        _, labels = np.unique(keys, axis=0, return_inverse=True)
+        labels = labels.ravel()
+        position = np.full(labels.max() + 1, nk, dtype=int)
+        np.minimum.at(position, labels[:nk], np.arange(nk))
+
+        irep = position[labels[nk:]].reshape((-1, nk)).min(axis=0)
+        return np.minimum(irep, np.arange(nk))
+
+    def compute_kpoints(self):
+        """
+        Compute the irreducible kpoints and their weights,
+        without executing kgrid.x. Return kpt, wtk.
+        """
+        ops = self.get_kpoint_operations()
+
+        ngkpt = np.array(self.ngkpt, dtype=int)
+        kshift = np.array(self.kshift, dtype=float)
+        qshift = np.array(self.qshift, dtype=float)
+
+        # Full grid, in the same order as kgrid.x
+        indices = np.indices(ngkpt).reshape((3, -1)).T
+        kpoints = (indices + kshift) / ngkpt
+
+        irep = self.find_representatives(kpoints, self.get_grid_operations())
+
+        if np.any(qshift):
+            # Unfold the irreducible k-points with all the symmetries
+            # and reduce the shifted points with the symmetries
+            # that leave the q-point invariant.
+            kirr = kpoints[np.unique(irep)]
+            images = np.einsum('sij,kj->ski', ops, kirr).reshape((-1, 3))
+            images -= np.floor(images + 1e-8)
+            images = np.unique(np.round(images, 10), axis=0)
+
+            little = np.all(
+                np.abs(np.einsum('sij,j->si', ops, qshift) - qshift) < 1e-8,
+                axis=1)
+            irep = self.find_representatives(images, ops[little])
+            kpoints = images + qshift
+
+        ireps, weights = np.unique(irep, return_counts=True)
+        kpoints = np.round(kpoints[ireps], 10).tolist()
+        weights = weights.astype(float).tolist()
+        return kpoints, weights
+
+
+    # Cache of the results, indexed by the hash of the kgrid.x input.
+    _memory_cache = dict()
+
+    @property
+    def cache_key(self):
+        """Hash of the structure, grid, shifts, fft grid and use_tr."""
+        content = self.get_kgrid_input().encode('utf-8')
+        return hashlib.sha1(content).hexdigest()
+
+    @property
+    def cache_fname(self):
+        return os.path.join(self.cache_dir, self.cache_key + '.json')
+
+    def read_cache(self):
+        """
+        Return the cached kpoints and symmetries, ((kpt, wtk), (syms, taus)),
+        or None if they are not available.
+        """
+        key = self.cache_key
+        data = self._memory_cache.get(key)
+
+        if data is None:
+            fname = self.cache_fname
+            if not os.path.exists(fname):
+                return None
+            try:
+                with open(fname, 'r') as f:
+                    data = json.load(f)
+            except (IOError, OSError, ValueError):
+                return None
+            if data.get('input') != self.get_kgrid_input():
+                return None
+            self._memory_cache[key] = data
+
+        kpoints = [list(k) for k in data['kpoints']]
+        weights = list(data['weights'])
+        syms = np.array(data['symmetries'], dtype=int).reshape((-1, 9))
+        taus = np.array(data['translations'], dtype=float).reshape((-1, 3))
+        return (kpoints, weights), (syms, taus)
+
+    def write_cache(self, kpoints_and_weights, symmetries):
+        """Store the kpoints and symmetries in the cache."""
+        kpoints, weights = kpoints_and_weights
+        syms, taus = symmetries
+        data = dict(
+            input = self.get_kgrid_input(),
+            kpoints = [[float(ki) for ki in k] for k in kpoints],
+            weights = [float(w) for w in weights],
+            symmetries = np.array(syms, dtype=int).tolist(),
+            translations = np.array(taus, dtype=float).tolist(),
+            )
+        self._memory_cache[self.cache_key] = data
+
+        # Write to a temporary file first, so that concurrent processes
+        # never read an incomplete file.
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmpname = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmpname, self.cache_fname)
+        except (IOError, OSError) as E:
+            warnings.warn('Could not write kgrid cache file:\n' + str(E))
 
 
 
@@ -251,7 +512,8 @@ class KgridTask(Task):
 
 def get_kpt_grid(structure, ngkpt,
                  executable='kgrid.x',  # TODO remove executable and make bindir a global option
-                 rootname='tmp.kgrid', clean_after=True, **kwargs):
+                 rootname='tmp.kgrid', clean_after=True, kgrid_backend=None,
+                 **kwargs):
     """
     Use kgrid.x to compute the list of kpoint and their weight.
 
@@ -270,6 +532,11 @@ def get_kpt_grid(structure, ngkpt,
         Where to write the files.
     clean_after: bool
         Remove files afterward.
+    kgrid_backend: str ['kgrid.x', 'numpy']
+        With 'numpy', compute the k-points in-process
+        without executing kgrid.x.
+        Defaults to the 'backend' option of the [kgrid] section
+        of the configuration file.
 
 
     Keyword Arguments
@@ -293,6 +560,13 @@ def get_kpt_grid(structure, ngkpt,
 
     """
 
+    if kgrid_backend is None:
+        kgrid_backend = default_kgrid['backend']
+    if kgrid_backend == 'numpy':
+        task = KgridTask(structure, ngkpt, kgrid_backend=kgrid_backend,
+                         **kwargs)
+        return task.get_kpoints()
+
     dirname = os.path.dirname(rootname)
     new_dir = dirname and not os.path.exists(dirname)
     inputname = rootname + '.in'
@@ -400,31 +674,60 @@ def get_kqshift(ngkpt, kshift, qshift):
 
 def get_kpt_grid_nosym(ngkpt, kshift=[.0,.0,.0], qshift=[.0,.0,.0]):
     """
-    Return a list of kpoints generated without any symmetry,
+    Return an array of kpoints generated without any symmetry,
     along with their weights.
+
+    Returns
+    -------
+
+    kpts: array(nk, 3)
+        The k-points, with the last index of the grid running fastest.
+
+    wtks: array(nk)
+        The weights, all equal to one.
     """
-    ngkpt = np.array(ngkpt)
-    kshift = np.array(kshift)
-    qshift = np.array(qshift)
-    nkx, nky, nkz = ngkpt
+    for kpoints, weights in iter_kpt_grid_nosym(ngkpt, kshift, qshift):
+        return kpoints, weights
+    return np.zeros((0, 3)), np.zeros(0)
 
-    kpoints = list()
-    weights = list()
-    #for ikx in range(-nkx, nkx):
-    #    for iky in range(-nky, nky):
-    #        for ikz in range(-nkz, nkz):
 
-    #            k = (np.array([ikx, iky, ikz]) + kshift) / ngkpt * .5 + qshift
-    #            kpoints.append(k)
-    #            weights.append(1.)
-    for ikx in range(nkx):
-        for iky in range(nky):
-            for ikz in range(nkz):
+def iter_kpt_grid_nosym(ngkpt, kshift=[.0,.0,.0], qshift=[.0,.0,.0],
+                        chunksize=None):
+    """
+    Iterate over the kpoints generated without any symmetry,
+    by chunks of contiguous arrays.
+    The kpoints are in the same order as those of get_kpt_grid_nosym.
 
-                k = (np.array([ikx, iky, ikz]) + kshift) / ngkpt + qshift
-                kpoints.append(k)
-                weights.append(1.)
+    Arguments
+    ---------
 
-    return np.array(kpoints), np.array(weights)
+    ngkpt: array(3)
+        The k-point grid.
+    kshift:
+        A k-point shift (relative to the grid spacing).
+    qshift:
+        A q-point shift (absolute, in reduced coord.)
+    chunksize: int
+        Maximum number of kpoints in each chunk.
+        By default, the whole grid is returned in a single chunk.
 
+    Yields
+    ------
 
+    kpts: array(n, 3)
+
+    wtks: array(n)
+    """
+    ngkpt = np.array(ngkpt, dtype=int)
+    kshift = np.array(kshift, dtype=float)
+    qshift = np.array(qshift, dtype=float)
+
+    nk = int(np.prod(ngkpt))
+    chunksize = int(chunksize or max(nk, 1))
+
+    for start in range(0, nk, chunksize):
+        index = np.arange(start, min(start + chunksize, nk))
+        kpoints = np.empty((len(index), 3), dtype=float)
+        for i, ik in enumerate(np.unravel_index(index, ngkpt)):
+            kpoints[:,i] = (ik + kshift[i]) / ngkpt[i] + qshift[i]
+        yield kpoints, np.ones(len(index), dtype=float)
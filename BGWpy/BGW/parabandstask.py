@@ -0,0 +1,113 @@
+from __future__ import print_function
+import os
+
+from .bgwtask import BGWTask
+from .inputs  import ParabandsInput
+
+# Public
+__all__ = ['ParabandsTask']
+
+
+class ParabandsTask(BGWTask):
+    """
+    Generation of many empty bands with parabands,
+    by exact diagonalization of the DFT Hamiltonian,
+    starting from a wavefunction file with only a few bands.
+    """
+
+    _TASK_NAME = 'Parabands'
+    _input_fname  = 'parabands.inp'
+    _output_fname = 'parabands.out'
+
+    def __init__(self, dirname, **kwargs):
+        """
+        Arguments
+        ---------
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+
+
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        nbnd : int
+            Number of bands in the output wavefunction file.
+        wfn_fname : str
+            Path to the wavefunction file produced by pw2bgw.
+        vsc_fname : str
+            Path to the self-consistent potential file produced by pw2bgw.
+        vkb_fname : str
+            Path to the Kleinman-Bylander projectors file produced by pw2bgw.
+        extra_lines : list, optional
+            Any other lines that should appear in the input file.
+        extra_variables : dict, optional
+            Any other variables that should be declared in the input file.
+
+
+        Properties
+        ----------
+
+        wfn_out_fname : str
+            Path to the wavefunction file produced.
+
+        """
+
+        kwargs.setdefault('runscript_fname', 'parabands.run.sh')
+
+        super(ParabandsTask, self).__init__(dirname, **kwargs)
+
+        # Input file
+        self.input = ParabandsInput(
+            kwargs['nbnd'],
+            *kwargs.get('extra_lines',[]),
+            **kwargs.get('extra_variables',{}))
+
+        self.input.fname = self._input_fname
+
+        # Set up the run script
+        self.wfn_fname = kwargs['wfn_fname']
+        self.vsc_fname = kwargs['vsc_fname']
+        self.vkb_fname = kwargs['vkb_fname']
+
+        ex = 'parabands.cplx.x' if self._flavor_complex else 'parabands.real.x'
+        self.runscript['PARABANDS'] = ex
+        self.runscript.append('$MPIRUN $PARABANDS &> {}'.format(self._output_fname))
+
+    @property
+    def wfn_fname(self):
+        return self._wfn_fname
+
+    @wfn_fname.setter
+    def wfn_fname(self, value):
+        self._wfn_fname = value
+        self.update_link(value, self.input['input_wfn_file'])
+
+    @property
+    def vsc_fname(self):
+        return self._vsc_fname
+
+    @vsc_fname.setter
+    def vsc_fname(self, value):
+        self._vsc_fname = value
+        self.update_link(value, self.input['vsc_file'])
+
+    @property
+    def vkb_fname(self):
+        return self._vkb_fname
+
+    @vkb_fname.setter
+    def vkb_fname(self, value):
+        self._vkb_fname = value
+        self.update_link(value, self.input['vkb_file'])
+
+    def write(self):
+        super(ParabandsTask, self).write()
+        with self.exec_from_dirname():
+            self.input.write()
+
+    @property
+    def wfn_out_fname(self):
+        return os.path.join(self.dirname, self.input['output_wfn_file'])
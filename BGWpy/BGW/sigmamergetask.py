@@ -0,0 +1,108 @@
+from __future__ import print_function
+import os
+
+from ..core import Task
+
+# Public
+__all__ = ['SigmaMergeTask']
+
+
+class SigmaMergeTask(Task):
+    """
+    Merge of the eqp0.dat, eqp1.dat and sigma_hp.log files produced
+    by several sigma runs over different k-points.
+    """
+
+    _TASK_NAME = 'SigmaMerge'
+    _merge_executable = 'BGWpy_merge_sigma_hp.py'
+
+    def __init__(self, dirname, **kwargs):
+        """
+        Arguments
+        ---------
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+
+
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        sigma_dirnames : list of str
+            Directories of the sigma runs.
+            The k-points of the merged files are ordered as these directories.
+        merge_executable : str ('BGWpy_merge_sigma_hp.py')
+            Command called as 'merge_executable -o output inputs...'
+            to merge the sigma_hp.log files.
+            The eqp files are simply concatenated.
+
+
+        Properties
+        ----------
+
+        sigma_fname : str
+            Path to the merged sigma_hp.log file.
+        eqp0_fname : str
+            Path to the merged eqp0.dat file.
+        eqp1_fname : str
+            Path to the merged eqp1.dat file.
+
+        """
+
+        super(SigmaMergeTask, self).__init__(dirname, **kwargs)
+
+        basenames = dict(eqp0=list(), eqp1=list(), sigma_hp=list())
+        for i, sigma_dirname in enumerate(kwargs['sigma_dirnames']):
+            for name, ext in (('eqp0', 'dat'), ('eqp1', 'dat'),
+                              ('sigma_hp', 'log')):
+                basename = '{}_{:03}.{}'.format(name, i + 1, ext)
+                self.update_link(
+                    os.path.join(sigma_dirname, name + '.' + ext), basename)
+                basenames[name].append(basename)
+
+        self.runscript['SIGMA_MERGE'] = kwargs.get('merge_executable',
+                                                   self._merge_executable)
+        for name in ('eqp0', 'eqp1'):
+            self.runscript.append('cat {} > {}.dat'.format(
+                                  ' '.join(basenames[name]), name))
+
+        # Written last, since it determines the status of the task.
+        self.runscript.append('$SIGMA_MERGE -o sigma_hp.log {}'.format(
+                              ' '.join(basenames['sigma_hp'])))
+
+    @property
+    def sigma_fname(self):
+        """Path to the merged sigma_hp.log file."""
+        return os.path.join(self.dirname, 'sigma_hp.log')
+
+    @property
+    def eqp0_fname(self):
+        """Path to the merged eqp0.dat file."""
+        return os.path.join(self.dirname, 'eqp0.dat')
+
+    @property
+    def eqp1_fname(self):
+        """Path to the merged eqp1.dat file."""
+        return os.path.join(self.dirname, 'eqp1.dat')
+
+    def get_status(self, check_time=False, check_fingerprint=False):
+        """
+        Return the status of the task. Possible status are:
+        Completed, Unstarted.
+        The merged sigma_hp.log file is renamed to its final name
+        once complete.
+
+        Keyword arguments
+        -----------------
+
+        check_time : bool (False)
+            Consider the task as unstarted if the merged file is older
+            than the files to merge.
+        check_fingerprint : bool (False)
+            Consider the task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
+        """
+        return self._get_file_status(self.sigma_fname, check_time=check_time,
+                                     check_fingerprint=check_fingerprint)
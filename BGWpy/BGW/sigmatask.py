@@ -1,9 +1,12 @@
 from __future__ import print_function
 import os
 
+import numpy as np
+
 from .bgwtask  import BGWTask
 from .kgrid    import KgridTask, get_kpt_grid
 from .inputs   import SigmaInput
+from ..extractors.gw import read_sigma_hp_blocks, write_eqp_file
 
 # Public
 __all__ = ['SigmaTask']
@@ -15,6 +18,9 @@ class SigmaTask(BGWTask):
     _TASK_NAME = 'Sigma'
     _input_fname  = 'sigma.inp'
     _output_fname = 'sigma.out'
+    _kpt_aliases = ('kpts', 'kpoints', 'sigma_kpts', 'sigma_k_points',
+                    'sigma_kpoints')
+    _merge_executable = 'BGWpy_merge_sigma_hp.py'
 
     def __init__(self, dirname, **kwargs):
         """
@@ -60,6 +66,9 @@ class SigmaTask(BGWTask):
             Any other lines that should appear in the input file.
         extra_variables : dict, optional
             Any other variables that should be declared in the input file.
+        restart : bool (False)
+            When written, compute only the k-points that were not
+            completed by an unfinished run. See prepare_restart.
 
 
         Properties
@@ -83,8 +92,7 @@ class SigmaTask(BGWTask):
 
 
         # Use specified kpoints or compute them from grid.
-        kpt_aliases = ('kpts', 'kpoints', 'sigma_kpts', 'sigma_k_points', 'sigma_kpoints')
-        for key in kpt_aliases:
+        for key in self._kpt_aliases:
             if key in kwargs:
                 kpts = kwargs[key]
                 break
@@ -94,7 +102,8 @@ class SigmaTask(BGWTask):
             #ngkpt = kwargs['ngkpt']
             #kpts, wtks = get_kpt_grid(structure, ngkpt)
             kgrid_kwargs = dict()
-            for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after'):
+            for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after',
+                        'kgrid_backend'):
                 if key in kwargs:
                     kgrid_kwargs[key] = kwargs[key]
             self.kgridtask = KgridTask(dirname=dirname, **kgrid_kwargs)
@@ -114,7 +123,8 @@ class SigmaTask(BGWTask):
             #ngqpt = kwargs['ngqpt']
             #qpts, wtqs = get_kpt_grid(structure, ngqpt)
             kgrid_kwargs = dict(ngkpt=kwargs['ngqpt'])
-            for key in ('structure', 'fft', 'use_tr', 'clean_after'):
+            for key in ('structure', 'fft', 'use_tr', 'clean_after',
+                        'kgrid_backend'):
                 if key in kwargs:
                     kgrid_kwargs[key] = kwargs[key]
             self.kgridtask = KgridTask(dirname=dirname, **kgrid_kwargs)
@@ -137,6 +147,8 @@ class SigmaTask(BGWTask):
 
         self.input.fname = self._input_fname
 
+        self.restart = kwargs.get('restart', False)
+
 
         # Prepare links
         self.wfn_co_fname = kwargs['wfn_co_fname']
@@ -221,6 +233,8 @@ class SigmaTask(BGWTask):
         self.update_link(value, dest)
 
     def write(self):
+        if self.restart:
+            self.prepare_restart()
         super(SigmaTask, self).write()
         with self.exec_from_dirname():
             self.input.write()
@@ -239,4 +253,106 @@ class SigmaTask(BGWTask):
     def eqp1_fname(self):
         """Path to the eqp1.dat file produced."""
         return os.path.join(self.dirname, 'eqp1.dat')
-    
+
+    def _get_completed_blocks(self, blocks):
+        """
+        Return the blocks of a sigma_hp.log file whose k-point
+        has every band written.
+        """
+        nband = (int(self.input['band_index_max'])
+                 - int(self.input['band_index_min']) + 1)
+        incomplete = set(block['ik'] for block in blocks
+                         if len(block['rows']) < nband)
+        return [block for block in blocks if block['ik'] not in incomplete]
+
+    def get_completed_kpoints(self):
+        """
+        Return the k-points whose self-energy has been written
+        to sigma_hp.log, by the last run or by the previous runs
+        kept for a restart, as array(nk, 3).
+        """
+        fnames = [self.sigma_fname]
+        fnames += [os.path.join(dirname, 'sigma_hp.log')
+                   for dirname in self.get_restart_dirnames()]
+        kpts = list()
+        for fname in fnames:
+            if not os.path.exists(fname):
+                continue
+            header, blocks = read_sigma_hp_blocks(fname)
+            for block in self._get_completed_blocks(blocks):
+                if block['spin'] == 1:
+                    kpts.append(block['kpt'])
+        return np.array(kpts, dtype=float).reshape((-1, 3))
+
+    def prepare_restart(self):
+        """
+        Restrict the calculation to the k-points that were not completed
+        by an unfinished run, e.g. one that reached its wall-time limit.
+
+        The completed k-points of the sigma_hp.log file of the last run
+        are kept in a new directory restart_NN, together with the eqp0.dat
+        and eqp1.dat files computed from them, and the output of the run.
+        These files are merged with those of the new run at the end
+        of the runscript. The k-points of the merged files are thus
+        not in the order of the input file.
+
+        The task is left unchanged if it is completed,
+        if no k-point was completed, or if none remains.
+        Must be called before writing the task.
+
+        Returns
+        -------
+
+        nremaining : int
+            Number of k-points that remain to be computed.
+        """
+        if self.get_status() == self._STATUS_COMPLETED:
+            return 0
+
+        completed = self.get_completed_kpoints()
+        kpts = self._get_remaining_points(self.input.kpts, completed)
+        if not len(completed) or not len(kpts):
+            return len(kpts)
+
+        if any(os.path.exists(fname)
+               for fname in (self.sigma_fname, self.output_fname)):
+            dirname = self._make_restart_dirname()
+            if os.path.exists(self.sigma_fname):
+                header, blocks = read_sigma_hp_blocks(self.sigma_fname)
+                blocks = self._get_completed_blocks(blocks)
+                with open(os.path.join(dirname, 'sigma_hp.log'), 'w') as f:
+                    f.write(''.join(header))
+                    for block in blocks:
+                        f.write(''.join(block['lines']))
+                write_eqp_file(blocks, os.path.join(dirname, 'eqp0.dat'),
+                               column='Eqp0')
+                write_eqp_file(blocks, os.path.join(dirname, 'eqp1.dat'),
+                               column='Eqp1')
+                os.remove(self.sigma_fname)
+            if os.path.exists(self.output_fname):
+                os.rename(self.output_fname, os.path.join(
+                          dirname, os.path.basename(self.output_fname)))
+
+        self.input.kpts = kpts
+
+        parts = [os.path.basename(dirname)
+                 for dirname in self.get_restart_dirnames()
+                 if os.path.exists(os.path.join(dirname, 'sigma_hp.log'))]
+
+        lines = list()
+        if parts:
+            self.runscript['SIGMA_MERGE'] = self._merge_executable
+            lines.append("if grep -q '{}' {}; then".format(
+                         self._TAG_JOB_COMPLETED, self._output_fname))
+            for name in ('eqp0', 'eqp1'):
+                fnames = [os.path.join(part, name + '.dat') for part in parts]
+                lines.append('  cat {0} {1}.dat > {1}.merged.dat && '
+                             'mv {1}.merged.dat {1}.dat'.format(
+                             ' '.join(fnames), name))
+            fnames = [os.path.join(part, 'sigma_hp.log') for part in parts]
+            lines.append('  $SIGMA_MERGE -o sigma_hp.log {} sigma_hp.log'
+                         .format(' '.join(fnames)))
+            lines.append('fi')
+        self._set_restart_lines(lines)
+
+        return len(kpts)
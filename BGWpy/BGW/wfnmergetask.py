@@ -0,0 +1,128 @@
+from __future__ import print_function
+import os
+
+import numpy as np
+
+from ..core import Task, Writable
+from ..core.F90io import array_lines
+
+__all__ = ['WfnMergeInput', 'WfnMergeTask']
+
+
+class WfnMergeInput(Writable):
+    """
+    Input file of wfnmerge.x: the output file name, the total number
+    of k-points, the number of input files, the input file names,
+    and the k-points with their weights, in the order of the input files.
+    """
+
+    def __init__(self, output, fnames, kpts, wtks, **kwargs):
+
+        super(WfnMergeInput, self).__init__(**kwargs)
+
+        self.output = output
+        self.fnames = list(fnames)
+        self.kpts = kpts
+        self.wtks = wtks
+
+    def __str__(self):
+
+        kpts = np.asarray(self.kpts, dtype=float).reshape((-1, 3))
+        wtks = np.asarray(self.wtks, dtype=float).reshape((-1, 1))
+
+        S = '{}\n{}\n{}\n'.format(self.output, len(kpts), len(self.fnames))
+        S += ''.join(fname + '\n' for fname in self.fnames)
+        S += ''.join(array_lines(np.hstack((kpts, wtks)), prefix=' ',
+                                 fmt='%13.10f'))
+        return S
+
+
+class WfnMergeTask(Task):
+    """
+    Merge of wavefunction files computed for different k-points
+    of the same grid.
+    """
+
+    _TASK_NAME = 'WfnMerge'
+    _input_fname = 'wfnmerge.inp'
+    _output_fname = 'wfnmerge.out'
+
+    def __init__(self, dirname, **kwargs):
+        """
+        Arguments
+        ---------
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+
+
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        wfn_fnames : list of str
+            Paths to the wavefunction files to merge.
+            The k-points of the merged file are ordered as these files.
+        kpts : 2D list(nkpt,3), float
+            All k-points, in the order of the files.
+        wtks : list(nkpt), float
+            Weights of the k-points.
+        wfn_basename : str ('wfn.cplx')
+            Name of the merged file.
+
+
+        Properties
+        ----------
+
+        wfn_fname : str
+            Path to the merged wavefunction file.
+
+        """
+
+        super(WfnMergeTask, self).__init__(dirname, **kwargs)
+
+        self.wfn_basename = kwargs.get('wfn_basename', 'wfn.cplx')
+
+        basenames = list()
+        for i, fname in enumerate(kwargs['wfn_fnames']):
+            basename = 'WFN_{:03}'.format(i + 1)
+            self.update_link(fname, basename)
+            basenames.append(basename)
+
+        # The merged file is renamed once complete.
+        tmpname = self.wfn_basename + '.tmp'
+        self.input = WfnMergeInput(tmpname, basenames,
+                                   kwargs['kpts'], kwargs['wtks'])
+        self.input.fname = self._input_fname
+
+        self.runscript['WFNMERGE'] = kwargs.get('WFNMERGE', 'wfnmerge.x')
+        self.runscript.append('$WFNMERGE &> {} && mv {} {}'.format(
+                              self._output_fname, tmpname, self.wfn_basename))
+
+    def write(self):
+        super(WfnMergeTask, self).write()
+        with self.exec_from_dirname():
+            self.input.write()
+
+    @property
+    def wfn_fname(self):
+        return os.path.join(self.dirname, self.wfn_basename)
+
+    def get_status(self, check_time=False, check_fingerprint=False):
+        """
+        Return the status of the task. Possible status are:
+        Completed, Unstarted.
+
+        Keyword arguments
+        -----------------
+
+        check_time : bool (False)
+            Consider the task as unstarted if the merged file is older
+            than the files to merge.
+        check_fingerprint : bool (False)
+            Consider the task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
+        """
+        return self._get_file_status(self.wfn_fname, check_time=check_time,
+                                     check_fingerprint=check_fingerprint)
@@ -78,6 +78,9 @@ class DFTTask(MPITask):
             as a fraction of the smallest division along that direction.
         qshift : list(3), float, optional
             Absolute shift of the k-points grid along each direction.
+        kpt_range : (int, int), optional
+            Keep only the k-points with indices in range(start, stop),
+            e.g. to compute a grid by chunks.
 
         """
 
@@ -91,6 +94,10 @@ class DFTTask(MPITask):
         else:
             kpts, wtks = kwargs['kpts'], kwargs['wtks']
 
+        if kwargs.get('kpt_range') is not None:
+            start, stop = kwargs['kpt_range']
+            kpts, wtks = kpts[start:stop], wtks[start:stop]
+
         return kpts, wtks
 
     def check_pseudos(self):
@@ -148,8 +148,9 @@ class PWscfInput(Writable):
     def set_kpoints_crystal(self, kpts, wtks):
         self.k_points.option = 'crystal'
         self.k_points.append(len(kpts))
-        for k, w in zip(kpts, wtks):
-            self.k_points.append(list(k) + [w])
+        self.k_points.append(np.column_stack((
+            np.asarray(kpts, dtype=float).reshape((-1, 3)),
+            np.asarray(wtks, dtype=float))))
 
     @property
     def structure(self):
@@ -87,6 +87,12 @@ class QeBgwFlow(WfnBgwFlow):
 
         vxc_dat_fname : str
             Path to the vxc.dat file used by BerkeleyGW.
+
+        vsc_fname : str
+            Path to the self-consistent potential file used by parabands.
+
+        vkb_fname : str
+            Path to the Kleinman-Bylander projectors file used by parabands.
         """
 
         super(QeBgwFlow, self).__init__(**kwargs)
@@ -158,3 +164,12 @@ class QeBgwFlow(WfnBgwFlow):
         """The xc potential file name for BerkeleyGW."""
         return self.wfnbgwntask.vxc_dat_fname
 
+    @property
+    def vsc_fname(self):
+        """The self-consistent potential file name for parabands."""
+        return self.wfnbgwntask.vsc_fname
+
+    @property
+    def vkb_fname(self):
+        """The Kleinman-Bylander projectors file name for parabands."""
+        return self.wfnbgwntask.vkb_fname
@@ -45,6 +45,10 @@ class Qe2BgwInput(Namelist):
             'vxc_offdiag_nmax',
             'vxc_diag_nmin',
             'vxc_diag_nmax',
+            'vscg_flag',
+            'vscg_file',
+            'vkbg_flag',
+            'vkbg_file',
             'wfng_kgrid',
             ]
         for key in prefered_order:
@@ -143,6 +147,12 @@ class Qe2BgwTask(QeTask):
         nbnd : int, optional
             Number of bands for which vxc should be computed.
             Only if output of the density and vxc is active.
+        vscg_flag : bool (False), optional
+            If True, will activate the output of the self-consistent
+            potential, required by parabands.
+        vkbg_flag : bool (False), optional
+            If True, will activate the output of the Kleinman-Bylander
+            projectors, required by parabands.
 
 
         Properties
@@ -154,6 +164,10 @@ class Qe2BgwTask(QeTask):
             Path to the density file produced.
         vxc_dat_fname : str
             Path to the vxc.dat file produced.
+        vsc_fname : str
+            Path to the self-consistent potential file produced.
+        vkb_fname : str
+            Path to the Kleinman-Bylander projectors file produced.
         """
 
         kwargs.setdefault('runscript_fname', 'pw2bgw.run.sh')
@@ -194,6 +208,12 @@ class Qe2BgwTask(QeTask):
         if kwargs.get('rho_fname') or kwargs.get('rhog_flag'):
             defaults.update(rho_defaults)
 
+        if kwargs.get('vscg_flag'):
+            defaults.update(vscg_flag=True, vscg_file='VSC')
+
+        if kwargs.get('vkbg_flag'):
+            defaults.update(vkbg_flag=True, vkbg_file='VKB')
+
         variables = dict()
         for key, value in defaults.items():
             variables[key] = kwargs.get(key, value)
@@ -247,3 +267,10 @@ class Qe2BgwTask(QeTask):
         self._vxc_dat_fname = value
         self.input['vxc_file'] = value
 
+    @property
+    def vsc_fname(self):
+        return os.path.join(self.dirname, self.input.get('vscg_file', 'VSC'))
+
+    @property
+    def vkb_fname(self):
+        return os.path.join(self.dirname, self.input.get('vkbg_file', 'VKB'))
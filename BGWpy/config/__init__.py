@@ -2,6 +2,7 @@
 from .default_configuration import (
     default_mpi,
     default_runscript,
+    default_kgrid,
     flavors,
     )
 
@@ -30,7 +31,7 @@ if os.path.exists(config_file):
     sk = 'MPI'
     keys = ('mpirun', 'nproc', 'nproc_flag',
             'nproc_per_node', 'nproc_per_node_flag',
-            'nodes', 'nodes_flag')
+            'nodes', 'nodes_flag', 'nthreads')
     if sk in config:
         for key in keys:
             if key in config[sk]:
@@ -43,6 +44,15 @@ if os.path.exists(config_file):
             if key in config[sk]:
                 default_runscript[key] = config[sk][key]
 
+    sk = 'kgrid'
+    if sk in config:
+        if 'use_cache' in config[sk]:
+            default_kgrid['use_cache'] = config[sk].getboolean('use_cache')
+        if 'cache_dir' in config[sk]:
+            default_kgrid['cache_dir'] = config[sk]['cache_dir']
+        if 'backend' in config[sk]:
+            default_kgrid['backend'] = config[sk]['backend']
+
     del sk, keys
 
 else:
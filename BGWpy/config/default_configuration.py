@@ -9,6 +9,7 @@ default_mpi = dict(
     nproc_per_node_flag = '--npernode',
     nodes = None,
     nodes_flag = None,
+    nthreads = None,
     )
 
 default_runscript = dict(
@@ -17,6 +18,12 @@ default_runscript = dict(
     footer = [],
     )
 
+default_kgrid = dict(
+    use_cache = True,
+    cache_dir = '~/.cache/BGWpy/kgrid',
+    backend = 'kgrid.x',
+    )
+
 flavors = dict(
     use_hdf5 = True,
     use_hdf5_qe = False,
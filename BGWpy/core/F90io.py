@@ -1,5 +1,5 @@
 """Some genering formatting functions for the input."""
-from numpy import array
+from numpy import array, ndarray
 from collections import OrderedDict
 from .writable import Writable
 
@@ -13,11 +13,14 @@ class Card(list, Writable):
         self.quotes = quotes
 
     def __str__(self):
-        S = '{} {}\n'.format(self.name, self.option)
+        parts = ['{} {}\n'.format(self.name, self.option)]
         for val in self:
-            S += '   {}\n'.format(fortran_str(val, self.quotes))
+            if isinstance(val, ndarray) and val.ndim == 2:
+                parts.extend(array_lines(val, '   '))
+            else:
+                parts.append('   {}\n'.format(fortran_str(val, self.quotes)))
 
-        return S
+        return ''.join(parts)
 
     # TODO
     #def clear(self):
@@ -73,3 +76,19 @@ def bool_str(b):
     if b:
         return '.true.'
     return '.false.'
+
+
+def array_lines(arr, prefix='', fmt='%r', suffix='', chunksize=4096):
+    """
+    Format the rows of a 2D array, one row per line.
+    The array is formatted by chunks of rows, without creating
+    an intermediate object for each row.
+
+    With the default format, the values are written
+    as Python floats, like fortran_str does for a list of floats.
+    """
+    nrow, ncol = arr.shape
+    line = prefix + ' '.join(ncol * [fmt]) + suffix + '\n'
+    for start in range(0, nrow, chunksize):
+        chunk = arr[start:start+chunksize]
+        yield (len(chunk) * line) % tuple(chunk.ravel().tolist())
@@ -2,5 +2,11 @@ from . import util
 from .writable import *
 from .F90io import *
 from .runscript import *
+from .timing import *
 from .task import *
+from .graph import *
+from .executor import *
+from .scheduler import *
+from .asyncrunner import *
+from .layout import *
 from .workflow import *
@@ -0,0 +1,222 @@
+"""Asynchronous execution of the tasks of a graph."""
+from __future__ import print_function
+import os
+import signal
+import asyncio
+
+# Public
+__all__ = ['AsyncRunner']
+
+
+class AsyncRunner(object):
+    """
+    Execution of the tasks of a graph with asyncio, with a limit
+    on the number of concurrent tasks, wall-time limits,
+    retries on given exit codes, and cancellation.
+
+    A task fails if its runscript returns a nonzero exit code,
+    or if it reports an unstarted or unfinished status after its run.
+    The tasks that depend on a task that did not complete are not executed.
+    """
+
+    _STATE_COMPLETED = 'Completed'
+    _STATE_UNCHANGED = 'Unchanged'
+    _STATE_FAILED = 'Failed'
+    _STATE_TIMEDOUT = 'TimedOut'
+    _STATE_CANCELLED = 'Cancelled'
+    _STATE_SKIPPED = 'Skipped'
+
+    def __init__(self, max_concurrent=None, timeout=None, retries=0,
+                 retry_exit_codes=(), backoff=1.0, kill_delay=5.0):
+        """
+        Keyword arguments
+        -----------------
+
+        max_concurrent : int (None)
+            Maximum number of tasks executed at the same time.
+            Defaults to the number of tasks.
+        timeout : float or callable (None)
+            Wall-time limit of each task, in seconds,
+            or function returning the wall-time limit of a given task.
+            A task that exceeds it is terminated, and is not retried.
+        retries : int (0)
+            Number of times a task is executed again
+            when its exit code is one of retry_exit_codes.
+        retry_exit_codes : list of int (())
+            Exit codes for which a task is executed again.
+        backoff : float (1.0)
+            Delay before the first retry, in seconds.
+            The delay is doubled at each retry.
+        kill_delay : float (5.0)
+            Delay between the termination signal sent to a task
+            that is timed out or cancelled and the kill signal.
+
+        Properties
+        ----------
+
+        states : list of str
+            The final state of each task after a run: Completed, Unchanged,
+            Failed, TimedOut, Cancelled or Skipped.
+
+        """
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_exit_codes = tuple(retry_exit_codes)
+        self.backoff = backoff
+        self.kill_delay = kill_delay
+        self.states = list()
+        self._loop = None
+        self._cancelled = None
+
+    def get_timeout(self, task):
+        """Return the wall-time limit of a task, or None."""
+        if callable(self.timeout):
+            return self.timeout(task)
+        return self.timeout
+
+    def run(self, graph, skip_unchanged=False):
+        """
+        Execute the tasks of a graph, launching every task
+        whose dependencies have completed.
+
+        The fingerprint of every task that completes is recorded.
+
+        Arguments
+        ---------
+
+        graph : TaskGraph
+            The tasks to execute. They must have been written.
+
+        Keyword arguments
+        -----------------
+
+        skip_unchanged : bool (False)
+            Do not execute the tasks whose fingerprint matches
+            the one recorded from a completed run.
+
+        Returns
+        -------
+
+        returncodes : list of int
+            The exit code of the last execution of each task's runscript,
+            or None for the tasks that were not executed or were terminated.
+            See also the states property.
+        """
+        return asyncio.run(self.run_async(graph, skip_unchanged))
+
+    def cancel(self):
+        """
+        Terminate the running tasks and do not execute the others.
+        May be called from another thread.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancelled.set)
+
+    async def run_async(self, graph, skip_unchanged=False):
+        """Coroutine version of run."""
+        ntasks = len(graph.tasks)
+        self.states = [None] * ntasks
+        returncodes = [None] * ntasks
+
+        self._loop = asyncio.get_running_loop()
+        self._cancelled = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrent or max(ntasks, 1))
+
+        futures = dict()
+
+        async def run_task(i):
+            for j in graph.dependencies[i]:
+                await futures[j]
+
+            completed = (self._STATE_COMPLETED, self._STATE_UNCHANGED)
+            if any(self.states[j] not in completed
+                   for j in graph.dependencies[i]):
+                self.states[i] = self._STATE_SKIPPED
+                return
+
+            task = graph.tasks[i]
+            if skip_unchanged and task.is_unchanged():
+                self.states[i] = self._STATE_UNCHANGED
+                return
+
+            async with semaphore:
+                returncodes[i], self.states[i] = await self._execute(task)
+
+        try:
+            for i in range(ntasks):
+                futures[i] = asyncio.ensure_future(run_task(i))
+            await asyncio.gather(*futures.values())
+        finally:
+            self._loop = None
+
+        return returncodes
+
+    async def _execute(self, task):
+        """Execute a task, with retries. Return its exit code and state."""
+        if self._cancelled.is_set():
+            return None, self._STATE_CANCELLED
+
+        fingerprint = task.get_fingerprint()
+
+        for attempt in range(self.retries + 1):
+            returncode, state = await self._launch(task)
+            if state is not None:
+                return returncode, state
+
+            if (returncode in self.retry_exit_codes and
+                attempt < self.retries):
+                delay = self.backoff * 2 ** attempt
+                try:
+                    await asyncio.wait_for(self._cancelled.wait(), delay)
+                    return returncode, self._STATE_CANCELLED
+                except asyncio.TimeoutError:
+                    continue
+            break
+
+        status = task.get_status()
+        if (returncode != 0 or
+            status in (task._STATUS_UNSTARTED, task._STATUS_UNFINISHED)):
+            return returncode, self._STATE_FAILED
+
+        task.record_fingerprint(fingerprint)
+        return returncode, self._STATE_COMPLETED
+
+    async def _launch(self, task):
+        """
+        Execute the runscript of a task once.
+        Return its exit code, and a state if it was terminated.
+        """
+        process = await asyncio.create_subprocess_exec(
+            'bash', task.runscript.fname, cwd=task.dirname,
+            start_new_session=True)
+
+        waiting = asyncio.ensure_future(process.wait())
+        cancelled = asyncio.ensure_future(self._cancelled.wait())
+        done, _ = await asyncio.wait(
+            [waiting, cancelled], timeout=self.get_timeout(task),
+            return_when=asyncio.FIRST_COMPLETED)
+        cancelled.cancel()
+
+        if waiting in done:
+            return process.returncode, None
+
+        await self._terminate(process, waiting)
+        if self._cancelled.is_set():
+            return None, self._STATE_CANCELLED
+        return None, self._STATE_TIMEDOUT
+
+    async def _terminate(self, process, waiting):
+        """Terminate the process group of a runscript."""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                await asyncio.wait_for(asyncio.shield(waiting),
+                                       self.kill_delay)
+                break
+            except asyncio.TimeoutError:
+                continue
+        await waiting
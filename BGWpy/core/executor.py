@@ -0,0 +1,262 @@
+"""Execution of the tasks of a graph within a fixed pool of cores."""
+from __future__ import print_function
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .task import MPITask
+
+# Public
+__all__ = ['LocalExecutor']
+
+
+class LocalExecutor(object):
+    """
+    Execution of the tasks of a graph side by side within a pool of cores,
+    e.g. the nodes of a batch allocation.
+
+    A task is launched once its dependencies have completed and enough
+    cores are free to satisfy its request. The MPIRUN variable of each
+    MPITask is rewritten with the hosts (and optionally the cores)
+    that were assigned to it. Other tasks use a single core.
+    Each process takes as many cores as its number of threads (nthreads).
+
+    When a task gives a number of processes per node to the mpi runner
+    (nproc_per_node and nproc_per_node_flag), it is placed with exactly
+    that many processes on each of its nodes.
+    """
+
+    def __init__(self, hosts=None, cores_per_host=None,
+                 host_flag='--host', cpu_set_flag=None):
+        """
+        Keyword arguments
+        -----------------
+
+        hosts : list of str (['localhost'])
+            Names of the nodes of the pool.
+        cores_per_host : int (os.cpu_count())
+            Number of cores available on each node.
+        host_flag : str ('--host')
+            Flag to give the hosts to the mpi runner,
+            followed by a list of 'host:ncores' separated by commas.
+        cpu_set_flag : str, optional
+            Flag to give the indices of the assigned cores to the mpi runner,
+            followed by a list of integers separated by commas,
+            e.g. '--cpu-set' for OpenMPI.
+        """
+        self.hosts = list(hosts or ['localhost'])
+        self.cores_per_host = int(cores_per_host or os.cpu_count() or 1)
+        self.host_flag = host_flag
+        self.cpu_set_flag = cpu_set_flag
+
+    @property
+    def ncores(self):
+        """Total number of cores of the pool."""
+        return len(self.hosts) * self.cores_per_host
+
+    def get_free_cores(self):
+        """Return the indices of the cores of an idle pool, for each host."""
+        return OrderedDict((host, list(range(self.cores_per_host)))
+                           for host in self.hosts)
+
+    @staticmethod
+    def get_request(task):
+        """
+        Return the number of processes, the number of nodes,
+        the number of processes per node and the number of threads
+        per process requested by a task, the number of nodes and
+        of processes per node being None for any number.
+        The number of processes per node is only imposed
+        when the task gives it to the mpi runner.
+        Each process takes as many cores as it has threads.
+        """
+        if not isinstance(task, MPITask):
+            return 1, None, None, 1
+        nthreads = int(task.nthreads or 1)
+        if not task.mpirun:
+            return 1, None, None, nthreads
+        nproc = int(task.nproc or 1)
+        nodes = int(task.nodes) if task.nodes else None
+        nproc_per_node = None
+        if task.nproc_per_node_flag and task.nproc_per_node:
+            nproc_per_node = min(int(task.nproc_per_node), nproc)
+        return nproc, nodes, nproc_per_node, nthreads
+
+    def allocate(self, free, task):
+        """
+        Take the cores for a task from the free cores.
+        Return the placement of the task, that is, the indices
+        of the assigned cores for each host, or None if the request
+        cannot be satisfied at the moment.
+        """
+        nproc, nodes, nproc_per_node, nthreads = self.get_request(task)
+
+        # Number of processes that fit in the free cores of a host.
+        def slots(host):
+            return len(free[host]) // nthreads
+
+        counts = OrderedDict()
+        if nproc_per_node:
+            # The requested number of processes on each node.
+            per_host = nproc_per_node
+            nodes = nodes or -(-nproc // per_host)
+            if nodes * per_host < nproc:
+                return None
+        elif nodes:
+            # Evenly distributed over the requested number of nodes.
+            per_host = -(-nproc // nodes)
+
+        if nodes:
+            candidates = [host for host in self.hosts
+                          if slots(host) >= per_host]
+            if len(candidates) < nodes:
+                return None
+            candidates.sort(key=slots)
+            remaining = nproc
+            for host in candidates[:nodes]:
+                counts[host] = min(per_host, remaining)
+                remaining -= counts[host]
+        else:
+            # On a single node if possible, choosing the fullest one.
+            candidates = [host for host in self.hosts
+                          if slots(host) >= nproc]
+            if candidates:
+                host = min(candidates, key=slots)
+                counts[host] = nproc
+            elif sum(slots(host) for host in self.hosts) >= nproc:
+                remaining = nproc
+                for host in sorted(self.hosts, key=lambda h: -slots(h)):
+                    if not remaining:
+                        break
+                    counts[host] = min(slots(host), remaining)
+                    remaining -= counts[host]
+            else:
+                return None
+
+        placement = OrderedDict()
+        for host, n in counts.items():
+            n *= nthreads
+            if n:
+                placement[host] = free[host][:n]
+                free[host] = free[host][n:]
+        return placement
+
+    @staticmethod
+    def release(free, placement):
+        """Give back the cores of a placement to the free cores."""
+        for host, cores in placement.items():
+            free[host] = sorted(free[host] + cores)
+
+    def get_mpirun_variable(self, task, placement):
+        """Return the MPIRUN variable of a task for a placement."""
+        nproc, nodes, nproc_per_node, nthreads = self.get_request(task)
+        nproc = sum(len(cores) for cores in placement.values()) // nthreads
+
+        variable = str(task.mpirun)
+        if task.nproc_flag:
+            variable += ' {} {}'.format(task.nproc_flag, nproc)
+
+        if nproc_per_node:
+            variable += ' {} {}'.format(task.nproc_per_node_flag,
+                                        nproc_per_node)
+
+        if self.host_flag:
+            variable += ' {} {}'.format(self.host_flag, ','.join(
+                '{}:{}'.format(host, len(cores) // nthreads)
+                for host, cores in placement.items()))
+
+        if self.cpu_set_flag:
+            cores = sorted(set(c for cores in placement.values() for c in cores))
+            variable += ' {} {}'.format(self.cpu_set_flag,
+                                        ','.join(str(c) for c in cores))
+
+        return variable
+
+    def place(self, task, placement):
+        """Write the runscript of a task with its placement."""
+        if not isinstance(task, MPITask) or not task.mpirun:
+            return
+        original = task.runscript['MPIRUN']
+        task.runscript['MPIRUN'] = self.get_mpirun_variable(task, placement)
+        try:
+            # The workers resolve relative dirnames from the current
+            # directory, which must not change while they run.
+            task.runscript.write(
+                os.path.join(task.dirname, task.runscript.fname))
+        finally:
+            task.runscript['MPIRUN'] = original
+
+    def run(self, graph, skip_unchanged=False):
+        """
+        Execute the tasks of a graph, launching every task whose
+        dependencies have completed, as long as the pool has enough
+        free cores for it.
+
+        The fingerprint of every task that completes is recorded.
+
+        Arguments
+        ---------
+
+        graph : TaskGraph
+            The tasks to execute. They must have been written.
+
+        Keyword arguments
+        -----------------
+
+        skip_unchanged : bool (False)
+            Do not execute the tasks whose fingerprint matches
+            the one recorded from a completed run.
+
+        Returns
+        -------
+
+        returncodes : list of int
+            The return code of each task's runscript,
+            or None for the tasks that were skipped.
+            The tasks that depend on a failed task are skipped.
+            See TaskGraph.run.
+        """
+        for task in graph.tasks:
+            if self.allocate(self.get_free_cores(), task) is None:
+                raise Exception(
+                    'Task requests more cores than the pool provides:\n' +
+                    task.dirname)
+
+        returncodes = [None] * len(graph.tasks)
+        free = self.get_free_cores()
+
+        done = set()
+        skipped = set()
+        futures = dict()
+        placements = dict()
+        with ThreadPoolExecutor(max_workers=self.ncores) as executor:
+            while len(done) + len(skipped) < len(graph.tasks):
+                started = set(futures.values()) | skipped
+                for i in graph.get_ready(done, started):
+                    task = graph.tasks[i]
+                    if skip_unchanged and task.is_unchanged():
+                        done.add(i)
+                        continue
+                    placement = self.allocate(free, task)
+                    if placement is None:
+                        continue
+                    self.place(task, placement)
+                    placements[i] = placement
+                    future = executor.submit(graph._run_task, task)
+                    futures[future] = i
+
+                if not futures:
+                    continue
+
+                finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = futures.pop(future)
+                    self.release(free, placements.pop(i))
+                    returncodes[i], succeeded = future.result()
+                    if succeeded:
+                        done.add(i)
+                    else:
+                        skipped.add(i)
+                        skipped.update(graph.get_descendants(i))
+
+        return returncodes
@@ -0,0 +1,206 @@
+"""Dependency graph of a sequence of tasks."""
+from __future__ import print_function
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Public
+__all__ = ['TaskGraph']
+
+
+class TaskGraph(object):
+    """
+    Directed acyclic graph of tasks.
+
+    The dependencies are derived from the files declared by each task
+    with Task.update_link and Task.update_copy. A task depends on
+    an earlier task if it links or copies a file located in the directory
+    of that earlier task. Tasks executed from the same directory
+    are executed in the order in which they were given.
+    """
+
+    def __init__(self, tasks):
+        """
+        Arguments
+        ---------
+
+        tasks : list of Task
+            The tasks, in their order of execution for a serial run.
+            Workflows are expanded into their individual tasks.
+        """
+        self.tasks = list()
+        for task in tasks:
+            if '__iter__' in dir(task):
+                subtasks = list(task)
+            else:
+                subtasks = [task]
+            for subtask in subtasks:
+                if not any(subtask is t for t in self.tasks):
+                    self.tasks.append(subtask)
+
+        self.dependencies = OrderedDict()
+        self.dependents = OrderedDict()
+        for i, task in enumerate(self.tasks):
+            self.dependencies[i] = self._find_dependencies(i)
+            self.dependents[i] = list()
+            for j in self.dependencies[i]:
+                self.dependents[j].append(i)
+
+    @staticmethod
+    def _get_dirname(task):
+        return os.path.realpath(task.dirname)
+
+    def _find_dependencies(self, i):
+        """Find the indices of the earlier tasks on which task i depends."""
+        task = self.tasks[i]
+        dirname = self._get_dirname(task)
+        dirnames = [self._get_dirname(t) for t in self.tasks[:i]]
+
+        dependencies = set()
+
+        # Tasks executed from the same directory
+        for j, other in enumerate(dirnames):
+            if other == dirname:
+                dependencies.add(j)
+
+        # Producers of the linked files: the tasks with the deepest
+        # directory containing the file.
+        for fname, dest in task.get_linked_files():
+            producers = list()
+            depth = -1
+            for j, other in enumerate(dirnames):
+                if not fname.startswith(other.rstrip(os.path.sep) + os.path.sep):
+                    continue
+                if len(other) > depth:
+                    producers = [j]
+                    depth = len(other)
+                elif len(other) == depth:
+                    producers.append(j)
+            dependencies.update(producers)
+
+        return sorted(dependencies)
+
+    def get_dependencies(self, task):
+        """Return the tasks on which a task depends."""
+        i = self.index(task)
+        return [self.tasks[j] for j in self.dependencies[i]]
+
+    def get_dependents(self, task):
+        """Return the tasks that depend directly on a task."""
+        i = self.index(task)
+        return [self.tasks[j] for j in self.dependents[i]]
+
+    def get_descendants(self, i):
+        """
+        Return the indices of the tasks that depend on task i,
+        directly or not.
+        """
+        descendants = set()
+        stack = list(self.dependents[i])
+        while stack:
+            j = stack.pop()
+            if j not in descendants:
+                descendants.add(j)
+                stack.extend(self.dependents[j])
+        return sorted(descendants)
+
+    def index(self, task):
+        for i, t in enumerate(self.tasks):
+            if t is task:
+                return i
+        raise ValueError('Task not in graph: {}'.format(task.dirname))
+
+    def get_ready(self, done, started=()):
+        """
+        Return the indices of the tasks whose dependencies are all done,
+        excluding those already started.
+        """
+        ready = list()
+        for i in self.dependencies:
+            if i in done or i in started:
+                continue
+            if all(j in done for j in self.dependencies[i]):
+                ready.append(i)
+        return ready
+
+    def run(self, max_workers=None, skip_unchanged=False):
+        """
+        Execute the tasks, launching concurrently every task
+        whose dependencies have completed.
+
+        The fingerprint of every task that completes is recorded.
+
+        Keyword arguments
+        -----------------
+
+        max_workers : int (None)
+            Maximum number of tasks executed at the same time.
+            Defaults to the number of tasks.
+        skip_unchanged : bool (False)
+            Do not execute the tasks whose fingerprint matches
+            the one recorded from a completed run.
+
+        Returns
+        -------
+
+        returncodes : list of int
+            The return code of each task's runscript,
+            or None for the tasks that were skipped.
+            A task fails if its runscript returns a nonzero exit code,
+            or if it reports an unstarted or unfinished status after its run.
+            The tasks that depend on a failed task are skipped.
+        """
+        max_workers = max_workers or max(len(self.tasks), 1)
+        returncodes = [None] * len(self.tasks)
+
+        done = set()
+        skipped = set()
+        futures = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(done) + len(skipped) < len(self.tasks):
+                started = set(futures.values()) | skipped
+                for i in self.get_ready(done, started):
+                    task = self.tasks[i]
+                    if skip_unchanged and task.is_unchanged():
+                        done.add(i)
+                        continue
+                    future = executor.submit(self._run_task, task)
+                    futures[future] = i
+
+                if not futures:
+                    continue
+
+                finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = futures.pop(future)
+                    returncodes[i], succeeded = future.result()
+                    if succeeded:
+                        done.add(i)
+                    else:
+                        skipped.add(i)
+                        skipped.update(self.get_descendants(i))
+
+        return returncodes
+
+    @staticmethod
+    def is_successful(task, returncode):
+        """
+        True if a task returned a zero exit code and does not report
+        an unstarted or unfinished status.
+        """
+        if returncode != 0:
+            return False
+        status = task.get_status()
+        return status not in (task._STATUS_UNSTARTED, task._STATUS_UNFINISHED)
+
+    def _run_task(self, task):
+        """
+        Run a task and record its fingerprint if it completed.
+        Return its exit code and whether it succeeded.
+        """
+        fingerprint = task.get_fingerprint()
+        returncode = task.run()
+        succeeded = self.is_successful(task, returncode)
+        if succeeded:
+            task.record_fingerprint(fingerprint)
+        return returncode, succeeded
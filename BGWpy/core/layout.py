@@ -0,0 +1,204 @@
+"""Choice of the MPI and OpenMP layout of each task of a workflow."""
+from __future__ import print_function
+import os
+import re
+from collections import OrderedDict
+
+from .task import MPITask
+
+# Public
+__all__ = ['LayoutPolicy']
+
+
+class LayoutPolicy(object):
+    """
+    Choice of the number of MPI processes, OpenMP threads, nodes
+    and k-point pools of each task, within the cores of a machine,
+    according to the kind of calculation and its size.
+
+    The kind of calculation is recognized from the executables
+    declared in the runscript of the task:
+
+        pw        pw.x, using all the cores, with one k-point pool
+                  per process as long as there are enough k-points.
+        pw2bgw    pw2bgw.x, on a single node, with at most one process
+                  per k-point, each one being its own pool.
+        abinit    abinit, using all the cores, with at most
+                  one process per k-point when known.
+        bgw       epsilon, sigma, kernel, absorption and parabands,
+                  using all the cores with threads_per_rank threads
+                  per process, with at most one process per band
+                  for epsilon and sigma.
+        serial    abi2bgw, inteqp, wfnmerge and the merging scripts,
+                  on a single process.
+
+    The layout of any kind may be changed by overriding
+    the corresponding get_<kind>_layout function in a subclass,
+    or the whole choice by overriding get_layout.
+    """
+
+    _categories = (
+        ('pw2bgw', ('PW2BGW',)),
+        ('pw', ('PW',)),
+        ('serial', ('ABI2BGW', 'INTEQP', 'WFNMERGE',
+                    'EPSMAT_MERGE', 'SIGMA_MERGE')),
+        ('abinit', ('ABINIT',)),
+        ('bgw', ('EPSILON', 'SIGMA', 'KERNEL', 'ABSORPTION', 'PARABANDS')),
+        )
+
+    _band_parallel = ('EPSILON', 'SIGMA')
+
+    def __init__(self, nodes=1, cores_per_node=None, threads_per_rank=1):
+        """
+        Keyword arguments
+        -----------------
+
+        nodes : int (1)
+            Number of nodes available to each task.
+        cores_per_node : int (os.cpu_count())
+            Number of cores of each node.
+        threads_per_rank : int (1)
+            Number of OpenMP threads of each process
+            for the BerkeleyGW calculations.
+        """
+        self.nodes = int(nodes)
+        self.cores_per_node = int(cores_per_node or os.cpu_count() or 1)
+        self.threads_per_rank = int(threads_per_rank)
+
+    @property
+    def ncores(self):
+        """Total number of cores."""
+        return self.nodes * self.cores_per_node
+
+    def get_category(self, task):
+        """
+        Return the kind of calculation of a task:
+        pw, pw2bgw, abinit, bgw, serial, or None if unknown.
+        """
+        variables = task.runscript.variables
+        for category, executables in self._categories:
+            if any(key in variables for key in executables):
+                return category
+        return None
+
+    def get_problem_size(self, task):
+        """
+        Return the size of the problem of a task, as a dict with
+        the number of k-points (nkpt) and the number of bands (nbnd),
+        either one being None if it is not known.
+        """
+        size = dict(nkpt=None, nbnd=None)
+        inp = getattr(task, 'input', None)
+        if inp is None:
+            return size
+
+        k_points = getattr(inp, 'k_points', None)
+        if k_points and k_points.option == 'crystal':
+            size['nkpt'] = int(k_points[0])
+        elif getattr(task, 'ngkpt', None) is not None:
+            size['nkpt'] = 1
+            for n in task.ngkpt:
+                size['nkpt'] *= int(n)
+
+        system = getattr(inp, 'system', None)
+        if system is not None and 'nbnd' in system:
+            size['nbnd'] = int(system['nbnd'])
+
+        variables = getattr(inp, 'variables', None)
+        if variables is not None and 'number_bands' in variables:
+            size['nbnd'] = int(variables['number_bands'])
+
+        return size
+
+    def get_layout(self, task):
+        """
+        Return the layout of a task, as an OrderedDict with
+        the number of nodes, processes (nproc), processes per node
+        (nproc_per_node), threads per process (nthreads)
+        and k-point pools (npools, or None),
+        or None if the task is left unchanged.
+        """
+        category = self.get_category(task)
+        if category is None:
+            return None
+        size = self.get_problem_size(task)
+        function = getattr(self, 'get_{}_layout'.format(category))
+        return function(task, **size)
+
+    def get_pw_layout(self, task, nkpt=None, nbnd=None):
+        """Return the layout of a pw.x calculation."""
+        nproc = self.ncores
+        npools = self._largest_divisor(nproc, nkpt or 1)
+        return self._make_layout(nproc, npools=npools)
+
+    def get_pw2bgw_layout(self, task, nkpt=None, nbnd=None):
+        """Return the layout of a pw2bgw.x calculation."""
+        nproc = min(nkpt or 1, self.cores_per_node)
+        return self._make_layout(nproc, npools=nproc)
+
+    def get_abinit_layout(self, task, nkpt=None, nbnd=None):
+        """Return the layout of an abinit calculation."""
+        nproc = self.ncores
+        if nkpt:
+            nproc = min(nproc, nkpt)
+        return self._make_layout(nproc)
+
+    def get_bgw_layout(self, task, nkpt=None, nbnd=None):
+        """Return the layout of a BerkeleyGW calculation."""
+        nthreads = max(1, min(self.threads_per_rank, self.cores_per_node))
+        nproc = max(1, self.ncores // nthreads)
+        variables = task.runscript.variables
+        if nbnd and any(key in variables for key in self._band_parallel):
+            nproc = min(nproc, nbnd)
+        return self._make_layout(nproc, nthreads=nthreads)
+
+    def get_serial_layout(self, task, nkpt=None, nbnd=None):
+        """Return the layout of a serial calculation."""
+        return self._make_layout(1)
+
+    def _make_layout(self, nproc, nthreads=1, npools=None):
+        """Distribute processes over the fewest nodes."""
+        ranks_per_node = max(1, self.cores_per_node // nthreads)
+        nodes = -(-nproc // ranks_per_node)
+        layout = OrderedDict()
+        layout['nodes'] = nodes
+        layout['nproc'] = nproc
+        layout['nproc_per_node'] = -(-nproc // nodes)
+        layout['nthreads'] = nthreads
+        layout['npools'] = npools
+        return layout
+
+    @staticmethod
+    def _largest_divisor(n, maximum):
+        """Return the largest divisor of n not exceeding maximum."""
+        for d in range(min(n, max(maximum, 1)), 0, -1):
+            if n % d == 0:
+                return d
+
+    def apply(self, task):
+        """
+        Set the layout of a task. For pw.x and pw2bgw.x,
+        the number of pools is given with the flag -nk in PWFLAGS.
+        Return the layout, or None if the task is left unchanged.
+        """
+        if not isinstance(task, MPITask):
+            return None
+
+        layout = self.get_layout(task)
+        if layout is None:
+            return None
+
+        task.nodes = layout['nodes']
+        task.nproc = layout['nproc']
+        task.nproc_per_node = layout['nproc_per_node']
+        task.nthreads = layout['nthreads']
+
+        if 'PWFLAGS' in task.runscript.variables:
+            flags = re.sub(r'\s*-(nk|npool|npools|nkpools)\s+\d+', '',
+                           str(task.runscript['PWFLAGS'])).strip()
+            if layout['npools'] and layout['npools'] > 1:
+                flags = ' '.join(
+                    f for f in (flags, '-nk {}'.format(layout['npools'])) if f)
+            task.runscript['PWFLAGS'] = flags
+
+        return layout
@@ -43,11 +43,26 @@ class RunScript(Writable):
         first_line :
             The first line of the script, e.g. '#!/bin/bash'.
 
+        instrument : bool (False)
+            Execute each command of main that starts with a variable,
+            e.g. '$MPIRUN $EXECUTABLE < $INPUT >& $OUTPUT',
+            through the timer, which records its wall time, exit code
+            and peak memory in the file timing_fname.
+
+        timer : str ('BGWpy_time_command.py')
+            Command used to time the executions.
+
+        timing_fname : str ('<fname>.timing.json')
+            File of the timing records, overwritten at each execution.
+            Defaults to a file named after the script, so that
+            the scripts sharing a directory keep their own records.
+
         """
 
         self.first_line = str()
         self.header = list()
         self.variables = OrderedDict()
+        self.exports = list()
         self.links = list()
         self.copies = list()
         self.main = list()
@@ -75,6 +90,10 @@ class RunScript(Writable):
         elif main is not None:
             self.main.extend(main)
 
+        self.instrument = kwargs.get('instrument', False)
+        self.timer = kwargs.get('timer', 'BGWpy_time_command.py')
+        self.timing_fname = kwargs.get('timing_fname')
+
         self.first_line = kwargs.get('first_line',
                                      default_runscript['first_line'])
 
@@ -90,6 +109,20 @@ class RunScript(Writable):
         elif footer is not None:
             self.footer.extend(footer)
 
+    @property
+    def timing_fname(self):
+        """File of the timing records."""
+        if self._timing_fname:
+            return self._timing_fname
+        fname = getattr(self, 'fname', None)
+        if fname:
+            return fname + '.timing.json'
+        return 'timing.json'
+
+    @timing_fname.setter
+    def timing_fname(self, value):
+        self._timing_fname = value
+
     def _check_pair(self, pair):
         """Check that an object is a pair of two elements."""
         try:
@@ -107,6 +140,12 @@ class RunScript(Writable):
         """Append a list of commands to the script."""
         self.main.extend(lines)
 
+    def export(self, key, value):
+        """Declare a variable exported to the environment of the commands."""
+        self.variables[key] = value
+        if key not in self.exports:
+            self.exports.append(key)
+
     def add_link(self, target, dest):
         self.links.append([target, dest])
 
@@ -119,6 +158,9 @@ class RunScript(Writable):
         assuming that both scripts are in the same directory.
         """
         self.variables.update(other.variables)
+        self.instrument = self.instrument or other.instrument
+        self.exports.extend(key for key in other.exports
+                            if key not in self.exports)
         self.links.extend(other.links)
         self.copies.extend(other.copies)
         self.main.extend(['\n'] + other.main)
@@ -134,6 +176,8 @@ class RunScript(Writable):
     def __delitem__(self, key):
         """Delete a variable."""
         del self.variables[key]
+        if key in self.exports:
+            self.exports.remove(key)
 
     def _get_quoted_string(self, value):
 
@@ -170,7 +214,10 @@ class RunScript(Writable):
 
         for name, value in self.variables.items():
             value = self._get_quoted_string(value)
-            S += '{}={}\n'.format(name, value)
+            if name in self.exports:
+                S += 'export {}={}\n'.format(name, value)
+            else:
+                S += '{}={}\n'.format(name, value)
 
         if self.links:
             S += '\n'
@@ -185,8 +232,15 @@ class RunScript(Writable):
             for src, dest in self.copies:
                 S += 'cp -f {} {}\n'.format(src, dest)
 
+        if self.instrument:
+            S += '\nTIMER={}\n'.format(self._get_quoted_string(
+                 '{} -o {}'.format(self.timer, self.timing_fname)))
+            S += 'rm -f {}\n'.format(self.timing_fname)
+
         S += '\n'
         for line in self.main:
+            if self.instrument and line.lstrip().startswith('$'):
+                line = line.replace('$', '$TIMER $', 1)
             S += line + '\n'
 
         S += '\n'
@@ -195,5 +249,6 @@ class RunScript(Writable):
 
         return S
 
-    def run(self):
-        subprocess.call(['bash', self.fname])
+    def run(self, cwd=None):
+        """Execute the script and return its exit code."""
+        return subprocess.call(['bash', self.fname], cwd=cwd)
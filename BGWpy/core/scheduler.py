@@ -0,0 +1,209 @@
+"""Submission of the tasks of a graph to a batch scheduler."""
+from __future__ import print_function
+import os
+import shlex
+import subprocess
+from collections import OrderedDict
+
+from .task import MPITask
+
+# Public
+__all__ = ['SlurmScheduler']
+
+
+class SlurmScheduler(object):
+    """
+    Submission of each task of a workflow as its own Slurm job,
+    with the resources requested by the task, and afterok dependencies
+    derived from the task graph.
+
+    Independent tasks with the same dependencies and the same resources
+    are grouped into a job array.
+
+    The scheduler commands are given as command lines,
+    so that any stand-in executable may be used instead of
+    the actual sbatch and squeue.
+    """
+
+    def __init__(self, sbatch='sbatch', squeue='squeue', options=None,
+                 task_options=None, use_arrays=True):
+        """
+        Keyword arguments
+        -----------------
+
+        sbatch : str ('sbatch')
+            Command used to submit a script. It must accept the flags
+            --parsable and --dependency, and print the job id.
+        squeue : str ('squeue')
+            Command used to query the state of the jobs.
+            It must accept the flags --noheader, --format and --jobs.
+        options : dict, optional
+            Options written as '#SBATCH --key=value' in every script,
+            e.g. dict(account='myaccount', time='01:00:00').
+            A value of None gives '#SBATCH --key'.
+        task_options : callable, optional
+            Function returning a dict of options for a given task,
+            which override the other options, e.g. to request
+            a longer wall time for epsilon than for pw2bgw.
+        use_arrays : bool (True)
+            Group the independent tasks that share their dependencies
+            and resources into job arrays.
+        """
+        self.sbatch = sbatch
+        self.squeue = squeue
+        self.options = OrderedDict(options or {})
+        self.task_options = task_options
+        self.use_arrays = use_arrays
+
+    def get_options(self, task):
+        """Return the options of the job of a task, except its name."""
+        options = OrderedDict()
+        if isinstance(task, MPITask) and task.mpirun:
+            options['ntasks'] = int(task.nproc or 1)
+            if task.nodes:
+                options['nodes'] = int(task.nodes)
+            if task.nthreads and int(task.nthreads) > 1:
+                options['cpus-per-task'] = int(task.nthreads)
+        else:
+            options['ntasks'] = 1
+        options.update(self.options)
+        if self.task_options is not None:
+            options.update(self.task_options(task))
+        return options
+
+    def get_jobs(self, graph):
+        """
+        Group the tasks of a graph into jobs.
+        Return a list of jobs in their order of submission,
+        each being a dictionary with the indices of its tasks,
+        its options, and the indices of the jobs it depends on.
+        """
+        jobs = list()
+        task_jobs = dict()
+        arrays = dict()
+        for i, task in enumerate(graph.tasks):
+            options = self.get_options(task)
+            dependencies = sorted(set(task_jobs[j]
+                                      for j in graph.dependencies[i]))
+            key = (tuple(dependencies), tuple(options.items()))
+
+            if self.use_arrays and key in arrays:
+                ijob = arrays[key]
+                jobs[ijob]['tasks'].append(i)
+            else:
+                ijob = len(jobs)
+                jobs.append(dict(tasks=[i], options=options,
+                                 dependencies=dependencies))
+                arrays[key] = ijob
+
+            task_jobs[i] = ijob
+
+        return jobs
+
+    def get_script(self, tasks, options):
+        """Return the content of the batch script for a list of tasks."""
+        lines = ['#!/bin/bash']
+        if len(tasks) == 1:
+            name = os.path.basename(os.path.realpath(tasks[0].dirname))
+        else:
+            name = 'array'
+        lines.append('#SBATCH --job-name={}'.format(name))
+        for key, value in options.items():
+            if value is None:
+                lines.append('#SBATCH --{}'.format(key))
+            else:
+                lines.append('#SBATCH --{}={}'.format(key, value))
+
+        if len(tasks) == 1:
+            task = tasks[0]
+            lines.append('#SBATCH --output={}'.format(
+                         os.path.abspath(task.runscript_fname) + '.slurm.out'))
+            lines.append('')
+            lines.append('cd {}'.format(os.path.abspath(task.dirname)))
+            lines.append('bash {}'.format(task.runscript.fname))
+        else:
+            lines.append('#SBATCH --array=0-{}'.format(len(tasks) - 1))
+            lines.append('')
+            lines.append('dirnames=(')
+            lines.extend('  {}'.format(os.path.abspath(task.dirname))
+                         for task in tasks)
+            lines.append(')')
+            lines.append('scripts=(')
+            lines.extend('  {}'.format(task.runscript.fname)
+                         for task in tasks)
+            lines.append(')')
+            lines.append('cd ${dirnames[$SLURM_ARRAY_TASK_ID]}')
+            lines.append('bash ${scripts[$SLURM_ARRAY_TASK_ID]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, flow):
+        """
+        Write the batch scripts of the tasks of a workflow.
+        Single tasks are submitted from a script written next to
+        their runscript, and job arrays from a script
+        in the main directory of the workflow.
+        Return the jobs, as in get_jobs, with the name of their script.
+        """
+        graph = flow.get_graph()
+        jobs = self.get_jobs(graph)
+        narrays = 0
+        for job in jobs:
+            tasks = [graph.tasks[i] for i in job['tasks']]
+            if len(tasks) == 1:
+                fname = os.path.splitext(tasks[0].runscript_fname)[0] + '.sbatch'
+            else:
+                narrays += 1
+                fname = os.path.join(flow.dirname,
+                                     'array-{:02}.sbatch'.format(narrays))
+            with open(fname, 'w') as f:
+                f.write(self.get_script(tasks, job['options']))
+            job['script'] = os.path.abspath(fname)
+        return jobs
+
+    def submit(self, flow):
+        """
+        Submit the tasks of a written workflow.
+        Return the job id of each task, in the order of the task graph.
+        """
+        jobs = self.write(flow)
+        for job in jobs:
+            job['jobid'] = self.submit_script(
+                job['script'], [jobs[j]['jobid'] for j in job['dependencies']])
+
+        task_jobids = dict()
+        for job in jobs:
+            for i in job['tasks']:
+                task_jobids[i] = job['jobid']
+        return [task_jobids[i] for i in sorted(task_jobids)]
+
+    def submit_script(self, fname, dependencies=()):
+        """Submit a script and return its job id."""
+        args = shlex.split(self.sbatch) + ['--parsable']
+        if dependencies:
+            args.append('--dependency=afterok:' + ':'.join(dependencies))
+        args.append(fname)
+        output = self.call(args, cwd=os.path.dirname(fname))
+        # The cluster name may follow the job id.
+        return output.strip().splitlines()[-1].split(';')[0]
+
+    def get_states(self, jobids):
+        """
+        Return the state of each job still known to the scheduler,
+        e.g. PENDING or RUNNING, as a dictionary.
+        """
+        if not jobids:
+            return dict()
+        args = shlex.split(self.squeue) + [
+            '--noheader', '--format=%i %T', '--jobs=' + ','.join(jobids)]
+        states = dict()
+        for line in self.call(args).splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                states[parts[0]] = parts[1]
+        return states
+
+    @staticmethod
+    def call(args, cwd=None):
+        """Execute a scheduler command and return its output."""
+        return subprocess.check_output(args, cwd=cwd, universal_newlines=True)
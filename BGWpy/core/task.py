@@ -4,11 +4,13 @@ import os
 import warnings
 import subprocess
 import pickle
+import hashlib
 import contextlib
 
 from ..config import default_mpi
 from .util import exec_from_dir, last_lines_contain
 from .runscript import RunScript
+from .timing import read_timing
 
 # Public
 __all__ = ['Task', 'MPITask', 'IOTask']
@@ -46,11 +48,15 @@ class Task(object):
             Write all the initialization variables in a pkl file
             at writing time. Must be set at initialization
             in order to be effective.
+        instrument : bool (False)
+            Record the wall time, exit code and peak memory
+            of the executions in the file <runscript_fname>.timing.json.
+            See get_timing.
 
         """
 
         self.dirname = dirname
-        self.runscript = RunScript()
+        self.runscript = RunScript(instrument=kwargs.get('instrument', False))
         self.runscript.fname = runscript_fname
         self.variables = kwargs if store_variables else dict()
 
@@ -90,8 +96,20 @@ class Task(object):
         return exec_from_dir(self.dirname)
 
     def run(self):
-        with self.exec_from_dirname():
-            self.runscript.run()
+        """Execute the runscript from dirname and return its exit code."""
+        return self.runscript.run(cwd=self.dirname)
+
+    def get_timing(self):
+        """
+        Return the records of the executions timed by the runscript,
+        when instrumented. See BGWpy.core.timing.time_command.
+        """
+        return read_timing(os.path.join(self.dirname,
+                                        self.runscript.timing_fname))
+
+    def get_ncores(self):
+        """Return the number of cores used by the task."""
+        return 1
 
     def write(self):
         subprocess.call(['mkdir', '-p', self.dirname])
@@ -99,7 +117,7 @@ class Task(object):
             self.runscript.write()
 
             if self.variables:
-                with open('variables.pkl', 'w') as f:
+                with open('variables.pkl', 'wb') as f:
                     pickle.dump(self.variables, f)
 
     def update_link(self, target, dest):
@@ -146,6 +164,94 @@ class Task(object):
         else:
             self.runscript.add_copy(relsource, dest)
 
+    def get_linked_files(self):
+        """
+        Return a list of pairs (fname, dest) for all files linked
+        or copied by the task, where fname is an absolute path
+        whose directory, but not the file itself, is resolved.
+        """
+        def normpath(fname):
+            dirname, basename = os.path.split(os.path.abspath(fname))
+            return os.path.join(os.path.realpath(dirname), basename)
+
+        dirname = os.path.realpath(self.dirname)
+        files = list()
+        for target, dest in self.runscript.links:
+            fname = os.path.join(dirname, os.path.dirname(dest), target)
+            files.append((normpath(fname), dest))
+        for source, dest in self.runscript.copies:
+            fname = os.path.join(dirname, source)
+            files.append((normpath(fname), dest))
+        return files
+
+    def get_fingerprint(self, check_files=True):
+        """
+        Return a hash of the task, made from the rendered input,
+        the runscript, and the linked files.
+
+        Keyword arguments
+        -----------------
+
+        check_files : bool (True)
+            Include the identity (real path, size and modification time)
+            of the linked files that exist. Otherwise, only their path is used.
+        """
+        sha = hashlib.sha1()
+
+        def update(obj):
+            sha.update(str(obj).encode('utf-8'))
+            sha.update(b'\0')
+
+        update(type(self).__name__)
+
+        if 'input' in dir(self):
+            update(self.input)
+
+        for lines in (self.runscript.header, self.runscript.main,
+                      self.runscript.footer):
+            update('\n'.join(lines))
+        for item in self.runscript.variables.items():
+            update(item)
+
+        for fname, dest in self.get_linked_files():
+            update((fname, dest))
+            if check_files and os.path.exists(fname):
+                stat = os.stat(fname)
+                update((os.path.realpath(fname), stat.st_size, stat.st_mtime_ns))
+
+        return sha.hexdigest()
+
+    @property
+    def fingerprint_fname(self):
+        """File in which the fingerprint of a completed run is recorded."""
+        return os.path.join(self.dirname, self.runscript.fname + '.fingerprint')
+
+    def record_fingerprint(self, fingerprint=None):
+        """Record the fingerprint of a completed run."""
+        if fingerprint is None:
+            fingerprint = self.get_fingerprint()
+        with open(self.fingerprint_fname, 'w') as f:
+            f.write(fingerprint + '\n')
+
+    def read_fingerprint(self):
+        """Return the recorded fingerprint, or None."""
+        if not os.path.exists(self.fingerprint_fname):
+            return None
+        with open(self.fingerprint_fname, 'r') as f:
+            return f.read().strip()
+
+    def is_unchanged(self):
+        """
+        True if the fingerprint of the task matches the one recorded
+        from a completed run, and the task does not report
+        an unfinished or unstarted status.
+        """
+        recorded = self.read_fingerprint()
+        if recorded is None or recorded != self.get_fingerprint():
+            return False
+        status = self.get_status()
+        return status not in (self._STATUS_UNSTARTED, self._STATUS_UNFINISHED)
+
     def get_status(self):
         """
         Return the status of the task. Possible status are:
@@ -153,6 +259,41 @@ class Task(object):
         """
         return self._STATUS_UNKNOWN
 
+    def _get_file_status(self, fname, check_time=False,
+                         check_fingerprint=False):
+        """
+        Return the status of a task whose completion is marked
+        by the existence of a file: Completed or Unstarted.
+
+        Keyword arguments
+        -----------------
+
+        check_time : bool (False)
+            Consider the task as unstarted if the file is older
+            than any of the files linked by the task.
+        check_fingerprint : bool (False)
+            Consider the task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
+        """
+        if check_fingerprint:
+            recorded = self.read_fingerprint()
+            if recorded is not None and recorded != self.get_fingerprint():
+                return self._STATUS_UNSTARTED
+
+        if not os.path.exists(fname):
+            return self._STATUS_UNSTARTED
+
+        if check_time:
+            output_creation_time = os.path.getmtime(fname)
+            for target, dest in self.runscript.links:
+                target = os.path.join(self.dirname, os.path.dirname(dest),
+                                      target)
+                if (os.path.exists(target) and
+                    os.path.getmtime(target) > output_creation_time):
+                    return self._STATUS_UNSTARTED
+
+        return self._STATUS_COMPLETED
+
     def is_complete(self):
         """True if the task reports a completed status."""
         status = self.get_status()
@@ -168,6 +309,9 @@ class Task(object):
             Write the task status in an open file.
         check_time: bool (False)
             Consider a task as unstarted if output is older than input.
+        check_fingerprint: bool (False)
+            Consider a task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
         color: bool (True)
             Color the output. Use this flag to disable the colors
             e.g. if you want to pipe the output to a file.
@@ -198,6 +342,7 @@ class MPITask(Task):
     _nproc_per_node_flag = default_mpi['nproc_per_node_flag']
     _nodes = default_mpi['nodes']
     _nodes_flag = default_mpi['nodes_flag']
+    _nthreads = default_mpi['nthreads']
 
     def __init__(self, *args, **kwargs):
         """
@@ -222,6 +367,9 @@ class MPITask(Task):
             Number of nodes.
         nodes_flag: str ('-n')
             Flag to specify the number of nodes to the mpi runner.
+        nthreads : int (None)
+            Number of OpenMP threads per process, exported as OMP_NUM_THREADS.
+            If None, the variable is left to the environment.
 
         """
 
@@ -232,10 +380,11 @@ class MPITask(Task):
         self.nproc_per_node_flag = default_mpi['nproc_per_node_flag']
         self.nproc = default_mpi['nproc']
         self.nproc_per_node = default_mpi['nproc_per_node']
+        self.nthreads = default_mpi['nthreads']
 
         for key in ('mpirun', 'nproc', 'nproc_flag',
                     'nproc_per_node', 'nproc_per_node_flag',
-                    'nodes', 'nodes_flag'):
+                    'nodes', 'nodes_flag', 'nthreads'):
                    
             if key in kwargs:
                 setattr(self, key, kwargs[key])
@@ -328,6 +477,24 @@ class MPITask(Task):
         self._nodes_flag = value
         self._declare_mpirun()
 
+    @property
+    def nthreads(self):
+        return self._nthreads
+
+    @nthreads.setter
+    def nthreads(self, value):
+        self._nthreads = value
+        if value:
+            self.runscript.export('OMP_NUM_THREADS', str(value))
+        elif 'OMP_NUM_THREADS' in self.runscript.variables:
+            del self.runscript['OMP_NUM_THREADS']
+
+    def get_ncores(self):
+        """Return the number of cores used by the task."""
+        if not self.mpirun:
+            return int(self.nthreads or 1)
+        return int(self.nproc or 1) * int(self.nthreads or 1)
+
     @property
     def mpirun_n(self):
         return self.mpirun + ' ' + self.nproc_flag
@@ -373,7 +540,25 @@ class IOTask(Task):
     # It is important that this task has no __init__ function,
     # because it is mostly used with multiple-inheritance classes.
 
-    def get_status(self, check_time=False):
+    def get_status(self, check_time=False, check_fingerprint=False):
+        """
+        Return the status of the task. Possible status are:
+        Completed, Unstarted, Unfinished, Unknown.
+
+        Keyword arguments
+        -----------------
+
+        check_time : bool (False)
+            Consider a task as unstarted if output is older than input.
+        check_fingerprint : bool (False)
+            Consider a task as unstarted if its fingerprint differs
+            from the one recorded after its last completed run.
+        """
+
+        if check_fingerprint:
+            recorded = self.read_fingerprint()
+            if recorded is not None and recorded != self.get_fingerprint():
+                return self._STATUS_UNSTARTED
 
         if self._input_fname:
 
@@ -395,7 +580,8 @@ class IOTask(Task):
         if not self._TAG_JOB_COMPLETED:
             return self._STATUS_UNKNOWN
 
-        if last_lines_contain(self.output_fname, self._TAG_JOB_COMPLETED):
+        if last_lines_contain(self.output_fname, self._TAG_JOB_COMPLETED,
+                              use_cache=True):
             return self._STATUS_COMPLETED
 
         return self._STATUS_UNFINISHED
@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+
+from ...tests import TestTask
+from .. import Task, Workflow, AsyncRunner
+
+class TestAsyncRunner(TestTask):
+    """Test the asynchronous execution of a workflow."""
+
+    def get_task(self, name, main, links=()):
+        task = Task(dirname=os.path.join(self.tmpdir, 'Flow', name))
+        for target, dest in links:
+            task.update_link(os.path.join(self.tmpdir, 'Flow', target), dest)
+        task.runscript.extend(main)
+        return task
+
+    def get_workflow(self, tasks):
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(tasks)
+        flow.write()
+        return flow
+
+    def test_concurrency_limit(self):
+        """Test that at most max_concurrent tasks run at the same time."""
+        running = os.path.join(self.tmpdir, 'running')
+        os.mkdir(running)
+        main = [
+            'touch {}/$$'.format(running),
+            'ls {} | wc -l > count'.format(running),
+            'sleep 0.3',
+            'rm {}/$$'.format(running),
+            ]
+        tasks = [self.get_task(name, main) for name in 'abcd']
+        flow = self.get_workflow(tasks)
+
+        runner = AsyncRunner(max_concurrent=2)
+        self.assertEqual(flow.run(executor=runner), [0, 0, 0, 0])
+        self.assertEqual(runner.states, ['Completed'] * 4)
+
+        counts = list()
+        for task in tasks:
+            with open(os.path.join(task.dirname, 'count'), 'r') as f:
+                counts.append(int(f.read()))
+        self.assertLessEqual(max(counts), 2)
+
+    def test_failure(self):
+        """Test that the dependents of a failed task are not executed."""
+        tasks = [
+            self.get_task('a', ['exit 1']),
+            self.get_task('b', ['touch out'], links=[('a/out', 'in')]),
+            self.get_task('c', ['touch out']),
+            ]
+        flow = self.get_workflow(tasks)
+        runner = AsyncRunner()
+        self.assertEqual(flow.run(executor=runner), [1, None, 0])
+        self.assertEqual(runner.states, ['Failed', 'Skipped', 'Completed'])
+        self.assertFalse(os.path.exists(os.path.join(tasks[1].dirname, 'out')))
+
+    def test_timeout(self):
+        """Test that a task exceeding its wall time is terminated."""
+        tasks = [
+            self.get_task('a', ['sleep 10']),
+            self.get_task('b', ['sleep 0.1']),
+            ]
+        flow = self.get_workflow(tasks)
+        runner = AsyncRunner(
+            timeout=lambda task: 0.3 if task is tasks[0] else None)
+        start = time.time()
+        self.assertEqual(flow.run(executor=runner), [None, 0])
+        self.assertLess(time.time() - start, 5.)
+        self.assertEqual(runner.states, ['TimedOut', 'Completed'])
+
+    def test_retries(self):
+        """Test the retries on a configured exit code."""
+        main = [
+            'echo x >> attempts',
+            'if [ $(cat attempts | wc -l) -lt 3 ]; then exit 75; fi',
+            ]
+        tasks = [self.get_task('a', main), self.get_task('b', ['exit 2'])]
+        flow = self.get_workflow(tasks)
+        runner = AsyncRunner(retries=3, retry_exit_codes=[75], backoff=0.01)
+        self.assertEqual(flow.run(executor=runner), [0, 2])
+        self.assertEqual(runner.states, ['Completed', 'Failed'])
+        with open(os.path.join(tasks[0].dirname, 'attempts'), 'r') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_cancel(self):
+        """Test the cancellation from another thread."""
+        tasks = [
+            self.get_task('a', ['sleep 10']),
+            self.get_task('b', ['touch out'], links=[('a/out', 'in')]),
+            ]
+        flow = self.get_workflow(tasks)
+        runner = AsyncRunner()
+        timer = threading.Timer(0.3, runner.cancel)
+        timer.start()
+        start = time.time()
+        try:
+            flow.run(executor=runner)
+        finally:
+            timer.cancel()
+        self.assertLess(time.time() - start, 5.)
+        self.assertEqual(runner.states, ['Cancelled', 'Skipped'])
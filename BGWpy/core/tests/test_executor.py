@@ -0,0 +1,197 @@
+import os
+
+from ...tests import TestTask
+from .. import Task, MPITask, Workflow, LocalExecutor
+
+class TestLocalExecutor(TestTask):
+    """Test the packing of tasks within a pool of cores."""
+
+    def get_task(self, name, nproc, cls=MPITask):
+        kwargs = dict(dirname=os.path.join(self.tmpdir, 'Flow', name))
+        if cls is MPITask:
+            kwargs.update(mpirun='fake_mpirun', nproc=nproc,
+                          nproc_per_node=None)
+        task = cls(**kwargs)
+        task.runscript.extend([
+            'echo "$MPIRUN" > mpirun',
+            'date +%s.%N > start',
+            'sleep 0.3',
+            'date +%s.%N > end',
+            ])
+        return task
+
+    def get_workflow(self):
+        self.tasks = [
+            self.get_task('a', 2),
+            self.get_task('b', 3),
+            self.get_task('c', 2),
+            self.get_task('d', 1),
+            self.get_task('e', 1, cls=Task),
+            ]
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(self.tasks)
+        return flow
+
+    def read(self, task, basename):
+        with open(os.path.join(task.dirname, basename), 'r') as f:
+            return f.read().strip()
+
+    def test_placement(self):
+        """Test the hosts and cores assigned to a task."""
+        executor = LocalExecutor(hosts=['node1', 'node2'], cores_per_host=2,
+                                 cpu_set_flag='--cpu-set')
+        free = executor.get_free_cores()
+        task = self.get_task('a', 3)
+        placement = executor.allocate(free, task)
+        self.assertEqual(sum(len(c) for c in placement.values()), 3)
+        self.assertEqual(sum(len(c) for c in free.values()), 1)
+        self.assertIsNone(executor.allocate(free, self.get_task('b', 2)))
+
+        variable = executor.get_mpirun_variable(task, placement)
+        self.assertTrue(variable.startswith('fake_mpirun -n 3 --host '))
+        self.assertIn('--cpu-set 0,1', variable)
+
+        executor.release(free, placement)
+        self.assertEqual(free, executor.get_free_cores())
+
+    def test_nproc_per_node(self):
+        """Test the placement of a task with a number of processes per node."""
+        executor = LocalExecutor(hosts=['node1', 'node2', 'node3'],
+                                 cores_per_host=4)
+        free = executor.get_free_cores()
+        task = self.get_task('a', 4)
+        task.nproc_per_node = 2
+        placement = executor.allocate(free, task)
+        self.assertEqual([len(c) for c in placement.values()], [2, 2])
+        self.assertEqual(executor.get_mpirun_variable(task, placement),
+                         'fake_mpirun -n 4 --npernode 2 --host {}:2,{}:2'.format(
+                         *placement))
+
+        # A task that fills its nodes, next to a partially used one.
+        task = self.get_task('b', 8)
+        task.nproc_per_node = 4
+        self.assertIsNone(executor.allocate(free, task))
+
+        # The number of nodes cannot hold the processes.
+        task = self.get_task('c', 8)
+        task.nproc_per_node = 2
+        task.nodes = 2
+        self.assertIsNone(executor.allocate(executor.get_free_cores(), task))
+
+    def test_threads(self):
+        """Test that each process takes as many cores as its threads."""
+        executor = LocalExecutor(hosts=['node1', 'node2'], cores_per_host=4)
+        free = executor.get_free_cores()
+        task = self.get_task('a', 2)
+        task.nthreads = 2
+        placement = executor.allocate(free, task)
+        self.assertEqual([len(c) for c in placement.values()], [4])
+        self.assertEqual(executor.get_mpirun_variable(task, placement),
+                         'fake_mpirun -n 2 --host {}:2'.format(*placement))
+
+        # Three processes of two threads do not fit in the four free cores.
+        task = self.get_task('b', 3)
+        task.nthreads = 2
+        self.assertIsNone(executor.allocate(free, task))
+
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        tasks = [self.get_task(name, 2) for name in 'cdef']
+        for task in tasks:
+            task.nthreads = 2
+        flow.add_tasks(tasks)
+        flow.write()
+        self.assertEqual(flow.run(executor=executor), [0] * 4)
+
+        events = list()
+        for task in tasks:
+            events.append((float(self.read(task, 'start')), 4))
+            events.append((float(self.read(task, 'end')), -4))
+        used = 0
+        for time, ncores in sorted(events, key=lambda e: (e[0], e[1])):
+            used += ncores
+            self.assertLessEqual(used, executor.ncores)
+
+    def test_too_large(self):
+        """Test that a task larger than the pool is refused."""
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'),
+                        tasks=[self.get_task('a', 5)])
+        executor = LocalExecutor(hosts=['node1', 'node2'], cores_per_host=2)
+        with self.assertRaises(Exception):
+            flow.run(executor=executor)
+
+    def test_run(self):
+        """Test that the running tasks never exceed the pool."""
+        flow = self.get_workflow()
+        flow.write()
+        executor = LocalExecutor(hosts=['node1', 'node2'], cores_per_host=2)
+        returncodes = flow.run(executor=executor)
+        self.assertEqual(returncodes, [0] * len(self.tasks))
+
+        self.assertEqual(self.read(self.tasks[0], 'mpirun'),
+                         'fake_mpirun -n 2 --host node1:2')
+        self.assertEqual(self.read(self.tasks[4], 'mpirun'), '')
+
+        # The original MPIRUN variable is kept in memory.
+        self.assertEqual(self.tasks[0].runscript['MPIRUN'],
+                         self.tasks[0].mpirun_variable)
+
+        events = list()
+        for task in self.tasks:
+            ncores = task.get_ncores()
+            events.append((float(self.read(task, 'start')), ncores))
+            events.append((float(self.read(task, 'end')), -ncores))
+        used = 0
+        for time, ncores in sorted(events, key=lambda e: (e[0], e[1])):
+            used += ncores
+            self.assertLessEqual(used, executor.ncores)
+
+        # Some tasks ran side by side.
+        starts = sorted(float(self.read(task, 'start')) for task in self.tasks)
+        ends = sorted(float(self.read(task, 'end')) for task in self.tasks)
+        self.assertLess(starts[1], ends[0])
+
+    def test_failed_dependency(self):
+        """Test that the dependents of a failed task are not executed."""
+        first = self.get_task('a', 2)
+        first.runscript.append('exit 3')
+        second = self.get_task('b', 1)
+        second.update_link(os.path.join(first.dirname, 'end'), 'in')
+        third = self.get_task('c', 1)
+        third.update_link(os.path.join(second.dirname, 'end'), 'in')
+        other = self.get_task('d', 1)
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'),
+                        tasks=[first, second, third, other])
+        flow.write()
+        executor = LocalExecutor(hosts=['node1'], cores_per_host=2)
+        returncodes = flow.run(executor=executor)
+        self.assertEqual(returncodes, [3, None, None, 0])
+        for task in (second, third):
+            self.assertFalse(os.path.exists(os.path.join(task.dirname, 'start')))
+
+    def test_relative_dirnames(self):
+        """Test that the placement does not change the current directory."""
+        original = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            tasks = list()
+            for i in range(16):
+                task = MPITask(dirname=os.path.join('Flow', 't{:0>2}'.format(i)),
+                               mpirun='fake_mpirun', nproc=1,
+                               nproc_per_node=None)
+                task.runscript.extend(['echo "$MPIRUN" > mpirun', 'sleep 0.1'])
+                tasks.append(task)
+            flow = Workflow(dirname='Flow', tasks=tasks)
+            flow.write()
+            executor = LocalExecutor(hosts=['node1'], cores_per_host=16)
+            returncodes = flow.run(executor=executor)
+            self.assertEqual(os.getcwd(), os.path.realpath(self.tmpdir))
+        finally:
+            os.chdir(original)
+
+        self.assertEqual(returncodes, [0] * len(tasks))
+        for task in tasks:
+            path = os.path.join(self.tmpdir, task.dirname)
+            with open(os.path.join(path, 'mpirun'), 'r') as f:
+                self.assertTrue(f.read().startswith('fake_mpirun -n 1 '))
+            self.assertTrue(os.path.exists(
+                os.path.join(path, task.runscript.fname + '.fingerprint')))
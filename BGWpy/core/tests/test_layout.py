@@ -0,0 +1,100 @@
+import os
+
+from ...tests import TestTask
+from .. import MPITask, Workflow, Card, LayoutPolicy, SlurmScheduler
+
+class Input(object):
+    """A stand-in for the input of a calculation."""
+
+    def __init__(self, nkpt=None, nbnd=None):
+        self.variables = dict()
+        if nkpt is not None:
+            self.k_points = Card('K_POINTS', 'crystal')
+            self.k_points.append(nkpt)
+        if nbnd is not None:
+            self.variables['number_bands'] = nbnd
+
+
+class TestLayoutPolicy(TestTask):
+    """Test the choice of the layout of each task."""
+
+    def get_task(self, name, variables, nkpt=None, nbnd=None):
+        task = MPITask(dirname=os.path.join(self.tmpdir, 'Flow', name),
+                       nproc=512)
+        for key, value in variables.items():
+            task.runscript[key] = value
+        task.input = Input(nkpt, nbnd)
+        return task
+
+    def get_workflow(self):
+        self.tasks = [
+            self.get_task('scf', dict(PW='pw.x', PWFLAGS='-nd 1 -nk 4'),
+                          nkpt=6),
+            self.get_task('wfn', dict(PW='pw.x', PW2BGW='pw2bgw.x',
+                                      PWFLAGS=''), nkpt=64),
+            self.get_task('epsilon', dict(EPSILON='epsilon.cplx.x'),
+                          nbnd=20),
+            self.get_task('kernel', dict(KERNEL='kernel.cplx.x'), nbnd=20),
+            self.get_task('inteqp', dict(INTEQP='inteqp.cplx.x')),
+            self.get_task('other', dict()),
+            ]
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(self.tasks)
+        return flow
+
+    def test_layout(self):
+        """Test the layout of each kind of task."""
+        flow = self.get_workflow()
+        policy = LayoutPolicy(nodes=2, cores_per_node=32, threads_per_rank=4)
+        layouts = flow.set_layout(policy)
+        scf, wfn, epsilon, kernel, inteqp, other = self.tasks
+
+        self.assertEqual([policy.get_category(task) for task in self.tasks],
+                         ['pw', 'pw2bgw', 'bgw', 'bgw', 'serial', None])
+
+        # pw.x uses all the cores, with as many pools as k-points allow.
+        self.assertEqual(dict(layouts[0]), dict(
+            nodes=2, nproc=64, nproc_per_node=32, nthreads=1, npools=4))
+        self.assertEqual(scf.runscript['PWFLAGS'], '-nd 1 -nk 4')
+        self.assertEqual(scf.runscript['MPIRUN'], 'mpirun -n 64 --npernode 32')
+
+        # pw2bgw.x stays on one node.
+        self.assertEqual((wfn.nproc, wfn.nodes), (32, 1))
+        self.assertEqual(wfn.runscript['PWFLAGS'], '-nk 32')
+
+        # The BerkeleyGW codes use threads, epsilon is limited by the bands.
+        self.assertEqual((epsilon.nproc, epsilon.nthreads), (16, 4))
+        self.assertEqual((epsilon.nodes, epsilon.nproc_per_node), (2, 8))
+        self.assertEqual((kernel.nproc, kernel.nproc_per_node), (16, 8))
+        self.assertIn("export OMP_NUM_THREADS='4'", str(kernel.runscript))
+
+        self.assertEqual((inteqp.nproc, inteqp.nthreads), (1, 1))
+        self.assertIsNone(layouts[-1])
+        self.assertEqual(other.nproc, 512)
+
+        options = SlurmScheduler().get_options(kernel)
+        self.assertEqual(options['cpus-per-task'], 4)
+        self.assertNotIn('cpus-per-task', SlurmScheduler().get_options(scf))
+
+    def test_pools(self):
+        """Test that the number of pools divides the number of processes."""
+        task = self.get_task('scf', dict(PW='pw.x', PWFLAGS='-nk 2'), nkpt=10)
+        layout = LayoutPolicy(cores_per_node=24).apply(task)
+        self.assertEqual((layout['nproc'], layout['npools']), (24, 8))
+        self.assertEqual(task.runscript['PWFLAGS'], '-nk 8')
+
+        task = self.get_task('scf', dict(PW='pw.x', PWFLAGS='-nk 2'), nkpt=1)
+        LayoutPolicy(cores_per_node=24).apply(task)
+        self.assertEqual(task.runscript['PWFLAGS'], '')
+
+    def test_override(self):
+        """Test a policy overriding the layout of a kind of task."""
+        class Policy(LayoutPolicy):
+            def get_pw2bgw_layout(self, task, nkpt=None, nbnd=None):
+                return self._make_layout(1)
+
+        task = self.get_task('wfn', dict(PW='pw.x', PW2BGW='pw2bgw.x',
+                                         PWFLAGS='-nk 4'), nkpt=8)
+        Policy(cores_per_node=8).apply(task)
+        self.assertEqual(task.nproc, 1)
+        self.assertEqual(task.runscript['PWFLAGS'], '')
@@ -0,0 +1,103 @@
+import os
+import stat
+
+from ...tests import TestTask
+from .. import Task, MPITask, Workflow, SlurmScheduler
+
+class TestSlurmScheduler(TestTask):
+    """Test the submission of a workflow to a stand-in scheduler."""
+
+    def write_command(self, name, lines):
+        fname = os.path.join(self.tmpdir, name)
+        with open(fname, 'w') as f:
+            f.write('\n'.join(['#!/bin/bash'] + lines) + '\n')
+        os.chmod(fname, os.stat(fname).st_mode | stat.S_IEXEC)
+        return fname
+
+    def get_scheduler(self, **kwargs):
+        log = os.path.join(self.tmpdir, 'sbatch.log')
+        counter = os.path.join(self.tmpdir, 'jobid')
+        sbatch = self.write_command('sbatch', [
+            'echo "$@" >> {}'.format(log),
+            'jobid=$(( $(cat {0} 2>/dev/null || echo 100) + 1 ))'.format(counter),
+            'echo $jobid > {}'.format(counter),
+            'echo "$jobid;cluster"',
+            ])
+        squeue = self.write_command('squeue', [
+            'echo "101 RUNNING"',
+            'echo "102 PENDING"',
+            ])
+        self.sbatch_log = log
+        return SlurmScheduler(sbatch=sbatch, squeue=squeue, **kwargs)
+
+    def get_task(self, name, nproc=None, links=()):
+        dirname = os.path.join(self.tmpdir, 'Flow', name)
+        if nproc:
+            task = MPITask(dirname=dirname, nproc=nproc)
+        else:
+            task = Task(dirname=dirname)
+        for target, dest in links:
+            task.update_link(os.path.join(self.tmpdir, 'Flow', target), dest)
+        return task
+
+    def get_workflow(self):
+        """A diamond-shaped flow: a -> (b, c) -> d."""
+        self.tasks = [
+            self.get_task('a', nproc=4),
+            self.get_task('b', links=[('a/out', 'in')]),
+            self.get_task('c', links=[('a/out', 'in')]),
+            self.get_task('d', nproc=16, links=[('b/out', 'in1'),
+                                                ('c/out', 'in2')]),
+            ]
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(self.tasks)
+        return flow
+
+    def test_jobs(self):
+        """Test the grouping of the tasks into jobs."""
+        flow = self.get_workflow()
+        scheduler = SlurmScheduler()
+        jobs = scheduler.get_jobs(flow.get_graph())
+        self.assertEqual([job['tasks'] for job in jobs], [[0], [1, 2], [3]])
+        self.assertEqual([job['dependencies'] for job in jobs],
+                         [[], [0], [1]])
+        self.assertEqual(jobs[0]['options']['ntasks'], 4)
+        self.assertEqual(jobs[2]['options']['ntasks'], 16)
+
+        scheduler = SlurmScheduler(use_arrays=False)
+        jobs = scheduler.get_jobs(flow.get_graph())
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(jobs[3]['dependencies'], [1, 2])
+
+    def test_submit(self):
+        """Test the scripts and dependencies of the submitted jobs."""
+        flow = self.get_workflow()
+        flow.write()
+        scheduler = self.get_scheduler(
+            options=dict(account='myaccount'),
+            task_options=lambda task: (
+                dict(time='02:00:00') if task is self.tasks[3] else {}))
+        jobids = flow.submit(scheduler)
+        self.assertEqual(jobids, ['101', '102', '102', '103'])
+
+        with open(self.sbatch_log, 'r') as f:
+            calls = f.read().splitlines()
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[1].split()[:2],
+                         ['--parsable', '--dependency=afterok:101'])
+        self.assertIn('--dependency=afterok:102', calls[2])
+
+        with open(calls[1].split()[-1], 'r') as f:
+            array_script = f.read()
+        self.assertIn('#SBATCH --array=0-1', array_script)
+        self.assertIn('#SBATCH --account=myaccount', array_script)
+        self.assertIn('bash ${scripts[$SLURM_ARRAY_TASK_ID]}', array_script)
+
+        with open(calls[2].split()[-1], 'r') as f:
+            script = f.read()
+        self.assertIn('#SBATCH --ntasks=16', script)
+        self.assertIn('#SBATCH --time=02:00:00', script)
+        self.assertIn('cd {}'.format(self.tasks[3].dirname), script)
+
+        states = scheduler.get_states(['101', '102'])
+        self.assertEqual(states, {'101': 'RUNNING', '102': 'PENDING'})
@@ -28,10 +28,39 @@ class TestBasicTask(TestTask):
         assert task.variables == variables
         task.write()
         fname = os.path.join(task.dirname, 'variables.pkl')
-        with open(fname, 'r') as f:
+        with open(fname, 'rb') as f:
             read_variables = pickle.load(f)
         assert read_variables == variables
 
+    def test_fingerprint(self):
+        """Test the fingerprint of the runscript and linked files."""
+        fname = os.path.join(self.tmpdir, 'linked_file')
+        with open(fname, 'w') as f:
+            f.write('content')
+
+        task = self.get_task()
+        task.update_link(fname, 'link')
+        fingerprint = task.get_fingerprint()
+
+        # Rewriting the task does not change the fingerprint.
+        task.write()
+        task.record_fingerprint()
+        task.write()
+        self.assertEqual(task.read_fingerprint(), fingerprint)
+        assert task.is_unchanged()
+
+        # Modifying a linked file does.
+        os.utime(fname, ns=(0, 0))
+        self.assertNotEqual(task.get_fingerprint(), fingerprint)
+        assert not task.is_unchanged()
+
+        # And so does modifying the runscript.
+        task = self.get_task()
+        task.update_link(fname, 'link')
+        fingerprint = task.get_fingerprint()
+        task.runscript.append('echo')
+        self.assertNotEqual(task.get_fingerprint(), fingerprint)
+
     def test_run(self):
         """Test Runscript run function."""
         task = self.get_task()
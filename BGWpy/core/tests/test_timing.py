@@ -0,0 +1,97 @@
+import os
+import sys
+from unittest import mock
+
+from ...tests import TestTask
+from .. import Task, MPITask, Workflow
+import BGWpy.scripts
+
+class TestTiming(TestTask):
+    """Test the timing of the executions of instrumented runscripts."""
+
+    timer = '{} {}'.format(sys.executable, os.path.join(
+        os.path.dirname(BGWpy.scripts.__file__), 'BGWpy_time_command.py'))
+
+    def get_task(self, name, main, **kwargs):
+        task = MPITask(dirname=os.path.join(self.tmpdir, 'Flow', name),
+                       instrument=True, mpirun='', **kwargs)
+        task.runscript.timer = self.timer
+        task.runscript['PROG'] = 'echo'
+        task.runscript.extend(main)
+        return task
+
+    def test_runscript(self):
+        """Test that only the commands starting with a variable are timed."""
+        task = self.get_task('a', ['cd .', '$MPIRUN $PROG hello > out'])
+        lines = str(task.runscript).splitlines()
+        self.assertIn('cd .', lines)
+        self.assertIn('$TIMER $MPIRUN $PROG hello > out', lines)
+        self.assertIn('rm -f run.sh.timing.json', lines)
+
+        task.runscript.instrument = False
+        self.assertNotIn('$TIMER', str(task.runscript))
+
+    def test_workflow(self):
+        """Test the records of the tasks of a workflow."""
+        # The timer must import BGWpy, which might not be installed.
+        root = os.path.dirname(os.path.dirname(BGWpy.scripts.__file__))
+        with mock.patch.dict(os.environ, PYTHONPATH=os.path.dirname(root)):
+            self.check_workflow()
+
+    def test_shared_directory(self):
+        """Test the records of two runscripts of the same directory."""
+        root = os.path.dirname(os.path.dirname(BGWpy.scripts.__file__))
+        with mock.patch.dict(os.environ, PYTHONPATH=os.path.dirname(root)):
+            self.check_shared_directory()
+
+    def check_shared_directory(self):
+        tasks = [
+            self.get_task('wfn', ['$PROG wfn > out'], nthreads=2),
+            self.get_task('wfn', ['$PROG pw2bgw > out.pw2bgw'],
+                          runscript_fname='pw2bgw.run.sh'),
+            ]
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(tasks)
+        flow.write()
+        flow.run()
+
+        timing = flow.get_timing()
+        self.assertEqual(list(timing), ['wfn', 'wfn/pw2bgw.run.sh'])
+        self.assertEqual(timing['wfn'][0]['command'], 'echo wfn')
+        self.assertEqual(timing['wfn/pw2bgw.run.sh'][0]['command'],
+                         'echo pw2bgw')
+
+        table = flow.get_timing_table().splitlines()
+        self.assertEqual(len(table), 4)
+
+    def check_workflow(self):
+        tasks = [
+            self.get_task('a', ['$PROG hello > out'], nthreads=4),
+            self.get_task('b', ['$PROG hello > out', '$FAIL']),
+            Task(dirname=os.path.join(self.tmpdir, 'Flow', 'c')),
+            ]
+        tasks[1].runscript['FAIL'] = 'false'
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks(tasks)
+        flow.write()
+        flow.run(parallel=True)
+
+        with open(os.path.join(tasks[0].dirname, 'out')) as f:
+            self.assertEqual(f.read(), 'hello\n')
+
+        timing = flow.get_timing()
+        self.assertEqual(list(timing), ['a', 'b'])
+        self.assertEqual([r['exit_code'] for r in timing['b']], [0, 1])
+        record = timing['a'][0]
+        self.assertEqual(record['command'], 'echo hello')
+        self.assertGreaterEqual(record['walltime'], 0.)
+        self.assertGreater(record['max_rss'], 0)
+
+        # A new execution overwrites the records.
+        tasks[0].run()
+        self.assertEqual(len(tasks[0].get_timing()), 1)
+
+        table = flow.get_timing_table().splitlines()
+        self.assertEqual(len(table), 5)
+        self.assertTrue(table[1].startswith('a '))
+        self.assertIn('echo', table[1])
@@ -0,0 +1,57 @@
+import os
+import unittest
+import tempfile, shutil
+
+from ..util import tail, last_lines_contain
+
+class TestTail(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, 'file.out')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content):
+        with open(self.fname, 'w') as f:
+            f.write(content)
+
+    def test_tail(self):
+        """Test reading the last lines, across several blocks."""
+        lines = ['line {}\n'.format(i) for i in range(1000)]
+        self.write(''.join(lines))
+        for nlines in (0, 1, 60, 999, 1000, 2000):
+            for blocksize in (7, 8192):
+                expected = lines[-nlines:] if nlines else []
+                result = tail(self.fname, nlines, blocksize=blocksize)
+                self.assertEqual(result, expected)
+
+    def test_tail_no_trailing_newline(self):
+        """Test reading the last lines of a file with no final newline."""
+        self.write('first\nsecond\nthird')
+        self.assertEqual(tail(self.fname, 2, blocksize=3), ['second\n', 'third'])
+
+    def test_last_lines_contain(self):
+        """Test the cached search for a tag."""
+        self.write('start\n' + 100 * 'running\n')
+        for use_cache in (False, True):
+            assert not last_lines_contain(self.fname, 'TOTAL', use_cache=use_cache)
+            assert last_lines_contain(self.fname, 'start', 101, use_cache=use_cache)
+
+        self.write('start\n' + 100 * 'running\n' + 'TOTAL\n')
+        assert last_lines_contain(self.fname, 'TOTAL', use_cache=True)
+
+    def test_cache_size(self):
+        """Test that the cache keeps only the most recent files."""
+        from .. import util
+        util._tail_cache.clear()
+        for i in range(util._tail_cache_size + 10):
+            fname = os.path.join(self.tmpdir, 'file{}.out'.format(i))
+            with open(fname, 'w') as f:
+                f.write('TOTAL\n')
+            assert last_lines_contain(fname, 'TOTAL', use_cache=True)
+        self.assertEqual(len(util._tail_cache), util._tail_cache_size)
+        self.assertIn(os.path.realpath(fname), util._tail_cache)
+        self.assertNotIn(os.path.realpath(os.path.join(self.tmpdir, 'file0.out')),
+                         util._tail_cache)
@@ -0,0 +1,106 @@
+import os
+
+from ...tests import TestTask
+from .. import Task, Workflow
+
+class TestWorkflowGraph(TestTask):
+    """Test the dependency graph and parallel execution of Workflow."""
+
+    def get_task(self, name, main, links=()):
+        task = Task(dirname=os.path.join(self.tmpdir, 'Flow', name))
+        for target, dest in links:
+            task.update_link(os.path.join(self.tmpdir, 'Flow', target), dest)
+        task.runscript.extend(main)
+        return task
+
+    def get_workflow(self):
+        """A diamond-shaped flow: a -> (b, c) -> d."""
+        wait_for_c = [
+            'touch started',
+            'for i in $(seq 50); do',
+            '  if [ -f ../c/started ]; then break; fi',
+            '  sleep 0.1',
+            'done',
+            'if [ -f ../c/started ]; then touch concurrent; fi',
+            ]
+        wait_for_b = [
+            line.replace('../c/', '../b/') for line in wait_for_c]
+
+        self.task_a = self.get_task('a', ['echo a > out'])
+        self.task_b = self.get_task('b',
+            wait_for_c + ['cat in > out', 'echo b >> out'],
+            links=[('a/out', 'in')])
+        self.task_c = self.get_task('c',
+            wait_for_b + ['cat in > out', 'echo c >> out'],
+            links=[('a/out', 'in')])
+        self.task_d = self.get_task('d', ['cat in1 in2 > out'],
+            links=[('b/out', 'in1'), ('c/out', 'in2')])
+
+        flow = Workflow(dirname=os.path.join(self.tmpdir, 'Flow'))
+        flow.add_tasks([self.task_a, self.task_b, self.task_c, self.task_d])
+        return flow
+
+    def test_dependencies(self):
+        """Test dependencies derived from the links."""
+        flow = self.get_workflow()
+        graph = flow.get_graph()
+        self.assertEqual(graph.get_dependencies(self.task_a), [])
+        self.assertEqual(graph.get_dependencies(self.task_b), [self.task_a])
+        self.assertEqual(graph.get_dependencies(self.task_c), [self.task_a])
+        self.assertEqual(graph.get_dependencies(self.task_d),
+                         [self.task_b, self.task_c])
+
+    def test_same_directory(self):
+        """Test that tasks sharing a directory are executed in order."""
+        first = self.get_task('a', [])
+        second = self.get_task('a', [])
+        second.runscript.fname = 'second.sh'
+        flow = Workflow(dirname=self.tmpdir, tasks=[first, second])
+        graph = flow.get_graph()
+        self.assertEqual(graph.get_dependencies(second), [first])
+
+    def test_parallel_run(self):
+        """Test that independent tasks are executed concurrently."""
+        flow = self.get_workflow()
+        flow.write()
+        returncodes = flow.run(parallel=True, max_workers=2)
+        self.assertEqual(returncodes, [0, 0, 0, 0])
+
+        with open(os.path.join(self.task_d.dirname, 'out'), 'r') as f:
+            content = f.read()
+        self.assertEqual(content, 'a\nb\na\nc\n')
+        for task in (self.task_b, self.task_c):
+            fname = os.path.join(task.dirname, 'concurrent')
+            assert os.path.exists(fname)
+
+    def test_failed_dependency(self):
+        """Test that the dependents of a failed task are not executed."""
+        flow = self.get_workflow()
+        self.task_a.runscript.append('exit 3')
+        flow.write()
+        returncodes = flow.run(parallel=True)
+        self.assertEqual(returncodes, [3, None, None, None])
+        for task in (self.task_b, self.task_c, self.task_d):
+            self.assertFalse(os.path.exists(os.path.join(task.dirname, 'out')))
+
+        # Only the dependents of the failed task are skipped.
+        flow = self.get_workflow()
+        self.task_b.runscript.append('exit 1')
+        flow.write()
+        returncodes = flow.run(parallel=True)
+        self.assertEqual(returncodes, [0, 1, 0, None])
+
+    def test_skip_unchanged(self):
+        """Test that only the tasks whose fingerprint changed are executed."""
+        flow = self.get_workflow()
+        flow.write()
+        flow.run(parallel=True)
+
+        flow.write()
+        returncodes = flow.run(skip_unchanged=True)
+        self.assertEqual(returncodes, [None, None, None, None])
+
+        self.task_c.runscript.append('echo modified >> out')
+        flow.write()
+        returncodes = flow.run(parallel=True, skip_unchanged=True)
+        self.assertEqual(returncodes, [None, None, 0, 0])
@@ -16,3 +16,25 @@ class TestBasicInputFile(unittest.TestCase):
         S = str(bif)
         self.assertMultiLineEqual(S, self.expected)
 
+
+
+class TestCard(unittest.TestCase):
+
+    def test_Card_array(self):
+        """Test that a 2D array is formatted like a list of rows."""
+        import numpy as np
+        from .. import Card
+        rows = [[.25, .25, .25, 1.], [.25, .25, .75, 3.]]
+
+        card = Card('K_POINTS', 'crystal')
+        card.append(2)
+        card.extend(rows)
+
+        array_card = Card('K_POINTS', 'crystal')
+        array_card.append(2)
+        array_card.append(np.array(rows))
+
+        self.assertMultiLineEqual(str(array_card), str(card))
+        self.assertMultiLineEqual(str(array_card),
+            'K_POINTS crystal\n   2\n   0.25 0.25 0.25 1.0\n'
+            '   0.25 0.25 0.75 3.0\n')
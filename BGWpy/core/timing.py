@@ -0,0 +1,122 @@
+"""Timing of the commands executed by the runscripts."""
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import socket
+import resource
+import subprocess
+from collections import OrderedDict
+
+# Public
+__all__ = ['time_command', 'read_timing', 'format_timing']
+
+
+def time_command(command, fname):
+    """
+    Execute a command, then append a record of its execution
+    to a json file: the command, its start time (seconds since the epoch),
+    its wall time, its exit code, its user and system times,
+    and the peak resident memory (max_rss, in kB) of its largest process
+    on the launching node.
+
+    Arguments
+    ---------
+
+    command : list of str
+        The command and its arguments.
+    fname : str
+        The json file, which holds the list of records.
+
+    Returns
+    -------
+
+    returncode : int
+        The exit code of the command, or 127 if it could not be executed.
+    """
+    start = time.time()
+    try:
+        returncode = subprocess.call(command)
+    except OSError:
+        returncode = 127
+    end = time.time()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # ru_maxrss is in bytes on macOS and in kB elsewhere.
+    max_rss = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        max_rss //= 1024
+
+    record = OrderedDict()
+    record['command'] = ' '.join(command)
+    record['hostname'] = socket.gethostname()
+    record['start'] = start
+    record['walltime'] = end - start
+    record['exit_code'] = returncode
+    record['user_time'] = usage.ru_utime
+    record['system_time'] = usage.ru_stime
+    record['max_rss'] = max_rss
+
+    records = read_timing(fname)
+    records.append(record)
+    with open(fname, 'w') as f:
+        json.dump(records, f, indent=2)
+
+    return returncode
+
+
+def read_timing(fname):
+    """Return the list of records of a json timing file, or an empty list."""
+    if not os.path.exists(fname):
+        return list()
+    with open(fname, 'r') as f:
+        return json.load(f)
+
+
+def format_timing(timing, ncores=None):
+    """
+    Return a table of the wall time, exit code, peak memory
+    and core-hours of the commands of several tasks.
+
+    Arguments
+    ---------
+
+    timing : dict
+        The list of records of each task, indexed by its name.
+
+    Keyword arguments
+    -----------------
+
+    ncores : dict, optional
+        The number of cores used by each task, indexed by its name,
+        to compute the core-hours. Defaults to one core.
+    """
+    ncores = ncores or dict()
+    lines = ['{:<16} {:<24} {:>14} {:>6} {:>12} {:>12}'.format(
+             'Task', 'Program', 'Wall time (s)', 'Exit', 'Memory (GB)',
+             'Core-hours')]
+    total = 0.
+    for name, records in timing.items():
+        for record in records:
+            corehours = record['walltime'] * ncores.get(name, 1) / 3600.
+            total += corehours
+            lines.append('{:<16} {:<24} {:>14.4g} {:>6} {:>12.4g} {:>12.4g}'.format(
+                         name, _get_executable(record['command']),
+                         record['walltime'],
+                         record['exit_code'], record['max_rss'] / 1e6,
+                         corehours))
+    lines.append('{:<16} {:<24} {:>14} {:>6} {:>12} {:>12.4g}'.format(
+                 'Total', '', '', '', '', total))
+    return '\n'.join(lines)
+
+
+def _get_executable(command):
+    """Return the name of the program launched by a command."""
+    words = command.split()
+    for word in words:
+        if (word.startswith('-') or word.isdigit() or
+            word in ('mpirun', 'mpiexec', 'srun')):
+            continue
+        return os.path.basename(word)
+    return os.path.basename(words[0]) if words else ''
@@ -1,5 +1,10 @@
+import io
 import os
+import bz2
+import gzip
+import lzma
 import contextlib
+from collections import OrderedDict
 
 @contextlib.contextmanager
 def exec_from_dir(dirname):
@@ -10,20 +15,93 @@ def exec_from_dir(dirname):
     finally:
         os.chdir(original)
 
-def last_lines_contain(fname, tag, nlines=60):
-    """True if the last nlines of fname contain tag."""
+@contextlib.contextmanager
+def open_text(f):
+    """
+    Open a file for reading as text.
+
+    f may be a file name, possibly compressed with gzip, bzip2 or xz
+    (recognized by the extension .gz, .bz2 or .xz), or a file-like object
+    opened in text or binary mode. File-like objects are not closed.
+    """
+    if isinstance(f, str):
+        if f.endswith('.gz'):
+            opener = gzip.open
+        elif f.endswith('.bz2'):
+            opener = bz2.open
+        elif f.endswith('.xz'):
+            opener = lzma.open
+        else:
+            opener = io.open
+        with opener(f, 'rt') as fi:
+            yield fi
+    elif isinstance(f.read(0), bytes):
+        wrapper = io.TextIOWrapper(f)
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()
+    else:
+        yield f
+
+def tail(fname, nlines=60, blocksize=8192):
+    """
+    Return the last nlines of fname.
+    The file is read by blocks starting from the end,
+    so that the cost does not depend on the size of the file.
+    """
+    nlines = int(nlines)
+    with open(fname, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        blocks = list()
+        nnewlines = 0
+        # One more newline than nlines is needed for the first line
+        # to be complete.
+        while position > 0 and nnewlines <= nlines:
+            size = min(blocksize, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            nnewlines += block.count(b'\n')
+
+    content = b''.join(reversed(blocks)).decode('utf-8', 'replace')
+    lines = content.splitlines(True)
+    if nlines == 0:
+        return []
+    return lines[-nlines:]
+
+# Results of last_lines_contain, indexed by the real path of the file.
+# Each entry is ((size, mtime), {(tag, nlines) : result}).
+# Only the most recently used files are kept.
+_tail_cache = OrderedDict()
+_tail_cache_size = 256
+
+def last_lines_contain(fname, tag, nlines=60, use_cache=False):
+    """
+    True if the last nlines of fname contain tag.
+
+    If use_cache is True, the result is stored and reused
+    as long as the size and modification time of the file are unchanged.
+    """
     nlines = int(nlines)
-    with open(fname, 'r') as f:
-        lines = f.readlines()
-        lines.reverse()
+    if not use_cache:
+        return any(tag in line for line in tail(fname, nlines))
 
-        for i in range(nlines):
-            try:
-                line = lines[i]
-            except:
-                return False
+    stat = os.stat(fname)
+    identity = (stat.st_size, stat.st_mtime_ns)
+    path = os.path.realpath(fname)
 
-            if tag in line:
-                return True
-    return False
+    cached_identity, results = _tail_cache.get(path, (None, None))
+    if cached_identity != identity:
+        results = dict()
+        _tail_cache[path] = (identity, results)
+    _tail_cache.move_to_end(path)
+    while len(_tail_cache) > _tail_cache_size:
+        _tail_cache.popitem(last=False)
 
+    key = (tag, nlines)
+    if key not in results:
+        results[key] = any(tag in line for line in tail(fname, nlines))
+    return results[key]
@@ -3,10 +3,13 @@ import os
 import subprocess
 import pickle
 import contextlib
+from collections import OrderedDict
 
 from .util import exec_from_dir
 from .runscript import RunScript
 from .task import Task
+from .graph import TaskGraph
+from .timing import format_timing
 
 
 class Workflow(Task):
@@ -110,9 +113,97 @@ class Workflow(Task):
             # Overwrite any runscript of the children tasks
             self.runscript.write()
 
-    #def run_tasks(self):
-    #    for task in self.tasks:
-    #        task.run()
+    def run(self, parallel=False, max_workers=None, skip_unchanged=False,
+            executor=None):
+        """
+        Execute the workflow.
+
+        Keyword arguments
+        -----------------
+
+        parallel : bool (False)
+            If False, execute the main runscript, which runs
+            all tasks sequentially.
+            If True, execute the tasks from python, launching concurrently
+            every task whose dependencies have completed.
+            The dependencies are derived from the files linked by each task.
+        max_workers : int (None)
+            Maximum number of tasks executed at the same time
+            in parallel mode.
+        skip_unchanged : bool (False)
+            Execute the tasks from python, skipping those whose fingerprint
+            matches the one recorded from a completed run.
+            See Task.get_fingerprint.
+        executor : LocalExecutor or AsyncRunner (None)
+            Execute the tasks from python with this executor,
+            e.g. within a pool of cores with LocalExecutor, or with
+            wall-time limits and retries with AsyncRunner.
+        """
+        if executor is not None:
+            return executor.run(self.get_graph(), skip_unchanged=skip_unchanged)
+        if not (parallel or skip_unchanged):
+            return super(Workflow, self).run()
+        if not parallel:
+            max_workers = 1
+        return self.get_graph().run(max_workers=max_workers,
+                                    skip_unchanged=skip_unchanged)
+
+    def submit(self, scheduler):
+        """
+        Submit each task of the workflow as its own job,
+        with dependencies derived from the files linked by each task.
+        The workflow must have been written.
+        Return the job id of each task. See SlurmScheduler.
+        """
+        return scheduler.submit(self)
+
+    def set_layout(self, policy):
+        """
+        Set the number of processes, threads, nodes and k-point pools
+        of every task according to a LayoutPolicy,
+        before the workflow is written.
+        Return the layout of each task (None for the tasks left unchanged).
+        """
+        return [policy.apply(task) for task in self.get_graph().tasks]
+
+    def get_graph(self):
+        """Return the dependency graph of the tasks."""
+        return TaskGraph(self.tasks)
+
+    def get_timing(self):
+        """
+        Return the timing records of each task that was run
+        with instrument=True, indexed by its directory relative to the flow,
+        followed by the name of its runscript if it is not run.sh.
+        """
+        timing = OrderedDict()
+        for task in self.get_graph().tasks:
+            name = self._get_timing_name(task)
+            records = task.get_timing()
+            if records and name not in timing:
+                timing[name] = records
+        return timing
+
+    def get_timing_table(self):
+        """
+        Return a table of the wall time, exit code, peak memory
+        and core-hours of the executions of each task.
+        """
+        ncores = dict()
+        for task in self.get_graph().tasks:
+            name = self._get_timing_name(task)
+            ncores[name] = max(ncores.get(name, 1), task.get_ncores())
+        return format_timing(self.get_timing(), ncores)
+
+    def _get_timing_name(self, task):
+        """
+        Return the directory of a task relative to the flow,
+        followed by its runscript if it is not the default one.
+        """
+        name = os.path.relpath(task.dirname, self.dirname)
+        if task.runscript.fname != 'run.sh':
+            name = os.path.normpath(os.path.join(name, task.runscript.fname))
+        return name
 
     def get_status(self):
         """
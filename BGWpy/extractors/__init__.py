@@ -1,3 +1,6 @@
 from .gw import *
 from .eigenvalues import *
 from .inteqp import *
+from .wfn import *
+from .epsmat import *
+from .timing import *
@@ -0,0 +1,365 @@
+"""
+Reader for the inverse dielectric matrix files of BerkeleyGW
+(eps0mat.h5, epsmat.h5).
+"""
+import os
+import numpy as np
+
+__all__ = ['EpsmatFile', 'merge_epsmat_files']
+
+
+class EpsmatFile(object):
+    """
+    An eps0mat.h5 or epsmat.h5 file produced by epsilon.x.
+
+    The file is opened on first access, and only the datasets
+    of the header are read. The inverse dielectric matrix is read
+    by slices of rows and columns for a given q-point and frequency.
+
+    The matrix is returned in the convention epsinv[G, G'],
+    where the G-vectors are those of the q-point,
+    in the order of get_gvectors.
+
+    Attributes
+    ----------
+
+    nq : int
+        Number of q-points.
+    qpts : array(nq, 3), float
+        Q-points in reduced coordinates.
+    qgrid : array(3), int
+        Q-points grid.
+    qpt_done : array(nq), bool
+        Whether the matrix of each q-point has been written.
+    nfreq : int
+        Number of frequencies.
+    freqs : array(nfreq), complex
+        Frequencies, in eV.
+    nmtx : array(nq), int
+        Size of the matrix for each q-point.
+    nmtx_max : int
+        Maximum size of the matrix.
+    ng : int
+        Number of G-vectors of the charge density.
+    nmatrix : int
+        Number of matrices stored for each q-point and frequency.
+    flavor : str
+        'complex' or 'real'.
+    """
+
+    def __init__(self, fname):
+        """
+        Arguments
+        ---------
+
+        fname : str
+            Path to the eps0mat.h5 or epsmat.h5 file.
+        """
+        self.fname = fname
+        self._h5 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return '<{}: {}>'.format(type(self).__name__, self.fname)
+
+    @property
+    def h5(self):
+        """The h5py.File object, opened on first access."""
+        if self._h5 is None:
+            try:
+                import h5py
+            except ImportError:
+                raise ImportError('h5py is required to read ' + self.fname)
+            self._h5 = h5py.File(self.fname, 'r')
+        return self._h5
+
+    def close(self):
+        if self._h5 is not None:
+            self._h5.close()
+            self._h5 = None
+
+    def _get(self, path):
+        return self.h5[path][()]
+
+    # =================================================================== #
+    """ Header                                                            """
+
+    @property
+    def nq(self):
+        return int(self._get('eps_header/qpoints/nq'))
+
+    @property
+    def qpts(self):
+        return np.array(self._get('eps_header/qpoints/qpts'))[:self.nq]
+
+    @property
+    def qpt_done(self):
+        # Files written before the restart feature of epsilon
+        # are only written once complete.
+        if 'eps_header/qpoints/qpt_done' not in self.h5:
+            return np.ones(self.nq, dtype=bool)
+        return np.array(self._get('eps_header/qpoints/qpt_done'),
+                        dtype=bool)[:self.nq]
+
+    @property
+    def qgrid(self):
+        return np.array(self._get('eps_header/qpoints/qgrid'))
+
+    @property
+    def nfreq(self):
+        return int(self._get('eps_header/freqs/nfreq'))
+
+    @property
+    def freqs(self):
+        freqs = np.array(self._get('eps_header/freqs/freqs'))
+        freqs = freqs.reshape((-1, 2))[:self.nfreq]
+        return freqs[:,0] + 1j * freqs[:,1]
+
+    @property
+    def nmtx(self):
+        return np.array(self._get('eps_header/gspace/nmtx'))[:self.nq]
+
+    @property
+    def nmtx_max(self):
+        return int(self._get('eps_header/gspace/nmtx_max'))
+
+    @property
+    def ng(self):
+        return int(self._get('mf_header/gspace/ng'))
+
+    @property
+    def nmatrix(self):
+        return int(self._get('eps_header/params/nmatrix'))
+
+    @property
+    def flavor(self):
+        return 'complex' if int(self._get('eps_header/flavor')) == 2 else 'real'
+
+    def get_gvectors(self, iq):
+        """
+        Return the G-vectors of the matrix at q-point iq, array(nmtx, 3).
+        """
+        nmtx = int(self.nmtx[iq])
+        gind = self.h5['eps_header/gspace/gind_eps2rho'][iq,:nmtx]
+        components = self.h5['mf_header/gspace/components']
+        # gind_eps2rho starts at 1.
+        return np.array(components[()])[np.array(gind) - 1]
+
+    # =================================================================== #
+    """ Matrix                                                            """
+
+    @property
+    def _matrix(self):
+        # Shape (nq, nmatrix, nfreq, nmtx_max, nmtx_max, flavor),
+        # indexed as [iq, imatrix, ifreq, G', G, real/imag].
+        return self.h5['mats/matrix']
+
+    def get_matrix(self, iq, ifreq=0, rows=None, cols=None, imatrix=0):
+        """
+        Return a block of the inverse dielectric matrix.
+        Only the requested block is read from the file.
+
+        Arguments
+        ---------
+
+        iq : int
+            Index of the q-point (starting at 0).
+
+        Keyword arguments
+        -----------------
+
+        ifreq : int (0)
+            Index of the frequency.
+        rows : slice, optional
+            Range of G. Defaults to all G-vectors of the q-point.
+        cols : slice, optional
+            Range of G'. Defaults to all G-vectors of the q-point.
+        imatrix : int (0)
+            Index of the matrix, for files storing several matrices.
+
+        Returns
+        -------
+
+        epsinv : array(nrow, ncol), complex or float
+        """
+        nmtx = int(self.nmtx[iq])
+        rows = self._check_slice(rows, nmtx)
+        cols = self._check_slice(cols, nmtx)
+
+        block = self._matrix[iq, imatrix, ifreq, cols, rows, :]
+        if block.shape[-1] == 2:
+            block = block[...,0] + 1j * block[...,1]
+        else:
+            block = block[...,0]
+        return block.T
+
+    def iter_matrix(self, iq, ifreq=0, chunksize=1024, imatrix=0):
+        """
+        Iterate over the inverse dielectric matrix by blocks of columns.
+
+        Yields
+        ------
+
+        cols : slice
+            Range of G' of the block.
+        epsinv : array(nmtx, ncol)
+            The block of the matrix.
+        """
+        nmtx = int(self.nmtx[iq])
+        for start in range(0, nmtx, chunksize):
+            cols = slice(start, min(start + chunksize, nmtx))
+            yield cols, self.get_matrix(iq, ifreq, cols=cols, imatrix=imatrix)
+
+    def get_diagonal(self, iq, ifreq=0, chunksize=1024, imatrix=0):
+        """
+        Return the diagonal of the inverse dielectric matrix, array(nmtx),
+        reading the matrix by diagonal blocks.
+        """
+        nmtx = int(self.nmtx[iq])
+        diagonal = list()
+        for start in range(0, nmtx, chunksize):
+            block = slice(start, min(start + chunksize, nmtx))
+            diagonal.append(np.diagonal(
+                self.get_matrix(iq, ifreq, rows=block, cols=block,
+                                imatrix=imatrix)))
+        return np.concatenate(diagonal)
+
+    @staticmethod
+    def _check_slice(index, n):
+        if index is None:
+            return slice(0, n)
+        start, stop, step = index.indices(n)
+        if step != 1:
+            raise Exception('Only contiguous slices are supported.')
+        return slice(start, stop)
+
+
+# Datasets of the header whose first axis runs over the q-points.
+# Every dataset of the group 'mats' also runs over the q-points.
+_epsmat_qpoint_datasets = [
+    'eps_header/qpoints/qpts',
+    'eps_header/qpoints/qpt_done',
+    'eps_header/gspace/nmtx',
+    'eps_header/gspace/ekin',
+    'eps_header/gspace/gind_eps2rho',
+    'eps_header/gspace/gind_rho2eps',
+    ]
+
+# Datasets of the header that must be identical in all merged files.
+_epsmat_common_datasets = [
+    'eps_header/flavor',
+    'eps_header/params/nmatrix',
+    'eps_header/qpoints/qgrid',
+    'eps_header/freqs/nfreq',
+    'mf_header/gspace/ng',
+    ]
+
+
+def merge_epsmat_files(fnames, fname_out, completed_only=False):
+    """
+    Merge epsmat.h5 files computed for different q-points
+    into a single epsmat.h5 file, with the q-points in the order
+    of the files.
+
+    The header of the first file is used for the merged file,
+    except for the number of q-points and the maximum matrix size.
+    The matrices are copied one q-point at a time and padded
+    with zeros to the largest matrix size.
+    The merged file is written to a temporary file and then renamed,
+    so that fname_out only exists once the merge is complete.
+
+    Arguments
+    ---------
+
+    fnames : list of str
+        Paths to the epsmat.h5 files to merge.
+    fname_out : str
+        Path to the merged file.
+
+    Keyword arguments
+    -----------------
+
+    completed_only : bool (False)
+        Only keep the q-points flagged as done, e.g. to merge
+        the partial file of an interrupted epsilon run.
+    """
+    import h5py
+
+    if not fnames:
+        raise Exception('No epsmat file to merge.')
+
+    inputs = [h5py.File(fname, 'r') for fname in fnames]
+    try:
+        first = inputs[0]
+        for fname, h5 in zip(fnames[1:], inputs[1:]):
+            for path in _epsmat_common_datasets:
+                if path in first and not np.array_equal(first[path][()],
+                                                        h5[path][()]):
+                    raise Exception('Cannot merge {}: {} differs from {}.'
+                                    .format(fname, path, fnames[0]))
+
+        iqs = list()
+        for h5 in inputs:
+            nq = int(h5['eps_header/qpoints/nq'][()])
+            path = 'eps_header/qpoints/qpt_done'
+            if completed_only and path in h5:
+                done = np.array(h5[path][()], dtype=bool)[:nq]
+                iqs.append(list(np.nonzero(done)[0]))
+            else:
+                iqs.append(list(range(nq)))
+        nqs = [len(indices) for indices in iqs]
+        nmtx_max = max(int(h5['eps_header/gspace/nmtx_max'][()])
+                       for h5 in inputs)
+
+        groups, common, per_qpoint = list(), list(), list()
+        def visit(path, obj):
+            if isinstance(obj, h5py.Group):
+                groups.append(path)
+            elif path in _epsmat_qpoint_datasets or path.startswith('mats/'):
+                per_qpoint.append(path)
+            else:
+                common.append(path)
+
+        first.visititems(visit)
+
+        fname_tmp = fname_out + '.tmp'
+        with h5py.File(fname_tmp, 'w') as out:
+
+            # Header
+            for path in groups:
+                out.require_group(path).attrs.update(first[path].attrs)
+            for path in common:
+                parent, name = os.path.split(path)
+                first.copy(first[path], out[parent or '/'], name=name)
+            out['eps_header/qpoints/nq'][()] = sum(nqs)
+            out['eps_header/gspace/nmtx_max'][()] = nmtx_max
+
+            # Q-points datasets
+            for path in per_qpoint:
+                shapes = [h5[path].shape for h5 in inputs]
+                shape = (sum(nqs),) + tuple(np.max([s[1:] for s in shapes],
+                                                   axis=0))
+                source = first[path]
+                dataset = out.create_dataset(path, shape=shape,
+                                             dtype=source.dtype,
+                                             chunks=source.chunks)
+                dataset.attrs.update(source.attrs)
+
+                offset = 0
+                for indices, h5 in zip(iqs, inputs):
+                    source = h5[path]
+                    block = tuple(slice(0, n) for n in source.shape[1:])
+                    for i, iq in enumerate(indices):
+                        dataset[(offset + i,) + block] = source[iq]
+                    offset += len(indices)
+
+        os.rename(fname_tmp, fname_out)
+
+    finally:
+        for h5 in inputs:
+            h5.close()
@@ -1,13 +1,32 @@
 import os
+import re
 import pickle
+import hashlib
+import tempfile
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 
+from ..core.util import open_text
+
 
 def parse_sigma_output(f):
     """
     Extract the GW results of a calculation with BerkeleyGW.
 
+    The file is read only once, and the symmetrized values
+    are written directly into the result arrays.
+
+    Arguments
+    ---------
+
+    f : str or file
+        The sigma.out file. A file name ending with .gz, .bz2 or .xz
+        is decompressed on the fly. A file object may be opened
+        in text or binary mode.
+
     Returns
     -------
 
@@ -22,104 +41,207 @@ def parse_sigma_output(f):
             K-points wavevectors (reduced coord)
         n : array[nband]
             band indices
-        elda : array[nspin, nkpt, nband]
-            energy eigenvalue
-        ecor : array[nspin, nkpt, nband]
-            corrected energy eigenvalue
-        x : array[nkpt, nband]
+        Emf : array[nspin, nkpt, nband]
+            "inner" mean-field energy eigenvalue
+        Eo : array[nspin, nkpt, nband]
+            "outer" mean-field energy eigenvalue
+        Vxc : array[nspin, nkpt, nband]
+            exchange-correlation potential
+        X : array[nspin, nkpt, nband]
             bare exchange
-        sx-x : array[nspin, nkpt, nband]
-            sx = screened exchange at energy ecor
-        ch : array[nspin, nkpt, nband]
-            coulomb hole at energy ecor
-        sig : array[nspin, nkpt, nband]
-            sx + ch = self-energy at energy ecor
-        vxc : array[nspin, nkpt, nband]
-            vxc = exchange-correlation potential
-        eqp0 : array[nspin, nkpt, nband]
-            elda - vxc + sig(ecor)
-        eqp1 : array[nspin, nkpt, nband]
-            eqp0 + (dsig/de) / (1 - dsig/de) * (eqp0 - ecor)
+        Cor : array[nspin, nkpt, nband]
+            correlation portion of the self-energy at energy Eo
+        Eqp0 : array[nspin, nkpt, nband]
+            Emf - Vxc + Sig(Eo)
+        Eqp1 : array[nspin, nkpt, nband]
+            Eqp0 + (dSig/dE) / (1 - dSig/dE) * (Eqp0 - Eo)
         Znk array[nspin, nkpt, nband]
             quasiparticle renormalization factor
     """
 
-    if isinstance(f, str):
-        with open(f, 'r') as fi:
-            return parse_sigma_output(fi)
+    with open_text(f) as fi:
+        return _parse_sigma_output(fi)
 
-    # Break the output into large kpoint block.
-    large_kpt_blocks = break_output_in_kpt_blocks(f)
 
-    # Count k-points from number of kpt blocks
-    nkpt = len(large_kpt_blocks)
+# Quantities in the columns of the symmetrized values, after the band index.
+_sigma_output_keys = ['Emf','Eo','Vxc','X','Cor','Eqp0','Eqp1','Znk']
 
+def _parse_sigma_output(f):
+    """
+    Read sigma.out line by line, writing the symmetrized values
+    directly into the result arrays.
 
-    # Break the blocks into smaller kpt and spin block
-    kpt_spin_blocks = list()
-    for block in large_kpt_blocks:
-        subblock = break_kpt_spin_blocks(block)
-        kpt_spin_blocks.extend(subblock)
+    The number of k-points is read from the first 'Dealing with k' line,
+    and the number of bands and spins from the first k-point block.
+    The rows of this first block are buffered until the arrays
+    can be allocated.
+    """
+    keys = _sigma_output_keys
+    nkey = len(keys)
 
-    # Count spins from number of sub-blocks
-    nspin = len(subblock)
+    # States of the parser
+    SEARCH_KPT, SEARCH_SYM, SEARCH_K, READ_HEADER, READ_ROWS = range(5)
+    state = SEARCH_KPT
 
+    nkpt_expected = None  # From the 'Dealing with k = ... i / nkpt' lines
+    nblock = 0            # Number of 'Dealing with k' blocks
+    found_sym = True      # Whether the current block has symmetrized values
 
-    # Parse each block
-    block_results = list()
-    for block in kpt_spin_blocks:
-        block_result = parse_sigma_output_block(block)
-        block_results.append(block_result)
+    data = None           # array[nkey, nspin, nkpt, nband]
+    kpt = None
+    band_indices = list()
+    first_rows = list()   # (ispin, ikpt, tokens) of the first block
 
-    # Count number of bands from the lines of last block
-    nband = len(block_result['n'])
+    ispin = ikpt = iband = 0
+    nheader = 0
 
+    for line in f:
 
-    # Initialize the results dict
+        if 'Dealing with k' in line:
+            if not found_sym:
+                raise Exception('Could not find symmetrized values '
+                                'in block {}.'.format(nblock))
+            if nblock == 1:
+                data, kpt = _allocate_sigma_arrays(
+                    first_rows, nkey, nkpt_expected)
+            nblock += 1
+            found_sym = False
+            if nkpt_expected is None:
+                try:
+                    nkpt_expected = int(line.split('/')[-1])
+                except ValueError:
+                    nkpt_expected = 1
+            state = SEARCH_SYM
+            continue
+
+        if state == SEARCH_KPT:
+            continue
+
+        if state == SEARCH_SYM:
+            if 'Symmetrized values from band-averaging' in line:
+                found_sym = True
+                state = SEARCH_K
+            continue
+
+        if state == SEARCH_K:
+            tokens = line.split()
+            if line.startswith('==='):
+                state = SEARCH_KPT
+            elif tokens[:2] == ['k', '=']:
+                k = [float(t) for t in tokens[2:5]]
+                ikpt = int(tokens[7]) - 1
+                ispin = int(tokens[10]) - 1
+                if data is not None:
+                    if ikpt >= data.shape[2]:
+                        data, kpt = _grow_sigma_arrays(data, kpt, ikpt + 1)
+                    kpt[ikpt] = k
+                else:
+                    first_rows.append((ispin, ikpt, k))
+                iband = 0
+                nheader = 0
+                state = READ_HEADER
+            continue
+
+        if state == READ_HEADER:
+            # An empty line followed by the labels line
+            nheader += 1
+            if nheader == 2:
+                state = READ_ROWS
+            continue
+
+        if state == READ_ROWS:
+            tokens = line.split()
+            if not tokens:
+                state = SEARCH_K
+                continue
+            if data is None:
+                first_rows.append(tokens)
+                if len(band_indices) <= iband:
+                    band_indices.append(int(tokens[0]))
+            else:
+                data[:, ispin, ikpt, iband] = tokens[1:nkey+1]
+            iband += 1
+
+    if not found_sym:
+        raise Exception('Could not find symmetrized values '
+                        'in block {}.'.format(nblock))
+
+    if data is None:
+        data, kpt = _allocate_sigma_arrays(first_rows, nkey, nkpt_expected)
+
+    # Discard the k-points that were announced but not computed.
+    nkpt = nblock
+    if nkpt < data.shape[2]:
+        data = data[:,:,:nkpt,:].copy()
+        kpt = kpt[:nkpt].copy()
+
+    nspin, nband = data.shape[1], data.shape[3]
     results = dict(nspin=nspin, nkpt=nkpt, nband=nband)
+    for i, key in enumerate(keys):
+        results[key] = data[i]
+    results['kpt'] = kpt
+    results['n'] = np.array(band_indices, dtype=int)
 
-#    keys = ['elda','ecor','x','sx-x','ch','sig','vxc','eqp0','eqp1','Znk']
-    keys=['Emf','Eo','Vxc','X','Cor','Eqp0','Eqp1','Znk']
-
-    for key in keys:
-        results[key] = np.zeros((nspin, nkpt, nband), dtype=np.float)
-
-    results['kpt'] = np.zeros((nkpt,3), dtype=np.float)
-    results['n'] = np.zeros(nband, dtype=np.int)
-
-
-    # Merge the blocks
-    for block_result in block_results:
-        ispin = block_result['spin'] - 1
-        ikpt = block_result['ik'] - 1
-        for key in keys:
-            for iband, val in enumerate(block_result[key]):
-                results[key][ispin,ikpt,iband] = val
+    return results
 
-        results['kpt'][ikpt] = np.array(block_result['k'])
-        results['n'] = np.array(block_result['n'], dtype=np.int)
 
-    return results
+def _allocate_sigma_arrays(first_rows, nkey, nkpt):
+    """
+    Allocate the result arrays from the buffered rows of the first
+    k-point block, a list of (ispin, ikpt, k) tuples, each followed by
+    the lists of tokens of its rows, and fill them with these rows.
+    """
+    blocks = list()
+    for item in first_rows:
+        if isinstance(item, tuple):
+            blocks.append((item, list()))
+        else:
+            blocks[-1][1].append(item)
+
+    nspin = max(len(blocks), 1)
+    nband = max([len(rows) for head, rows in blocks] + [0])
+    nkpt = max([nkpt or 1] + [head[1] + 1 for head, rows in blocks])
+
+    data = np.zeros((nkey, nspin, nkpt, nband), dtype=float)
+    kpt = np.zeros((nkpt, 3), dtype=float)
+    for (ispin, ikpt, k), rows in blocks:
+        kpt[ikpt] = k
+        for iband, tokens in enumerate(rows):
+            data[:, ispin, ikpt, iband] = tokens[1:nkey+1]
+
+    return data, kpt
+
+
+def _grow_sigma_arrays(data, kpt, nkpt):
+    """Extend the result arrays along the k-point dimension."""
+    nkpt = max(nkpt, 2 * data.shape[2])
+    shape = list(data.shape)
+    shape[2] = nkpt
+    newdata = np.zeros(shape, dtype=float)
+    newdata[:,:,:data.shape[2],:] = data
+    newkpt = np.zeros((nkpt, 3), dtype=float)
+    newkpt[:len(kpt)] = kpt
+    return newdata, newkpt
 
 
 def break_output_in_kpt_blocks(f):
     """Break the output into large kpoint block."""
     blocks = list()
-    S = ''
+    lines = list()
     reading_block = False
-    for line in f.readlines():
+    for line in f:
 
         if 'Dealing with k' in line:
             reading_block = True
-            if S:
-                blocks.append(S)
-            S = ''
+            if lines:
+                blocks.append(''.join(lines))
+            lines = list()
 
         if reading_block:
-            S += line
+            lines.append(line)
 
-    if S:
-        blocks.append(S)
+    if lines:
+        blocks.append(''.join(lines))
 
     return blocks
 
@@ -138,7 +260,7 @@ def break_kpt_spin_blocks(S):
     while True:
 
         try:
-            line = iterlines.next()
+            line = next(iterlines)
         except StopIteration:
             break
 
@@ -146,12 +268,12 @@ def break_kpt_spin_blocks(S):
 
             lines = list()
             lines.append(line)       # kpoint line
-            line = iterlines.next()  # empty line
+            line = next(iterlines)  # empty line
             lines.append(line)
-            line = iterlines.next()  # labels line
+            line = next(iterlines)  # labels line
             while line.strip():
                 lines.append(line)
-                line = iterlines.next()
+                line = next(iterlines)
             blocks.append('\n'.join(lines))
 
     return blocks
@@ -240,25 +362,347 @@ def parse_sigma_output_block(S):
 
 
 
+_sigma_hp_ik_regex = re.compile(r'ik =(\s*\d+)')
 
+def merge_sigma_hp_files(fnames, fname_out):
+    """
+    Merge sigma_hp.log files computed for different k-points
+    into a single file, with the k-points in the order of the files.
+
+    The header of the first file is kept, followed by the k-point blocks
+    of every file, in which the k-point index 'ik' is shifted
+    by the number of k-points of the preceding files.
+    The merged file is written to a temporary file and then renamed,
+    so that fname_out only exists once the merge is complete.
+    """
+    lines = list()
+    offset = 0
+    for i, fname in enumerate(fnames):
+        nkpt = 0
+        reading_header = True
+        with open_text(fname) as f:
+            for line in f:
+                if line.startswith('       k ='):
+                    reading_header = False
+                    match = _sigma_hp_ik_regex.search(line)
+                    if match:
+                        ik = int(match.group(1))
+                        nkpt = max(nkpt, ik)
+                        width = len(match.group(1))
+                        line = (line[:match.start(1)]
+                                + '{:>{}}'.format(ik + offset, width)
+                                + line[match.end(1):])
+                if reading_header and i > 0:
+                    continue
+                lines.append(line)
+        offset += nkpt
 
-def extract_multiple_GW_results(dirnames):
-    """Extract GW results from a list of directories."""
-    data = dict()
-    data['variables'] = list()
-    data['results'] = list()
-    data['ndata'] = len(dirnames)
+    fname_tmp = fname_out + '.tmp'
+    with open(fname_tmp, 'w') as f:
+        f.write(''.join(lines))
+    os.replace(fname_tmp, fname_out)
 
-    for dname in dirnames:
 
-        with open(os.path.join(dname, 'variables.pkl'), 'r') as f:
-            variables = pickle.load(f)
+_sigma_hp_k_regex = re.compile(
+    r'k =\s*(\S+)\s+(\S+)\s+(\S+)\s+ik =\s*(\d+)\s+spin =\s*(\d+)')
 
-        with open(os.path.join(dname, 'sigma.out'), 'r') as f:
-            out = parse_sigma_output(f)
+def read_sigma_hp_blocks(fname):
+    """
+    Split a sigma_hp.log file into its header and its k-point blocks.
 
-        data['variables'].append(variables)
-        data['results'].append(out)
+    Returns
+    -------
+
+    header : list of str
+        The lines preceding the first k-point block.
+    blocks : list of dict
+        For each k-point and spin, in the order of the file:
+            kpt : array(3), float
+            ik : int
+            spin : int
+            columns : list of str
+                The names of the columns of the table.
+            rows : list of list of str
+                The complete rows of the table, one per band.
+            lines : list of str
+                The lines of the block.
+    """
+    header, blocks = list(), list()
+    with open_text(fname) as f:
+        for line in f:
+            if line.startswith('       k ='):
+                match = _sigma_hp_k_regex.search(line)
+                if match is None:
+                    # Truncated by an interrupted run.
+                    break
+                blocks.append(dict(
+                    kpt = np.array([float(x) for x in match.group(1, 2, 3)]),
+                    ik = int(match.group(4)),
+                    spin = int(match.group(5)),
+                    columns = list(),
+                    rows = list(),
+                    lines = list(),
+                    ))
+
+            if not blocks:
+                header.append(line)
+                continue
+
+            block = blocks[-1]
+            block['lines'].append(line)
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == 'n':
+                block['columns'] = tokens
+            elif (block['columns'] and tokens[0].isdigit() and
+                  len(tokens) >= len(block['columns'])):
+                block['rows'].append(tokens)
+
+    return header, blocks
+
+
+def write_eqp_file(blocks, fname, column='Eqp1'):
+    """
+    Write an eqp.dat file from the k-point blocks of a sigma_hp.log file,
+    with the mean-field energy and the quasiparticle energy
+    of each band.
+
+    Arguments
+    ---------
+
+    blocks : list of dict
+        The blocks returned by read_sigma_hp_blocks.
+    fname : str
+        Path to the eqp.dat file.
+
+    Keyword arguments
+    -----------------
+
+    column : str ('Eqp1')
+        The column of the quasiparticle energies, e.g. 'Eqp0' or 'Eqp1'.
+    """
+    kpoints = OrderedDict()
+    for block in blocks:
+        kpoints.setdefault(block['ik'], list()).append(block)
+
+    with open(fname, 'w') as f:
+        for kblocks in kpoints.values():
+            nrow = sum(len(block['rows']) for block in kblocks)
+            f.write('{:13.9f}{:13.9f}{:13.9f}{:8}\n'.format(
+                    *(list(kblocks[0]['kpt']) + [nrow])))
+            for block in kblocks:
+                for name in ('Emf', column):
+                    if name not in block['columns']:
+                        raise Exception('Column {} not found in sigma_hp '
+                                        'block of k-point {}.'.format(
+                                        name, block['ik']))
+                iemf = block['columns'].index('Emf')
+                ieqp = block['columns'].index(column)
+                for row in block['rows']:
+                    f.write('{:8}{:8}{:15.9f}{:15.9f}\n'.format(
+                            block['spin'], int(row[0]),
+                            float(row[iemf]), float(row[ieqp])))
+
+
+# Results of extract_GW_results, indexed by the real path of the directory.
+# Each entry is (identity, (variables, results)), where identity holds
+# the size and modification time of the files read.
+_GW_results_cache = dict()
+
+def _get_GW_files_identity(dirname):
+    """Size and modification time of the files read in a directory."""
+    identity = list()
+    for basename in ('variables.pkl', 'sigma.out'):
+        stat = os.stat(os.path.join(dirname, basename))
+        identity.append((basename, stat.st_size, stat.st_mtime_ns))
+    return tuple(identity)
+
+
+def _get_GW_cache_fname(dirname, cache_dir):
+    key = hashlib.sha1(os.path.realpath(dirname).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.pkl')
+
+
+def extract_GW_results(dirname):
+    """
+    Extract the variables and the GW results from a directory.
+    Return variables, results.
+    """
+    with open(os.path.join(dirname, 'variables.pkl'), 'rb') as f:
+        variables = pickle.load(f)
+
+    results = parse_sigma_output(os.path.join(dirname, 'sigma.out'))
+
+    return variables, results
+
+
+def extract_multiple_GW_results(dirnames, nproc=None, use_cache=True,
+                                cache_dir=None):
+    """
+    Extract GW results from a list of directories.
+
+    The directories are parsed in parallel by a pool of processes.
+    The results of each directory are cached, and reused as long as
+    the size and modification time of its variables.pkl and sigma.out
+    files are unchanged, so that only new or modified runs are parsed again.
+
+    Arguments
+    ---------
+
+    dirnames : list of str
+        Directories containing variables.pkl and sigma.out.
+
+    Keyword arguments
+    -----------------
+
+    nproc : int (None)
+        Number of processes. Defaults to the number of processors.
+        With nproc=1, the directories are parsed in the current process.
+    use_cache : bool (True)
+        Reuse the results of the directories that did not change.
+    cache_dir : str (None)
+        Directory where the results of each directory are also stored
+        on disk, so that they can be reused in a later session.
+        By default, the results are only kept in memory.
+
+    Returns
+    -------
+
+    dict :
+        ndata : int
+            Number of directories
+        variables : list of dict
+            The variables of each directory
+        results : list of dict
+            The results of parse_sigma_output for each directory
+        arrays : dict
+            The quantities of all results stacked into a single array
+            with a leading run dimension. See stack_GW_results.
+    """
+    dirnames = list(dirnames)
+    ndata = len(dirnames)
+    extracted = [None] * ndata
+
+    identities = [_get_GW_files_identity(dname) for dname in dirnames]
+
+    # Find the results that can be reused
+    todo = list()
+    for i, (dname, identity) in enumerate(zip(dirnames, identities)):
+        if use_cache:
+            extracted[i] = _read_GW_cache(dname, identity, cache_dir)
+        if extracted[i] is None:
+            todo.append(i)
+
+    # Parse the other directories
+    nproc = nproc or os.cpu_count() or 1
+    nproc = min(nproc, len(todo))
+    if nproc > 1:
+        with ProcessPoolExecutor(max_workers=nproc) as executor:
+            todo_dirnames = [dirnames[i] for i in todo]
+            for i, out in zip(todo, executor.map(extract_GW_results,
+                                                 todo_dirnames)):
+                extracted[i] = out
+    else:
+        for i in todo:
+            extracted[i] = extract_GW_results(dirnames[i])
+
+    for i in todo:
+        _write_GW_cache(dirnames[i], identities[i], extracted[i], cache_dir)
+
+    data = dict()
+    data['variables'] = [variables for variables, results in extracted]
+    data['results'] = [results for variables, results in extracted]
+    data['ndata'] = ndata
+    data['arrays'] = stack_GW_results(data['results'])
 
     return data
 
+
+def _read_GW_cache(dirname, identity, cache_dir=None):
+    """Return the cached (variables, results) of a directory, or None."""
+    path = os.path.realpath(dirname)
+    cached_identity, extracted = _GW_results_cache.get(path, (None, None))
+    if cached_identity == identity:
+        return extracted
+
+    if cache_dir is None:
+        return None
+
+    fname = _get_GW_cache_fname(dirname, cache_dir)
+    try:
+        with open(fname, 'rb') as f:
+            cached_identity, extracted = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+
+    if cached_identity != identity:
+        return None
+
+    _GW_results_cache[path] = (identity, extracted)
+    return extracted
+
+
+def _write_GW_cache(dirname, identity, extracted, cache_dir=None):
+    """Store the (variables, results) of a directory."""
+    _GW_results_cache[os.path.realpath(dirname)] = (identity, extracted)
+
+    if cache_dir is None:
+        return
+
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmpname = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((identity, extracted), f)
+        os.replace(tmpname, _get_GW_cache_fname(dirname, cache_dir))
+    except (IOError, OSError) as E:
+        warnings.warn('Could not write GW results cache file:\n' + str(E))
+
+
+def stack_GW_results(results):
+    """
+    Stack the results of several runs into arrays
+    with a leading run dimension.
+
+    Arrays of different shapes, for example when the number of bands
+    or k-points differ between runs, are padded with nan,
+    or with -1 for integer arrays.
+
+    Arguments
+    ---------
+
+    results : list of dict
+        The results of parse_sigma_output for each run.
+
+    Returns
+    -------
+
+    dict :
+        For each quantity, an array[nrun, ...].
+    """
+    arrays = dict()
+    if not results:
+        return arrays
+
+    for key in results[0]:
+        values = [np.asarray(r[key]) for r in results]
+        ndim = values[0].ndim
+        if any(v.ndim != ndim for v in values):
+            continue
+
+        if all(v.shape == values[0].shape for v in values):
+            arrays[key] = np.stack(values)
+            continue
+
+        shape = tuple(max(v.shape[i] for v in values) for i in range(ndim))
+        if np.issubdtype(values[0].dtype, np.integer):
+            stacked = np.full((len(values),) + shape, -1, dtype=int)
+        else:
+            stacked = np.full((len(values),) + shape, np.nan, dtype=float)
+        for i, v in enumerate(values):
+            stacked[(i,) + tuple(slice(0, n) for n in v.shape)] = v
+        arrays[key] = stacked
+
+    return arrays
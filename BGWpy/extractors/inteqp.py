@@ -1,9 +1,80 @@
+import itertools
+import collections
+
 import numpy as np
 
-def extract_inteqp_bandstructure(fname):
+from ..core.util import open_text, tail
+
+
+def _skip_header(f):
+    """
+    Return the number of comment lines at the beginning of f,
+    and an iterator over the remaining lines.
+    """
+    nheader = 0
+    for line in f:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('#'):
+            return nheader, itertools.chain([line], f)
+        nheader += 1
+    return nheader, iter([])
+
+
+def _select_blocks(lines, blocksize, keep_block, keep_row=None):
+    """
+    Iterate over the lines of the kept blocks of blocksize lines.
+
+    keep_block is a sequence of bool for each block, and keep_row
+    an optional sequence of blocksize bool selecting lines in the blocks.
+    The lines are consumed by itertools, without a python loop over lines.
+    """
+    for keep in keep_block:
+        block = list(itertools.islice(lines, blocksize))
+        if not block:
+            return
+        if not keep:
+            continue
+        if keep_row is not None:
+            block = itertools.compress(block, keep_row)
+        for line in block:
+            yield line
+
+
+def _check_bands(bands, available):
+    """Raise a ValueError if some bands are not available in the file."""
+    missing = np.setdiff1d(bands, available)
+    if len(missing):
+        raise ValueError(
+            'Bands {} are not in the file, which holds bands {} to {}.'
+            .format(missing.tolist(), int(np.min(available)),
+                    int(np.max(available))))
+
+
+def extract_inteqp_bandstructure(fname, bands=None, ikpts=None, dtype=float):
     """
     Extract the data in the 'bandstructure.dat' file produced by inteqp.x.
 
+    The file is expected to be ordered by spin, then band, then k-point.
+    Only the rows of the requested bands and k-points are parsed.
+
+    Arguments
+    ---------
+    fname: str
+        The file name, possibly compressed (.gz, .bz2, .xz).
+
+    Keyword arguments
+    -----------------
+    bands: list of int, optional
+        Band indices to extract, as they appear in the file.
+        By default, all bands are extracted.
+        A ValueError is raised if a band is not in the file.
+    ikpts: list of int, optional
+        Indices of the k-points to extract, starting at 0.
+        By default, all k-points are extracted.
+        Bands and k-points are returned in the order of the file.
+    dtype: numpy.dtype (float)
+        Data type of the energies, e.g. numpy.float32 to save memory.
+
     Returns
     -------
     dict:
@@ -19,6 +90,8 @@ def extract_inteqp_bandstructure(fname):
             Index of minimum band (starting at 1 for the first occupied band).
         ib_max
             Index of maximum band.
+        bands: numpy.array(nband), int
+            Index of each band.
         eigs_dft_eV: numpy.array(nspin, nkpt, nband), float
             DFT eigenvalues, in eV.
         eigs_gw_eV: numpy.array(nspin, nkpt, nband), float
@@ -27,62 +100,96 @@ def extract_inteqp_bandstructure(fname):
             Difference between GW and DFT eigenvalues, in eV.
     """
 
-    data = np.loadtxt(fname, unpack=True)
-
-    spin = np.array(data[0], dtype=np.int)
-    band = np.array(data[1], dtype=np.int)
-    kpt = np.array(data[2:5,], dtype=np.float).transpose()
-    E_DFT = np.array(data[5], dtype=np.float)
-    E_QP = np.array(data[6], dtype=np.float)
-    DE = np.array(data[7], dtype=np.float)
-
-    # Find the dimensions
-    ndata = len(spin)
-    nspin = 1 if spin[0]==spin[-1] else 2
-
-    ib_min, ib_max = band[0], band[-1]
-    nband = ib_max - ib_min + 1
+    # Find the dimensions from the first band and from the last line
+    with open_text(fname) as f:
+        nheader, lines = _skip_header(f)
+        first_band = list()
+        for line in lines:
+            parts = line.split()
+            if first_band and (parts[:2] != first_band[0][:2]):
+                break
+            first_band.append(parts)
 
-    for i, b in enumerate(band):
-        if b != ib_min:
-            nkpt = i
-            break
+    nkpt_all = len(first_band)
+    ib_min = int(first_band[0][1])
+    if isinstance(fname, str) and not fname.endswith(('.gz', '.bz2', '.xz')):
+        last = [line for line in tail(fname, 8) if line.strip()][-1]
     else:
-        nkpt = len(kpt) / nspin
-
-    # Construct data arrays
-    eigs_dft_eV = np.zeros((nspin,nkpt,nband), dtype=np.float)
-    eigs_gw_eV = np.zeros((nspin,nkpt,nband), dtype=np.float)
-    delta_eigs_eV = np.zeros((nspin,nkpt,nband), dtype=np.float)
-
-    for i in range(ndata):
-        ispin = spin[i] - 1
-        ikpt = i % nkpt
-        iband = band[i] - 1
-
-        eigs_dft_eV[ispin,ikpt,iband] = E_DFT[i]
-        eigs_gw_eV[ispin,ikpt,iband] = E_QP[i]
-        delta_eigs_eV[ispin,ikpt,iband] = DE[i]
+        with open_text(fname) as f:
+            last = collections.deque(f, maxlen=1)[0]
+    nspin = int(last.split()[0])
+    ib_max = int(last.split()[1])
+    nband_all = ib_max - ib_min + 1
+
+    band_indices = np.arange(ib_min, ib_max + 1)
+    if bands is not None:
+        band_indices = np.unique(np.array(bands, dtype=int))
+        _check_bands(band_indices, np.arange(ib_min, ib_max + 1))
+    kpt_indices = np.arange(nkpt_all)
+    if ikpts is not None:
+        kpt_indices = np.unique(np.array(ikpts, dtype=int))
+
+    nband = len(band_indices)
+    nkpt = len(kpt_indices)
+
+    # Each block of rows holds all k-points of a band.
+    keep_band = np.zeros(nband_all, dtype=bool)
+    keep_band[band_indices - ib_min] = True
+    keep_kpt = None
+    if ikpts is not None:
+        keep_kpt = np.zeros(nkpt_all, dtype=bool)
+        keep_kpt[kpt_indices] = True
+
+    with open_text(fname) as f:
+        nheader, lines = _skip_header(f)
+        if bands is not None or ikpts is not None:
+            lines = _select_blocks(lines, nkpt_all,
+                                   np.tile(keep_band, nspin), keep_kpt)
+        data = np.loadtxt(lines, dtype=dtype, usecols=(2,3,4,5,6,7), ndmin=2)
+
+    # Rows are ordered by spin, band and k-point.
+    data = data.reshape((nspin, nband, nkpt, 6))
 
     results = dict(
         nspin=nspin,
         nkpt=nkpt,
         nband=nband,
-        kpts=kpt[:nkpt],
-        ib_min=ib_min,
-        ib_max=ib_max,
-        eigs_dft_eV=eigs_dft_eV,
-        eigs_gw_eV=eigs_gw_eV,
-        delta_eigs_eV=delta_eigs_eV,
+        kpts=np.array(data[0,0,:,0:3], dtype=float),
+        ib_min=int(band_indices.min()),
+        ib_max=int(band_indices.max()),
+        bands=band_indices,
+        eigs_dft_eV=data[...,3].transpose((0,2,1)).copy(),
+        eigs_gw_eV=data[...,4].transpose((0,2,1)).copy(),
+        delta_eigs_eV=data[...,5].transpose((0,2,1)).copy(),
         )
 
     return results
 
 
-def extract_inteqp_eqp(fname):
+def extract_inteqp_eqp(fname, bands=None, ikpts=None, dtype=float):
     """
     Extract the data in the 'eqp.dat' file produced by inteqp.x.
 
+    Only the rows of the requested bands and k-points are parsed.
+
+    Arguments
+    ---------
+    fname: str
+        The file name, possibly compressed (.gz, .bz2, .xz).
+
+    Keyword arguments
+    -----------------
+    bands: list of int, optional
+        Band indices to extract, as they appear in the file.
+        By default, all bands are extracted.
+        A ValueError is raised if a band is not in the file.
+    ikpts: list of int, optional
+        Indices of the k-points to extract, starting at 0.
+        By default, all k-points are extracted.
+        Bands and k-points are returned in the order of the file.
+    dtype: numpy.dtype (float)
+        Data type of the energies, e.g. numpy.float32 to save memory.
+
     Returns
     -------
     dict:
@@ -98,6 +205,8 @@ def extract_inteqp_eqp(fname):
             Index of minimum band (starting at 1 for the first occupied band).
         ib_max
             Index of maximum band.
+        bands: numpy.array(nband), int
+            Index of each band.
         eigs_dft_eV: numpy.array(nspin, nkpt, nband), float
             DFT eigenvalues, in eV.
         eigs_gw_eV: numpy.array(nspin, nkpt, nband), float
@@ -106,60 +215,54 @@ def extract_inteqp_eqp(fname):
             Difference between GW and DFT eigenvalues, in eV.
     """
 
-    with open(fname, 'r') as f:
-
-        # Read the first block to compute the dimensions
-        line = f.next()
-        parts = line.split()
-        nstates = int(parts[3])
-        spins = list()
-        bands = list()
-        for i in range(nstates):
-            line = f.next()
-            parts = line.split()
-            spins.append(int(parts[0]))
-            bands.append(int(parts[1]))
-
-        ib_min = min(bands)
-        ib_max = max(bands)
-        nspin = max(spins)
-        nband = nstates // nspin
-
-        # Count the remaining lines
-        nlines = nstates + 1
-        while True:
-            try:
-                line = f.next()
-                nlines += 1
-            except StopIteration:
-                break
-
-        nkpt = nlines // (nstates + 1)
-
-        kpts = np.zeros((nkpt, 3), dtype=np.ndarray)
-        eigs_dft_eV = np.zeros((nspin,nkpt,nband), dtype=np.ndarray)
-        eigs_gw_eV = np.zeros((nspin,nkpt,nband), dtype=np.ndarray)
-
-        # Rewind file to start
-        f.seek(0)
-
-        for ikpt in range(nkpt):
-
-            line = f.next()
-            parts = line.split()
-
-            kpts[ikpt,:] = map(float, parts[:3])
-
-            for i in range(nstates):
-
-                line = f.next()
-                parts = line.split()
-
-                ispin = i // nband
-                iband = i % nband
-
-                eigs_dft_eV[ispin,ikpt,iband] = float(parts[2])
-                eigs_gw_eV[ispin,ikpt,iband] = float(parts[3])
+    # Read the first block to compute the dimensions
+    with open_text(fname) as f:
+        lines = iter(f)
+        nstates = int(next(lines).split()[3])
+        states = np.array([line.split()[:2]
+                           for line in itertools.islice(lines, nstates)],
+                          dtype=int)
+
+    spins, all_bands = states[:,0], states[:,1]
+    nspin = int(spins.max())
+    nband_all = nstates // nspin
+    all_bands = all_bands[:nband_all]
+
+    if bands is None:
+        band_indices = all_bands
+        keep_state = np.ones(nstates, dtype=bool)
+    else:
+        band_indices = np.array(bands, dtype=int)
+        _check_bands(band_indices, all_bands)
+        keep_state = np.isin(all_bands, band_indices)
+        keep_state = np.tile(keep_state, nspin)
+        band_indices = all_bands[np.isin(all_bands, band_indices)]
+    nband = len(band_indices)
+
+    # Every line has 4 columns: each k-point block is a header line
+    # (3 coordinates and the number of states) followed by the states
+    # (spin, band, DFT and GW energies).
+    nrow = nstates + 1
+    keep_row = np.concatenate(([True], keep_state))
+
+    with open_text(fname) as f:
+        lines = iter(f)
+        if bands is not None or ikpts is not None:
+            if ikpts is None:
+                keep_kpt = itertools.repeat(True)
+            else:
+                keep_kpt = np.zeros(max(ikpts) + 1, dtype=bool)
+                keep_kpt[np.array(ikpts, dtype=int)] = True
+            lines = _select_blocks(lines, nrow, keep_kpt, keep_row)
+        data = np.loadtxt(lines, dtype=dtype, ndmin=2)
+
+    data = data.reshape((-1, nspin * nband + 1, 4))
+    nkpt = len(data)
+
+    kpts = np.array(data[:,0,:3], dtype=float)
+    states = data[:,1:,:].reshape((nkpt, nspin, nband, 4))
+    eigs_dft_eV = states[...,2].copy()
+    eigs_gw_eV = states[...,3].copy()
 
     delta_eigs_eV = eigs_gw_eV - eigs_dft_eV
 
@@ -168,12 +271,12 @@ def extract_inteqp_eqp(fname):
         nkpt=nkpt,
         nband=nband,
         kpts=kpts,
-        ib_min=ib_min,
-        ib_max=ib_max,
-        eigs_dft_eV=eigs_dft_eV,
-        eigs_gw_eV=eigs_gw_eV,
-        delta_eigs_eV=delta_eigs_eV,
+        ib_min=int(band_indices.min()),
+        ib_max=int(band_indices.max()),
+        bands=band_indices,
+        eigs_dft_eV=eigs_dft_eV.transpose((1,0,2)).copy(),
+        eigs_gw_eV=eigs_gw_eV.transpose((1,0,2)).copy(),
+        delta_eigs_eV=delta_eigs_eV.transpose((1,0,2)).copy(),
         )
 
     return results
-
@@ -0,0 +1,210 @@
+"""Extraction of the timing reports of the calculations."""
+import re
+from collections import OrderedDict
+
+from ..core.util import open_text
+
+# Public
+__all__ = ['read_bgw_timing', 'read_qe_timing', 'read_abinit_timing']
+
+
+_number = r'(-?\d+\.?\d*(?:[eE][-+]?\d+)?)'
+
+_bgw_header_regex = re.compile(r'CPU\s*[\(\[]s[\)\]]\s+WALL\s*[\(\[]s[\)\]]')
+_bgw_line_regex = re.compile(
+    r'^\s*(?P<name>[^\s(].*?)?\s*(?:\((?P<rank>min\.|PE 0|max\.)\))?\s+'
+    + _number + r'\s+' + _number + r'(?:\s+(\d+))?\s*$')
+
+_qe_time = r'((?:\d+d\s*)?(?:\d+h\s*)?(?:\d+m\s*)?(?:\d+\.?\d*s)?)'
+_qe_line_regex = re.compile(
+    r'^\s*(\S+)\s*:\s*' + _qe_time + r'\s*CPU\s+' + _qe_time +
+    r'\s*WALL(?:\s*\(\s*(\d+)\s*calls\))?')
+_qe_time_units = (('d', 86400.), ('h', 3600.), ('m', 60.), ('s', 1.))
+
+_abinit_overall_regex = re.compile(
+    r'Overall time at end \(sec\)\s*:\s*cpu=\s*' + _number +
+    r'\s+wall=\s*' + _number)
+_abinit_line_regex = re.compile(
+    r'^-\s+(\S.*?)\s+' + _number + r'\s+' + _number + r'\s+' + _number +
+    r'\s+' + _number + r'\s+(-?\d+)')
+
+
+def _make_entry(cpu, wall, ncalls=None):
+    entry = OrderedDict()
+    entry['cpu'] = float(cpu)
+    entry['wall'] = float(wall)
+    entry['ncalls'] = int(ncalls) if ncalls is not None else None
+    return entry
+
+
+def read_bgw_timing(f):
+    """
+    Extract the timing table at the end of the output
+    of a BerkeleyGW calculation (epsilon.out, sigma.out,
+    kernel.out, absorption.out, ...).
+
+    Arguments
+    ---------
+
+    f : str or file
+        The output file. A file name ending with .gz, .bz2 or .xz
+        is decompressed on the fly.
+
+    Returns
+    -------
+
+    timing : OrderedDict
+        For each section of the table (e.g. 'CHI SUM (TOTAL)', 'MTXEL',
+        'FFT EXEC', 'EPSINV (I/O)', 'TOTAL'), a dict with
+        cpu : float
+            CPU time in seconds, of the process 0.
+        wall : float
+            Wall time in seconds, of the process 0.
+        ncalls : int
+            Number of calls, or None if not reported.
+        When the table reports the minimum and maximum over the processes,
+        the dict also holds cpu_min, wall_min, cpu_max and wall_max.
+        The table is empty if the calculation did not complete.
+    """
+    with open_text(f) as fi:
+        lines = fi.readlines()
+
+    # The table follows the last header.
+    start = None
+    for i, line in enumerate(lines):
+        if _bgw_header_regex.search(line):
+            start = i + 1
+
+    timing = OrderedDict()
+    if start is None:
+        return timing
+
+    name = None
+    for line in lines[start:]:
+        if not line.strip():
+            continue
+        match = _bgw_line_regex.match(line)
+        if match is None:
+            break
+        cpu, wall, ncalls = match.group(3, 4, 5)
+        rank = match.group('rank')
+
+        if match.group('name'):
+            name = match.group('name').rstrip(':').strip()
+            timing[name] = _make_entry(cpu, wall, ncalls)
+        elif name is None:
+            break
+
+        if rank == 'min.':
+            timing[name]['cpu_min'] = float(cpu)
+            timing[name]['wall_min'] = float(wall)
+        elif rank == 'PE 0':
+            timing[name]['cpu'] = float(cpu)
+            timing[name]['wall'] = float(wall)
+        elif rank == 'max.':
+            timing[name]['cpu_max'] = float(cpu)
+            timing[name]['wall_max'] = float(wall)
+
+    return timing
+
+
+def _parse_qe_time(s):
+    """Convert a time written by Quantum Espresso, e.g. '1h 2m', to seconds."""
+    seconds = 0.
+    for unit, factor in _qe_time_units:
+        match = re.search(r'(\d+\.?\d*)' + unit, s)
+        if match:
+            seconds += float(match.group(1)) * factor
+    return seconds
+
+
+def read_qe_timing(f):
+    """
+    Extract the timing report at the end of the output
+    of a Quantum Espresso calculation (pw.x, pw2bgw.x).
+
+    Arguments
+    ---------
+
+    f : str or file
+        The output file. A file name ending with .gz, .bz2 or .xz
+        is decompressed on the fly.
+
+    Returns
+    -------
+
+    timing : OrderedDict
+        For each routine (e.g. 'electrons', 'c_bands', 'fftw'),
+        and for the whole program (e.g. 'PWSCF', 'PW2BGW'), a dict with
+        cpu : float
+            CPU time in seconds.
+        wall : float
+            Wall time in seconds.
+        ncalls : int
+            Number of calls, or None for the whole program.
+    """
+    timing = OrderedDict()
+    with open_text(f) as fi:
+        for line in fi:
+            if 'WALL' not in line:
+                continue
+            match = _qe_line_regex.match(line)
+            if match is None:
+                continue
+            name, cpu, wall, ncalls = match.groups()
+            timing[name] = _make_entry(
+                _parse_qe_time(cpu), _parse_qe_time(wall), ncalls)
+    return timing
+
+
+def read_abinit_timing(f):
+    """
+    Extract the timing summary of the output of an Abinit calculation.
+
+    Arguments
+    ---------
+
+    f : str or file
+        The output file. A file name ending with .gz, .bz2 or .xz
+        is decompressed on the fly.
+
+    Returns
+    -------
+
+    timing : OrderedDict
+        For the whole calculation ('Overall'), and for each routine
+        of the analysis of the time of the major code sections
+        when it is printed (see timopt), a dict with
+        cpu : float
+            CPU time in seconds.
+        wall : float
+            Wall time in seconds.
+        ncalls : int
+            Number of calls (-1 if not counted), or None for 'Overall'.
+    """
+    timing = OrderedDict()
+    routines = OrderedDict()
+    in_table = False
+    with open_text(f) as fi:
+        for line in fi:
+            match = _abinit_overall_regex.search(line)
+            if match:
+                timing['Overall'] = _make_entry(*match.groups())
+                continue
+
+            if line.startswith('- routine'):
+                in_table = True
+                routines = OrderedDict()
+                continue
+            if not in_table:
+                continue
+
+            match = _abinit_line_regex.match(line)
+            if match:
+                name, cpu, _, wall, _, ncalls = match.groups()
+                routines[name] = _make_entry(cpu, wall, ncalls)
+            elif routines:
+                in_table = False
+
+    timing.update(routines)
+    return timing
@@ -0,0 +1,440 @@
+"""
+Reader for the wavefunction, density and exchange-correlation potential
+files of BerkeleyGW (WFN, RHO, VXC), in Fortran binary or HDF5 format.
+"""
+
+import numpy as np
+
+__all__ = ['WfnFile']
+
+
+# Size of the record markers of Fortran sequential files.
+_marker = np.dtype('<i4')
+
+_HDF5_signature = b'\x89HDF\r\n\x1a\n'
+
+
+class WfnFile(object):
+    """
+    A WFN, RHO or VXC file produced by BerkeleyGW or by the DFT wrappers
+    (pw2bgw.x, abi2bgw.x).
+
+    The header is read when the file is opened.
+    The G-vectors and the coefficients are read only when requested,
+    as memory-mapped arrays (binary format) or h5py datasets (HDF5 format),
+    so that only the slices actually used are loaded from disk.
+
+    Attributes
+    ----------
+
+    sheader : str
+        'WFN', 'RHO' or 'VXC'.
+    flavor : str
+        'complex' or 'real'.
+    nspin : int
+        Number of spins.
+    nspinor : int
+        Number of spinor components.
+    ng : int
+        Number of G-vectors of the charge density.
+    ecutrho : float
+        Charge density cutoff, in Ry.
+    fft_grid : array(3), int
+        FFT grid.
+    nkpt : int
+        Number of k-points (WFN only).
+    nband : int
+        Number of bands (WFN only).
+    ngkmax : int
+        Maximum number of G-vectors of the wavefunctions (WFN only).
+    ecutwfc : float
+        Wavefunction cutoff, in Ry (WFN only).
+    kgrid : array(3), int
+        K-points grid (WFN only).
+    kshift : array(3), float
+        K-points shift (WFN only).
+    ngk : array(nkpt), int
+        Number of G-vectors of each k-point (WFN only).
+    kpts : array(nkpt, 3), float
+        K-points in reduced coordinates (WFN only).
+    wtks : array(nkpt), float
+        K-points weights (WFN only).
+    ifmin, ifmax : array(nspin, nkpt), int
+        Lowest and highest occupied bands (WFN only).
+    energies : array(nspin, nkpt, nband), float
+        Mean-field energies, in Ry (WFN only).
+    occupations : array(nspin, nkpt, nband), float
+        Occupations (WFN only).
+    nat : int
+        Number of atoms.
+    atyp : array(nat), int
+        Atomic numbers.
+    apos : array(nat, 3), float
+        Atomic positions, in units of alat.
+    celvol, alat, avec, adot : float, float, array(3,3), array(3,3)
+        Unit cell volume, lattice constant, lattice vectors
+        in units of alat and metric tensor, in bohr.
+    recvol, blat, bvec, bdot : float, float, array(3,3), array(3,3)
+        Same quantities for the reciprocal lattice.
+    ntran : int
+        Number of symmetries.
+    cell_symmetry : int
+        0 for cubic, 1 for hexagonal.
+    mtrx : array(ntran, 3, 3), int
+        Symmetry matrices.
+    tnp : array(ntran, 3), float
+        Fractional translations.
+    """
+
+    def __init__(self, fname):
+        """
+        Arguments
+        ---------
+
+        fname : str
+            Path to the file. The format (binary or HDF5) is detected
+            from the content of the file.
+        """
+        self.fname = fname
+
+        with open(fname, 'rb') as f:
+            signature = f.read(len(_HDF5_signature))
+
+        if signature == _HDF5_signature:
+            self.format = 'hdf5'
+            self._read_hdf5_header()
+        else:
+            self.format = 'binary'
+            self._read_binary_header()
+
+    def __repr__(self):
+        return '<{} {} {}: {}>'.format(
+            type(self).__name__, self.sheader, self.flavor, self.fname)
+
+    @property
+    def is_wfn(self):
+        return self.sheader == 'WFN'
+
+    @property
+    def nspin_total(self):
+        """Number of spin and spinor components of the coefficients."""
+        return self.nspin * self.nspinor
+
+    @property
+    def coefficient_dtype(self):
+        if self.flavor == 'complex':
+            return np.dtype('<c16')
+        return np.dtype('<f8')
+
+    # =================================================================== #
+    """ Binary format                                                     """
+
+    def _read_binary_header(self):
+        """Read the header and compute the position of the data."""
+        with open(self.fname, 'rb') as f:
+
+            title = self._read_record(f, 'S32')
+            stitle = title[0].decode('ascii').strip()
+            self.sheader = stitle.split('-')[0]
+            if 'complex' in stitle.lower():
+                self.flavor = 'complex'
+            else:
+                self.flavor = 'real'
+            self.date = title[1].decode('ascii').strip()
+            self.time = title[2].decode('ascii').strip()
+
+            if self.is_wfn:
+                dtype = np.dtype([
+                    ('ns', '<i4'), ('ng', '<i4'), ('ntran', '<i4'),
+                    ('cell_symmetry', '<i4'), ('nat', '<i4'),
+                    ('ecutrho', '<f8'), ('nkpt', '<i4'), ('nband', '<i4'),
+                    ('ngkmax', '<i4'), ('ecutwfc', '<f8')])
+            else:
+                dtype = np.dtype([
+                    ('ns', '<i4'), ('ng', '<i4'), ('ntran', '<i4'),
+                    ('cell_symmetry', '<i4'), ('nat', '<i4'),
+                    ('ecutrho', '<f8')])
+            dims = self._read_record(f, dtype)[0]
+
+            self._set_spin(int(dims['ns']))
+            self.ng = int(dims['ng'])
+            self.ntran = int(dims['ntran'])
+            self.cell_symmetry = int(dims['cell_symmetry'])
+            self.nat = int(dims['nat'])
+            self.ecutrho = float(dims['ecutrho'])
+
+            if self.is_wfn:
+                self.nkpt = int(dims['nkpt'])
+                self.nband = int(dims['nband'])
+                self.ngkmax = int(dims['ngkmax'])
+                self.ecutwfc = float(dims['ecutwfc'])
+
+                dtype = np.dtype([('fft_grid', '<i4', 3), ('kgrid', '<i4', 3),
+                                  ('kshift', '<f8', 3)])
+                grids = self._read_record(f, dtype)[0]
+                self.fft_grid = np.array(grids['fft_grid'])
+                self.kgrid = np.array(grids['kgrid'])
+                self.kshift = np.array(grids['kshift'])
+            else:
+                self.fft_grid = self._read_record(f, '<i4')
+
+            data = self._read_record(f, '<f8')
+            self.celvol, self.alat = data[:2]
+            self.avec = data[2:11].reshape((3,3))
+            self.adot = data[11:20].reshape((3,3))
+
+            data = self._read_record(f, '<f8')
+            self.recvol, self.blat = data[:2]
+            self.bvec = data[2:11].reshape((3,3))
+            self.bdot = data[11:20].reshape((3,3))
+
+            # Fortran arrays are stored in column-major order.
+            mtrx = self._read_record(f, '<i4').reshape((self.ntran, 3, 3))
+            self.mtrx = mtrx.transpose((0,2,1))
+            self.tnp = self._read_record(f, '<f8').reshape((self.ntran, 3))
+
+            dtype = np.dtype([('apos', '<f8', 3), ('atyp', '<i4')])
+            atoms = self._read_record(f, dtype)
+            self.apos = np.array(atoms['apos'])
+            self.atyp = np.array(atoms['atyp'])
+
+            if self.is_wfn:
+                nspin, nkpt, nband = self.nspin, self.nkpt, self.nband
+                self.ngk = self._read_record(f, '<i4')
+                self.wtks = self._read_record(f, '<f8')
+                self.kpts = self._read_record(f, '<f8').reshape((nkpt, 3))
+                self.ifmin = self._read_record(f, '<i4').reshape((nspin, nkpt))
+                self.ifmax = self._read_record(f, '<i4').reshape((nspin, nkpt))
+                self.energies = self._read_record(f, '<f8').reshape(
+                                                    (nspin, nkpt, nband))
+                self.occupations = self._read_record(f, '<f8').reshape(
+                                                    (nspin, nkpt, nband))
+
+            self._data_offset = f.tell()
+
+    def _set_spin(self, ns):
+        """Set nspin and nspinor from the number of spin components."""
+        if ns == 4:
+            self.nspin, self.nspinor = 1, 2
+        else:
+            self.nspin, self.nspinor = ns, 1
+
+    @staticmethod
+    def _read_record(f, dtype):
+        """Read a Fortran sequential record as an array of dtype."""
+        dtype = np.dtype(dtype)
+        content = list()
+        while True:
+            size = int(np.frombuffer(f.read(4), dtype=_marker)[0])
+            content.append(f.read(abs(size)))
+            f.read(4)
+            # Records split into subrecords have negative markers.
+            if size >= 0:
+                break
+        return np.frombuffer(b''.join(content), dtype=dtype).copy()
+
+    @staticmethod
+    def _record_size(nbytes):
+        """Size of a record on disk, including its markers."""
+        return nbytes + 2 * _marker.itemsize
+
+    def _get_block_size(self, ng, nbytes_per_g):
+        """
+        Size of a block of data written by BerkeleyGW:
+        a record with the number of records, a record with the number
+        of G-vectors, and the data in a single record.
+        """
+        return (2 * self._record_size(4) +
+                self._record_size(ng * nbytes_per_g))
+
+    def _check_block(self, offset, ng):
+        """Check that a block of data is in a single record of ng items."""
+        with open(self.fname, 'rb') as f:
+            f.seek(offset)
+            nrecord = int(self._read_record(f, '<i4')[0])
+            ngrecord = int(self._read_record(f, '<i4')[0])
+        if nrecord != 1 or ngrecord != ng:
+            raise Exception(
+                'Unexpected data layout in {}: '.format(self.fname) +
+                'found {} record(s) of {} items '.format(nrecord, ngrecord) +
+                'instead of a single record of {} items.'.format(ng))
+
+    def _memmap_block(self, offset, ng, dtype, shape):
+        """Memory-map the data of a block starting at offset."""
+        self._check_block(offset, ng)
+        data_offset = offset + 2 * self._record_size(4) + _marker.itemsize
+        return np.memmap(self.fname, dtype=dtype, mode='r',
+                         offset=data_offset, shape=shape)
+
+    @property
+    def _gvec_block_size(self):
+        return self._get_block_size(self.ng, 3 * 4)
+
+    def _get_kpt_offset(self, ikpt):
+        """Position of the G-vectors of k-point ikpt (binary format)."""
+        ns = self.nspin_total
+        itemsize = self.coefficient_dtype.itemsize
+        offset = self._data_offset + self._gvec_block_size
+        for ngk in self.ngk[:ikpt]:
+            offset += self._get_block_size(ngk, 3 * 4)
+            offset += self.nband * self._get_block_size(ngk, ns * itemsize)
+        return offset
+
+    # =================================================================== #
+    """ HDF5 format                                                       """
+
+    def _open_hdf5(self):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('h5py is required to read HDF5 files: '
+                              + self.fname)
+        return h5py.File(self.fname, 'r')
+
+    def _read_hdf5_header(self):
+        """Read the header from the mf_header group."""
+        with self._open_hdf5() as h5:
+            header = h5['mf_header']
+
+            def get(path):
+                return header[path][()]
+
+            self.sheader = 'WFN' if 'wfns' in h5 else 'RHO'
+            self.flavor = 'complex' if int(get('flavor')) == 2 else 'real'
+
+            self.nspin = int(get('kpoints/nspin'))
+            self.nspinor = 1
+            if 'kpoints/nspinor' in header:
+                self.nspinor = int(get('kpoints/nspinor'))
+            self.ng = int(get('gspace/ng'))
+            self.ecutrho = float(get('gspace/ecutrho'))
+            self.fft_grid = np.array(get('gspace/FFTgrid'))
+            self.ntran = int(get('symmetry/ntran'))
+            self.cell_symmetry = int(get('symmetry/cell_symmetry'))
+            mtrx = np.array(get('symmetry/mtrx'))[:self.ntran]
+            self.mtrx = mtrx.transpose((0,2,1))
+            self.tnp = np.array(get('symmetry/tnp'))[:self.ntran]
+
+            self.nat = int(get('crystal/nat'))
+            for key in ('celvol', 'alat', 'recvol', 'blat'):
+                setattr(self, key, float(get('crystal/' + key)))
+            for key in ('avec', 'adot', 'bvec', 'bdot', 'apos', 'atyp'):
+                setattr(self, key, np.array(get('crystal/' + key)))
+
+            if self.is_wfn:
+                self.nkpt = int(get('kpoints/nrk'))
+                self.nband = int(get('kpoints/mnband'))
+                self.ngkmax = int(get('kpoints/ngkmax'))
+                self.ecutwfc = float(get('kpoints/ecutwfc'))
+                self.kgrid = np.array(get('kpoints/kgrid'))
+                self.kshift = np.array(get('kpoints/shift'))
+                self.ngk = np.array(get('kpoints/ngk'))
+                self.wtks = np.array(get('kpoints/w'))
+                self.kpts = np.array(get('kpoints/rk'))
+                self.ifmin = np.array(get('kpoints/ifmin'))
+                self.ifmax = np.array(get('kpoints/ifmax'))
+                self.energies = np.array(get('kpoints/el'))
+                self.occupations = np.array(get('kpoints/occ'))
+
+            self.date = self.time = ''
+
+    # =================================================================== #
+    """ Data                                                              """
+
+    def get_gvectors(self):
+        """
+        Return the G-vectors of the charge density, array(ng, 3).
+        """
+        if self.format == 'hdf5':
+            with self._open_hdf5() as h5:
+                return np.array(h5['mf_header/gspace/components'])
+
+        return self._memmap_block(self._data_offset, self.ng,
+                                  '<i4', (self.ng, 3))
+
+    def get_kpt_gvectors(self, ikpt):
+        """
+        Return the G-vectors of the wavefunctions at k-point ikpt
+        (starting at 0), array(ngk, 3).
+        """
+        self._check_wfn()
+        ngk = int(self.ngk[ikpt])
+        if self.format == 'hdf5':
+            start = int(np.sum(self.ngk[:ikpt]))
+            with self._open_hdf5() as h5:
+                return np.array(h5['wfns/gvecs'][start:start+ngk])
+
+        offset = self._get_kpt_offset(ikpt)
+        return self._memmap_block(offset, ngk, '<i4', (ngk, 3))
+
+    def get_coefficients(self, ikpt, bands=None):
+        """
+        Return the plane-wave coefficients of the wavefunctions
+        at k-point ikpt (starting at 0), array(nband, nspin*nspinor, ngk).
+
+        With the binary format, the array is memory-mapped:
+        the coefficients are only read from disk when they are accessed.
+
+        Keyword arguments
+        -----------------
+
+        bands : slice or list of int, optional
+            Bands to return (starting at 0). Defaults to all bands.
+        """
+        self._check_wfn()
+        if bands is None:
+            bands = slice(None)
+        ngk = int(self.ngk[ikpt])
+        ns = self.nspin_total
+
+        if self.format == 'hdf5':
+            start = int(np.sum(self.ngk[:ikpt]))
+            with self._open_hdf5() as h5:
+                coeffs = h5['wfns/coeffs']
+                if isinstance(bands, slice):
+                    data = coeffs[bands, :, start:start+ngk]
+                else:
+                    data = np.stack([coeffs[ib, :, start:start+ngk]
+                                     for ib in bands])
+            if self.flavor == 'complex':
+                return data[...,0] + 1j * data[...,1]
+            return data[...,0]
+
+        itemsize = self.coefficient_dtype.itemsize
+        offset = self._get_kpt_offset(ikpt)
+        offset += self._get_block_size(ngk, 3 * 4)
+        band_size = self._get_block_size(ngk, ns * itemsize)
+        self._check_block(offset, ngk)
+
+        # View the bands as an array of records with the markers,
+        # and keep only the coefficients.
+        dtype = np.dtype([
+            ('head', 'V', 2 * self._record_size(4) + _marker.itemsize),
+            ('data', self.coefficient_dtype, (ns, ngk)),
+            ('tail', 'V', _marker.itemsize)])
+        assert dtype.itemsize == band_size
+        records = np.memmap(self.fname, dtype=dtype, mode='r',
+                            offset=offset, shape=(self.nband,))
+        return records['data'][bands]
+
+    def get_data(self):
+        """
+        Return the values of a RHO or VXC file on the G-vectors,
+        array(nspin, ng).
+        """
+        if self.is_wfn:
+            raise Exception('get_data is not available for WFN files.')
+        ns = self.nspin_total
+
+        if self.format == 'hdf5':
+            raise Exception('Reading RHO and VXC in HDF5 format '
+                            'is not supported.')
+
+        offset = self._data_offset + self._gvec_block_size
+        data = self._memmap_block(offset, self.ng, self.coefficient_dtype,
+                                  (ns, self.ng))
+        return data
+
+    def _check_wfn(self):
+        if not self.is_wfn:
+            raise Exception('{} is not a WFN file.'.format(self.fname))
@@ -1,6 +1,16 @@
 
+from .costflow import *
+from .parabandsflow import *
+from .wfnflow import *
+from .epsilonflow import *
+from .sigmaflow import *
 from .gwflow import *
+from .convergenceflow import *
 from .bseflow import *
 from .vmtxelflow import *
+from .sweepflow import *
 
-__all__ = gwflow.__all__ + bseflow.__all__ + vmtxelflow.__all__
+__all__ = (costflow.__all__ + parabandsflow.__all__ + wfnflow.__all__ +
+           epsilonflow.__all__ + sigmaflow.__all__ + gwflow.__all__ +
+           convergenceflow.__all__ + bseflow.__all__ + vmtxelflow.__all__ +
+           sweepflow.__all__)
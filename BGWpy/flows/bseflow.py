@@ -2,15 +2,19 @@
 from os.path import join as pjoin
 import warnings
 
+import numpy as np
+
 from ..config import flavors
 from ..config import is_dft_flavor_espresso, is_dft_flavor_abinit, check_dft_flavor
 from ..external import Structure
-from ..core import Workflow
+from .costflow import CostEstimatedFlow
+from .parabandsflow import ParabandsMixin
+from .wfnflow import ChunkedWfnMixin
 from ..BGW import EpsilonTask, SigmaTask, KernelTask, AbsorptionTask
 
 __all__ = ['BSEFlow']
 
-class BSEFlow(Workflow):
+class BSEFlow(ChunkedWfnMixin, ParabandsMixin, CostEstimatedFlow):
     """
     A Flow of calculations made of the following tasks:
         - DFT charge density, wavefunctions and eigenvalues
@@ -78,6 +82,12 @@ class BSEFlow(Workflow):
             Number of conduction bands on the fine grid.
         nbnd_fine : int
             Number of bands to be computed on the fine grid for absorption.
+        wfn_fi_chunks, wfn_fi_chunk_kwargs : optional
+            Calculation of the wavefunctions of the fine grids by chunks
+            of k-points. See ChunkedWfnMixin.init_wfn_fi_chunks.
+        parabands, nbnd_dft, parabands_extra_lines, parabands_extra_variables : optional
+            Generation of the empty bands with parabands.
+            See ParabandsMixin.init_parabands.
         epsilon_extra_lines : list, optional
             Any other lines that should appear in the epsilon input file.
         epsilon_extra_variables : dict, optional
@@ -94,6 +104,8 @@ class BSEFlow(Workflow):
             Any other lines that should appear in the absorption input file.
         absorption_extra_variables : dict, optional
             Any other variables that should be declared in the absorption input file.
+        nbnd_occ, max_memory, max_walltime : optional
+            Options of the cost estimates. See CostEstimatedFlow.init_cost.
 
         """
         super(BSEFlow, self).__init__(**kwargs)
@@ -126,6 +138,12 @@ class BSEFlow(Workflow):
                           "   nbnd_fine = nbnd_occupied + nbnd_cond_fi + 1.")
         self.nbnd_fine = kwargs.pop('nbnd_fine', self.nbnd)
 
+        self.init_cost(kwargs)
+
+        self.init_wfn_fi_chunks(kwargs)
+
+        self.init_parabands(kwargs)
+
         # ==== DFT calculations ==== #
         self.dft_flavor = check_dft_flavor(kwargs.get('dft_flavor', flavors['dft_flavor']))
 
@@ -136,6 +154,9 @@ class BSEFlow(Workflow):
 
         # Abinit flavor
         elif is_dft_flavor_abinit(self.dft_flavor):
+            if self.parabands:
+                raise Exception(
+                    'parabands is only available with the espresso flavor.')
             fnames = self.make_dft_tasks_abinit(**kwargs)
             kwargs.update(fnames)
         
@@ -192,10 +213,16 @@ class BSEFlow(Workflow):
         self.add_tasks([self.epsilontask, self.sigmatask,
                         self.kerneltask, self.absorptiontask], merge=False)
 
+        self.check_cost_limits()
+
     @property
     def has_kshift(self):
         return any([i!=0 for i in self.kshift])
 
+    @property
+    def nkpt_fine(self):
+        return int(np.prod(self.ngkpt_fi))
+
     _truncation_flag = ''
     @property
     def truncation_flag(self):
@@ -250,15 +277,24 @@ class BSEFlow(Workflow):
             data_file_fname = self.scftask.data_file_fname,
             spin_polarization_fname = self.scftask.spin_polarization_fname)
         
+        # With parabands, DFT only computes a few bands
+        # along with the potentials needed to generate the others.
+        if self.parabands:
+            nbnd = self.nbnd_dft
+            wfn_kwargs = dict(kwargs, vscg_flag=True, vkbg_flag=True)
+        else:
+            nbnd = self.nbnd
+            wfn_kwargs = kwargs
+
         # Wavefunction tasks for Epsilon
         self.wfntask_ksh = QeBgwFlow(
             dirname = pjoin(self.dirname, '02-wfn'),
             ngkpt = self.ngkpt,
             kshift = self.kshift,
-            nbnd = self.nbnd,
+            nbnd = nbnd,
             rhog_flag = True,
             symkpt=False,
-            **kwargs)
+            **wfn_kwargs)
 
         self.wfntask_qsh = QeBgwFlow(
             dirname = pjoin(self.dirname, '03-wfnq'),
@@ -278,18 +314,26 @@ class BSEFlow(Workflow):
             self.wfntask_ush = QeBgwFlow(
                 dirname = pjoin(self.dirname, '04-wfn_co'),
                 ngkpt = self.ngkpt,
-                nbnd = self.nbnd,
+                nbnd = nbnd,
                 rhog_flag = True,
                 symkpt=False,
-                **kwargs)
+                **wfn_kwargs)
 
             self.add_task(self.wfntask_ush)
 
         else:
             self.wfntask_ush = self.wfntask_ksh
 
+        wfn_fname = self.wfntask_ksh.wfn_fname
+        wfn_co_fname = self.wfntask_ush.wfn_fname
+
+        # Empty bands for Epsilon and Sigma
+        if self.parabands:
+            wfn_fname, wfn_co_fname = self.make_parabands_tasks(**kwargs)
+
         # Wavefunctions on fine k-point grids
-        self.wfntask_fi_ush = QeBgwFlow(
+        self.wfntask_fi_ush = self.make_wfn_fi_task(
+            QeBgwFlow,
             dirname = pjoin(self.dirname, '05-wfn_fi'),
             nbnd = self.nbnd_fine,
             ngkpt = self.ngkpt_fi,
@@ -298,7 +342,8 @@ class BSEFlow(Workflow):
             symkpt=False,
             **kwargs)
         
-        self.wfntask_fi_qsh = QeBgwFlow(
+        self.wfntask_fi_qsh = self.make_wfn_fi_task(
+            QeBgwFlow,
             dirname = pjoin(self.dirname, '06-wfnq_fi'),
             ngkpt = self.ngkpt_fi,
             kshift = self.kshift_fi,
@@ -308,9 +353,9 @@ class BSEFlow(Workflow):
         
         self.add_tasks([self.wfntask_fi_ush, self.wfntask_fi_qsh])
 
-        fnames = dict(wfn_fname = self.wfntask_ksh.wfn_fname,
+        fnames = dict(wfn_fname = wfn_fname,
                       wfnq_fname = self.wfntask_qsh.wfn_fname,
-                      wfn_co_fname = self.wfntask_ush.wfn_fname,
+                      wfn_co_fname = wfn_co_fname,
                       rho_fname = self.wfntask_ush.rho_fname,
                       vxc_dat_fname = self.wfntask_ush.vxc_dat_fname,
                       wfn_fi_fname = self.wfntask_fi_ush.wfn_fname,
@@ -380,7 +425,8 @@ class BSEFlow(Workflow):
             self.wfntask_ush = self.wfntask_ksh
 
         # Wavefunctions on fine k-point grids
-        self.wfntask_fi_ush = AbinitBgwFlow(
+        self.wfntask_fi_ush = self.make_wfn_fi_task(
+            AbinitBgwFlow,
             dirname = pjoin(self.dirname, '05-wfn_fi'),
             nband = self.nbnd_fine,
             ngkpt = self.ngkpt_fi,
@@ -389,7 +435,8 @@ class BSEFlow(Workflow):
             symkpt=False,
             **kwargs)
         
-        self.wfntask_fi_qsh = AbinitBgwFlow(
+        self.wfntask_fi_qsh = self.make_wfn_fi_task(
+            AbinitBgwFlow,
             dirname = pjoin(self.dirname, '06-wfnq_fi'),
             nband = None,
             ngkpt = self.ngkpt_fi,
@@ -0,0 +1,140 @@
+"""Workflow to converge a GW calculation with respect to the number of bands."""
+from __future__ import print_function
+
+from os.path import join as pjoin
+
+from ..BGW import EpsilonTask, SigmaTask
+from .gwflow import GWFlow
+
+__all__ = ['BandConvergenceFlow']
+
+class BandConvergenceFlow(GWFlow):
+    """
+    A convergence study of a one-shot GW calculation
+    with respect to the number of bands, made of the following tasks:
+        - DFT charge density, wavefunctions and eigenvalues,
+          computed once with the largest number of bands
+        - Dielectric Matrix (Epsilon and Epsilon^-1) for each variant
+        - Self-energy (Sigma) for each variant
+
+    Every variant links the same wavefunctions files and limits
+    the number of bands with the 'number_bands' variable of BerkeleyGW.
+    The variants are independent of one another, and are executed
+    concurrently with BandConvergenceFlow.run(parallel=True).
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        nbnd_values : list of int
+            Numbers of bands used in epsilon and sigma.
+            The wavefunctions are computed with the largest one.
+        ecuteps_values : list of float, optional
+            Energy cutoffs for the dielectric function.
+            Every number of bands is combined with every cutoff.
+            Defaults to [ecuteps].
+
+        All other keyword arguments are those of GWFlow,
+        except nbnd, which is the largest value of nbnd_values,
+        and epsilon_shards and sigma_shards, which are not available.
+
+        Properties
+        ----------
+
+        variants : list of tuple(nbnd, ecuteps)
+            The parameters of each variant, in the order of
+            epsilontasks and sigmatasks.
+
+        """
+        self.nbnd_values = list(kwargs.pop('nbnd_values'))
+        self.ecuteps_values = list(kwargs.pop('ecuteps_values',
+                                              [kwargs.get('ecuteps')]))
+
+        if kwargs.get('epsilon_shards') or kwargs.get('sigma_shards'):
+            raise Exception('Sharding is not available '
+                            'in a band convergence study.')
+
+        kwargs.pop('nband', None)
+        kwargs['nbnd'] = max(self.nbnd_values)
+
+        super(BandConvergenceFlow, self).__init__(**kwargs)
+
+    def get_variant_dirname(self, nbnd, ecuteps):
+        """Return the directory of the variant."""
+        dirname = 'nbnd-{}'.format(nbnd)
+        if len(self.ecuteps_values) > 1:
+            dirname += '_ecuteps-{:g}'.format(ecuteps)
+        return pjoin(self.dirname, dirname)
+
+    def make_gw_tasks(self, **kwargs):
+        """
+        Initialize the Epsilon and Sigma tasks of every variant,
+        all linking the same wavefunctions files.
+        """
+
+        kwargs.pop('ecuteps', None)
+
+        # The q-points of sigma are not those of epsilon.
+        epsilon_kwargs = dict(kwargs)
+        epsilon_kwargs.pop('qpts', None)
+
+        self.variants = list()
+        self.epsilontasks = list()
+        self.sigmatasks = list()
+
+        for nbnd in self.nbnd_values:
+            for ecuteps in self.ecuteps_values:
+
+                dirname = self.get_variant_dirname(nbnd, ecuteps)
+
+                epsilontask = EpsilonTask(
+                    dirname = pjoin(dirname, '11-epsilon'),
+                    ngkpt = self.ngkpt,
+                    qshift = self.qshift,
+                    ecuteps = ecuteps,
+                    extra_lines = self.epsilon_extra_lines,
+                    extra_variables = dict(self.epsilon_extra_variables,
+                                           number_bands=nbnd),
+                    **epsilon_kwargs)
+
+                sigmatask = SigmaTask(
+                    dirname = pjoin(dirname, '12-sigma'),
+                    ngkpt = self.ngkpt,
+                    extra_lines = self.sigma_extra_lines,
+                    extra_variables = dict(self.sigma_extra_variables,
+                                           number_bands=nbnd),
+                    eps0mat_fname = epsilontask.eps0mat_fname,
+                    epsmat_fname = epsilontask.epsmat_fname,
+                    **kwargs)
+
+                self.variants.append((nbnd, ecuteps))
+                self.epsilontasks.append(epsilontask)
+                self.sigmatasks.append(sigmatask)
+
+                self.add_tasks([epsilontask, sigmatask], merge=False)
+
+        # The last variant, for compatibility with GWFlow.
+        self.epsilontask = self.epsilontasks[-1]
+        self.sigmatask = self.sigmatasks[-1]
+
+    @property
+    def sigma_kpts(self):
+        return self.sigmatask.input.kpts
+
+    @sigma_kpts.setter
+    def sigma_kpts(self, value):
+        if not value:
+            return
+        for task in self.sigmatasks:
+            task.input.kpts = value
+
+    def get_sigma_fnames(self):
+        """
+        Return a dictionary of the sigma_hp.log files
+        with the parameters (nbnd, ecuteps) of each variant as keys.
+        """
+        return dict((variant, task.sigma_fname) for variant, task
+                    in zip(self.variants, self.sigmatasks))
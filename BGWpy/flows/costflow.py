@@ -0,0 +1,142 @@
+"""Base class of the flows whose cost can be estimated."""
+from __future__ import print_function
+
+import os
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from ..core import Workflow
+from ..BGW import EpsilonTask, SigmaTask, KernelTask, AbsorptionTask
+from ..BGW import CostEstimator, get_number_of_valence_electrons
+
+__all__ = ['CostEstimatedFlow']
+
+
+class CostEstimatedFlow(Workflow):
+    """
+    Workflow whose epsilon, sigma, kernel and absorption tasks
+    can be estimated with a CostEstimator.
+
+    The subclasses define the structure, ngkpt and nbnd attributes,
+    call init_cost with their keyword arguments before making the tasks,
+    and check_cost_limits once all the tasks are added.
+    """
+
+    _estimable_tasks = (EpsilonTask, SigmaTask, KernelTask, AbsorptionTask)
+
+    def init_cost(self, kwargs):
+        """
+        Read the options of the cost estimates from the keyword arguments
+        of the flow, removing the ones that are not used by the tasks.
+        The cutoffs ecutwfc and ecuteps are read as well.
+
+        Keyword arguments
+        -----------------
+
+        nbnd_occ : int, optional
+            Number of occupied bands, used to estimate the cost of epsilon.
+            Defaults to half the number of valence electrons,
+            read from the pseudopotentials. It is required to check
+            the cost if the pseudopotentials cannot be read.
+            See estimate_cost.
+        max_memory : float, optional
+            Memory available per MPI process, in bytes.
+            A warning is issued for the tasks whose estimated memory
+            exceeds it. See check_cost.
+        max_walltime : float, optional
+            Wall time available for each task, in seconds.
+            A warning is issued for the tasks whose estimated wall time
+            exceeds it. See check_cost.
+        """
+        self.ecutwfc = kwargs.get('ecutwfc')
+        self.ecuteps = kwargs.get('ecuteps')
+        self.nbnd_occ = kwargs.pop('nbnd_occ', None)
+        self.max_memory = kwargs.pop('max_memory', None)
+        self.max_walltime = kwargs.pop('max_walltime', None)
+
+        if self.nbnd_occ is None:
+            self.nbnd_occ = self.get_nbnd_occ(
+                kwargs.get('pseudos'), kwargs.get('pseudo_dir', ''))
+
+        if self.nbnd_occ is None and (self.max_memory is not None or
+                                      self.max_walltime is not None):
+            raise Exception(
+                'nbnd_occ is required to check the cost, since it could not'
+                ' be obtained from the pseudopotentials.')
+
+    def get_nbnd_occ(self, pseudos, pseudo_dir=''):
+        """
+        Return the number of occupied bands, half the number
+        of valence electrons rounded up, or None if the pseudopotentials
+        are not given or cannot be read, with a warning in the latter case.
+        """
+        if not pseudos:
+            return None
+        try:
+            nelec = get_number_of_valence_electrons(
+                self.structure, pseudos, pseudo_dir)
+        except (IOError, OSError, ValueError, KeyError) as error:
+            warnings.warn('Could not count the valence electrons '
+                          'from the pseudopotentials: {}'.format(error))
+            return None
+        return (int(round(nelec)) + 1) // 2
+
+    def check_cost_limits(self):
+        """Check the cost of the tasks if max_memory or max_walltime is set."""
+        if self.max_memory is not None or self.max_walltime is not None:
+            self.check_cost(self.max_memory, self.max_walltime)
+
+    @property
+    def nkpt_fine(self):
+        """Number of k-points of the fine grid, or None."""
+        return None
+
+    def get_estimable_tasks(self):
+        """Return the tasks of the flow whose cost can be estimated."""
+        return [task for task in self
+                if isinstance(task, self._estimable_tasks)]
+
+    def estimate_cost(self, constants=None):
+        """
+        Estimate the cost of the epsilon, sigma, kernel and absorption
+        tasks, from their input and their number of processes.
+        See CostEstimator.
+
+        Keyword arguments
+        -----------------
+
+        constants : dict, optional
+            Calibrated constants of the CostEstimator.
+
+        Returns
+        -------
+
+        estimates : OrderedDict
+            The estimate of each task,
+            indexed by its directory relative to the flow.
+        """
+        if self.ecutwfc is None:
+            raise Exception('ecutwfc is required to estimate the cost.')
+
+        estimator = CostEstimator(self.structure, self.ecutwfc, constants)
+        estimates = OrderedDict()
+        for task in self.get_estimable_tasks():
+            estimates[os.path.relpath(task.dirname, self.dirname)] = (
+                estimator.estimate_task(
+                    task, self.nbnd, int(np.prod(self.ngkpt)),
+                    ecuteps=self.ecuteps,
+                    nkpt_fine=self.nkpt_fine,
+                    nbnd_occ=self.nbnd_occ))
+        return estimates
+
+    def check_cost(self, max_memory=None, max_walltime=None, constants=None):
+        """
+        Issue a warning for each task whose estimated memory per process
+        or wall time exceeds a limit. Return the estimates.
+        See estimate_cost.
+        """
+        estimates = self.estimate_cost(constants)
+        CostEstimator.check_estimates(estimates, max_memory, max_walltime)
+        return estimates
@@ -0,0 +1,132 @@
+"""Workflow to compute the dielectric matrix over shards of q-points."""
+from __future__ import print_function
+
+from os.path import join as pjoin
+
+import numpy as np
+
+from ..core import Workflow
+from ..BGW import KgridTask, EpsilonTask, EpsmatMergeTask
+
+__all__ = ['ShardedEpsilonFlow']
+
+class ShardedEpsilonFlow(Workflow):
+    """
+    Inverse dielectric matrix computed by several independent epsilon runs,
+    each over a subset of the q-points, followed by the merge
+    of the epsmat.h5 files.
+
+    The first shard also computes the q-point used to treat the Gamma point.
+    The eps0mat.h5 file and the merged epsmat.h5 file are found
+    in the main directory, as for a single EpsilonTask.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+        nshards : int
+            Number of epsilon runs. The q-points are split
+            in contiguous subsets of nearly equal sizes.
+        shard_kwargs : list of dict, optional
+            Keyword arguments for the EpsilonTask of each shard,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
+        merge_executable : str, optional
+            Command used to merge the epsmat.h5 files.
+            See EpsmatMergeTask.
+
+        All other keyword arguments are passed to each EpsilonTask.
+        See EpsilonTask for the mandatory ones.
+
+        Properties
+        ----------
+
+        eps0mat_fname : str
+            Path to the eps0mat.h5 file.
+        epsmat_fname : str
+            Path to the merged epsmat.h5 file.
+
+        """
+        super(ShardedEpsilonFlow, self).__init__(**kwargs)
+
+        kwargs.pop('dirname', None)
+
+        if not EpsilonTask._use_hdf5:
+            raise Exception('Sharding the q-points of epsilon '
+                            'requires the hdf5 format.')
+
+        nshards = kwargs.pop('nshards')
+        shard_kwargs = kwargs.pop('shard_kwargs', None) or [{}] * nshards
+        if len(shard_kwargs) != nshards:
+            raise Exception('shard_kwargs must have one entry per shard.')
+
+        merge_kwargs = dict()
+        if 'merge_executable' in kwargs:
+            merge_kwargs['merge_executable'] = kwargs.pop('merge_executable')
+
+        qpts = self.get_qpoints(**kwargs)
+
+        # Index 0 stands for the q-point used to treat the Gamma point.
+        shards = [indices for indices in
+                  np.array_split(np.arange(len(qpts) + 1), nshards)
+                  if len(indices)]
+
+        self.epsilontasks = list()
+        epsmat_fnames = list()
+        for i, indices in enumerate(shards):
+            task_kwargs = dict(kwargs)
+            task_kwargs.update(shard_kwargs[i])
+            task_kwargs.update(
+                qpts = [qpts[j-1] for j in indices if j > 0],
+                with_q0 = (indices[0] == 0),
+                )
+            task = EpsilonTask(
+                dirname = pjoin(self.dirname, 'shard-{:02}'.format(i + 1)),
+                **task_kwargs)
+            self.epsilontasks.append(task)
+
+            if len(task.input.qpts):
+                epsmat_fnames.append(task.epsmat_fname)
+
+        self.mergetask = EpsmatMergeTask(
+            dirname = self.dirname,
+            runscript_fname = 'merge.sh',
+            epsmat_fnames = epsmat_fnames,
+            eps0mat_fname = self.epsilontasks[0].eps0mat_fname,
+            **merge_kwargs)
+
+        self.add_tasks(self.epsilontasks + [self.mergetask])
+
+    def get_qpoints(self, **kwargs):
+        """
+        Return the q-points other than the one used to treat
+        the Gamma point, as EpsilonTask would compute them.
+        """
+        if 'qpts' in kwargs:
+            return list(kwargs['qpts'])
+
+        kgrid_kwargs = dict()
+        for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after',
+                    'kgrid_backend'):
+            if key in kwargs:
+                kgrid_kwargs[key] = kwargs[key]
+        self.kgridtask = KgridTask(dirname=self.dirname, **kgrid_kwargs)
+
+        if kwargs.get('symkpt', True):
+            kpts_ush, wtks_ush = self.kgridtask.get_kpoints()
+        else:
+            kpts_ush, wtks_ush = self.kgridtask.get_kpt_grid_nosym()
+        return list(kpts_ush[1:])
+
+    @property
+    def eps0mat_fname(self):
+        return self.mergetask.eps0mat_fname
+
+    @property
+    def epsmat_fname(self):
+        return self.mergetask.epsmat_fname
@@ -3,15 +3,20 @@ from __future__ import print_function
 
 from os.path import join as pjoin
 
+import numpy as np
+
 from ..config import flavors
 from ..config import is_dft_flavor_espresso, is_dft_flavor_abinit, check_dft_flavor
 from ..external import Structure
-from ..core import Workflow
 from ..BGW import EpsilonTask, SigmaTask
+from .costflow import CostEstimatedFlow
+from .parabandsflow import ParabandsMixin
+from .epsilonflow import ShardedEpsilonFlow
+from .sigmaflow import ShardedSigmaFlow
 
 __all__ = ['GWFlow']
 
-class GWFlow(Workflow):
+class GWFlow(ParabandsMixin, CostEstimatedFlow):
     """
     A one-shot GW workflow made of the following tasks:
         - DFT charge density, wavefunctions and eigenvalues
@@ -61,14 +66,37 @@ class GWFlow(Workflow):
         sigma_kpts : list of list(3), optional
             K-points to evaluate self-energy operator. Defaults to all
             k-points defined by the Monkhorst-Pack grid ngkpt.
+        parabands, nbnd_dft, parabands_extra_lines, parabands_extra_variables : optional
+            Generation of the empty bands with parabands.
+            See ParabandsMixin.init_parabands.
         epsilon_extra_lines : list, optional
             Any other lines that should appear in the epsilon input file.
         epsilon_extra_variables : dict, optional
             Any other variables that should be declared in the epsilon input file.
+        epsilon_shards : int, optional
+            Split the q-points of epsilon over this number of independent
+            runs, whose epsmat.h5 files are merged before sigma.
+            See ShardedEpsilonFlow. Requires the hdf5 format.
+        epsilon_shard_kwargs : list of dict, optional
+            Keyword arguments for the epsilon run of each shard,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
         sigma_extra_lines : list, optional
             Any other lines that should appear in the sigma input file.
         sigma_extra_variables : dict, optional
             Any other variables that should be declared in the sigma input file.
+        sigma_shards : int, optional
+            Split the k-points of sigma over this number of independent
+            runs, whose eqp0.dat, eqp1.dat and sigma_hp.log files
+            are merged. See ShardedSigmaFlow.
+        sigma_shard_kwargs : list of dict, optional
+            Keyword arguments for the sigma run of each shard,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
+        restart : bool (False)
+            Compute only the q-points of epsilon and the k-points of sigma
+            that were not completed by an unfinished run.
+            See EpsilonTask.prepare_restart and SigmaTask.prepare_restart.
+        nbnd_occ, max_memory, max_walltime : optional
+            Options of the cost estimates. See CostEstimatedFlow.init_cost.
 
         """
         super(GWFlow, self).__init__(**kwargs)
@@ -92,6 +120,10 @@ class GWFlow(Workflow):
 
         self.dft_flavor = check_dft_flavor(kwargs.get('dft_flavor', flavors['dft_flavor']))
 
+        self.init_cost(kwargs)
+
+        self.init_parabands(kwargs)
+
         # ==== DFT calculations ==== #
 
         # Quantum Espresso flavor
@@ -101,6 +133,9 @@ class GWFlow(Workflow):
 
         # Abinit flavor
         elif is_dft_flavor_abinit(self.dft_flavor):
+            if self.parabands:
+                raise Exception(
+                    'parabands is only available with the espresso flavor.')
             fnames = self.make_dft_tasks_abinit(**kwargs)
             kwargs.update(fnames)
 
@@ -114,42 +149,39 @@ class GWFlow(Workflow):
         self.sigma_extra_lines = kwargs.pop('sigma_extra_lines', [])
         self.sigma_extra_variables = kwargs.pop('sigma_extra_variables', {})
         
-        # Dielectric matrix computation and inversion (epsilon)
-        self.epsilontask = EpsilonTask(
-            dirname = pjoin(self.dirname, '11-epsilon'),
-            ngkpt = self.ngkpt,
-            qshift = self.qshift,
-            extra_lines = self.epsilon_extra_lines,
-            extra_variables = self.epsilon_extra_variables,
-            **kwargs)
-        
-        
-        # Self-energy calculation (sigma)
-        self.sigmatask = SigmaTask(
-            dirname = pjoin(self.dirname, '12-sigma'),
-            ngkpt = self.ngkpt,
-            extra_lines = self.sigma_extra_lines,
-            extra_variables = self.sigma_extra_variables,
-            eps0mat_fname = self.epsilontask.eps0mat_fname,
-            epsmat_fname = self.epsilontask.epsmat_fname,
-            **kwargs)
-        
-        self.add_tasks([self.epsilontask, self.sigmatask], merge=False)
+        self.epsilon_shards = kwargs.pop('epsilon_shards', None)
+        self.epsilon_shard_kwargs = kwargs.pop('epsilon_shard_kwargs', None)
+
+        self.sigma_shards = kwargs.pop('sigma_shards', None)
+        self.sigma_shard_kwargs = kwargs.pop('sigma_shard_kwargs', None)
+
+        self.make_gw_tasks(**kwargs)
 
         self.truncation_flag = kwargs.get('truncation_flag')
         self.sigma_kpts = kwargs.get('sigma_kpts')
-        
+
+        self.check_cost_limits()
+
     @property
     def has_kshift(self):
         return any([i!=0 for i in self.kshift])
 
     @property
     def sigma_kpts(self):
+        if self.sigma_shards:
+            return self.sigmatask.kpts
         return self.sigmatask.input.kpts
 
     @sigma_kpts.setter
     def sigma_kpts(self, value):
-        if value:
+        if not value:
+            return
+        if self.sigma_shards:
+            if len(value) != len(self.sigma_kpts) or not np.allclose(
+                value, self.sigma_kpts):
+                raise Exception('The k-points of a sharded sigma calculation '
+                                'must be specified at initialization.')
+        else:
             self.sigmatask.input.kpts = value
 
     _truncation_flag = ''
@@ -160,7 +192,7 @@ class GWFlow(Workflow):
     @truncation_flag.setter
     def truncation_flag(self, value):
 
-        for task in (self.epsilontask, self.sigmatask):
+        for task in self.epsilontasks + self.sigmatasks:
 
             # Remove old value
             if self._truncation_flag in task.input.keywords:
@@ -174,6 +206,64 @@ class GWFlow(Workflow):
         self._truncation_flag = value
 
 
+    def make_gw_tasks(self, **kwargs):
+        """
+        Initialize the Epsilon and Sigma tasks,
+        once the wavefunctions file names are known.
+        """
+
+        # The q-points of sigma are not those of epsilon.
+        epsilon_kwargs = dict(kwargs)
+        epsilon_kwargs.pop('qpts', None)
+
+        # Dielectric matrix computation and inversion (epsilon)
+        if self.epsilon_shards:
+            self.epsilontask = ShardedEpsilonFlow(
+                dirname = pjoin(self.dirname, '11-epsilon'),
+                nshards = self.epsilon_shards,
+                shard_kwargs = self.epsilon_shard_kwargs,
+                ngkpt = self.ngkpt,
+                qshift = self.qshift,
+                extra_lines = self.epsilon_extra_lines,
+                extra_variables = self.epsilon_extra_variables,
+                **epsilon_kwargs)
+            self.epsilontasks = self.epsilontask.epsilontasks
+        else:
+            self.epsilontask = EpsilonTask(
+                dirname = pjoin(self.dirname, '11-epsilon'),
+                ngkpt = self.ngkpt,
+                qshift = self.qshift,
+                extra_lines = self.epsilon_extra_lines,
+                extra_variables = self.epsilon_extra_variables,
+                **epsilon_kwargs)
+            self.epsilontasks = [self.epsilontask]
+
+        # Self-energy calculation (sigma)
+        if self.sigma_shards:
+            self.sigmatask = ShardedSigmaFlow(
+                dirname = pjoin(self.dirname, '12-sigma'),
+                nshards = self.sigma_shards,
+                shard_kwargs = self.sigma_shard_kwargs,
+                ngkpt = self.ngkpt,
+                extra_lines = self.sigma_extra_lines,
+                extra_variables = self.sigma_extra_variables,
+                eps0mat_fname = self.epsilontask.eps0mat_fname,
+                epsmat_fname = self.epsilontask.epsmat_fname,
+                **kwargs)
+            self.sigmatasks = self.sigmatask.sigmatasks
+        else:
+            self.sigmatask = SigmaTask(
+                dirname = pjoin(self.dirname, '12-sigma'),
+                ngkpt = self.ngkpt,
+                extra_lines = self.sigma_extra_lines,
+                extra_variables = self.sigma_extra_variables,
+                eps0mat_fname = self.epsilontask.eps0mat_fname,
+                epsmat_fname = self.epsilontask.epsmat_fname,
+                **kwargs)
+            self.sigmatasks = [self.sigmatask]
+        
+        self.add_tasks([self.epsilontask, self.sigmatask], merge=False)
+
     def make_dft_tasks_espresso(self, **kwargs):
         """
         Initialize all DFT tasks using Quantum Espresso.
@@ -200,14 +290,23 @@ class GWFlow(Workflow):
                 data_file_fname = self.scftask.data_file_fname,
                 spin_polarization_fname = self.scftask.spin_polarization_fname)
         
+        # With parabands, DFT only computes a few bands
+        # along with the potentials needed to generate the others.
+        if self.parabands:
+            nbnd = self.nbnd_dft
+            wfn_kwargs = dict(kwargs, vscg_flag=True, vkbg_flag=True)
+        else:
+            nbnd = self.nbnd
+            wfn_kwargs = kwargs
+
         # Wavefunction tasks for Epsilon
         self.wfntask_ksh = QeBgwFlow(
             dirname = pjoin(self.dirname, '02-wfn'),
             ngkpt = self.ngkpt,
             kshift = self.kshift,
-            nbnd = self.nbnd,
+            nbnd = nbnd,
             rhog_flag = True,
-            **kwargs)
+            **wfn_kwargs)
 
         self.wfntask_qsh = QeBgwFlow(
             dirname = pjoin(self.dirname, '03-wfnq'),
@@ -226,18 +325,25 @@ class GWFlow(Workflow):
             self.wfntask_ush = QeBgwFlow(
                 dirname = pjoin(self.dirname, '04-wfn_co'),
                 ngkpt = self.ngkpt,
-                nbnd = self.nbnd,
+                nbnd = nbnd,
                 rhog_flag = True,
-                **kwargs)
+                **wfn_kwargs)
 
             self.add_task(self.wfntask_ush)
 
         else:
             self.wfntask_ush = self.wfntask_ksh
 
-        fnames = dict(wfn_fname = self.wfntask_ksh.wfn_fname,
+        wfn_fname = self.wfntask_ksh.wfn_fname
+        wfn_co_fname = self.wfntask_ush.wfn_fname
+
+        # Empty bands for Epsilon and Sigma
+        if self.parabands:
+            wfn_fname, wfn_co_fname = self.make_parabands_tasks(**kwargs)
+
+        fnames = dict(wfn_fname = wfn_fname,
                       wfnq_fname = self.wfntask_qsh.wfn_fname,
-                      wfn_co_fname = self.wfntask_ush.wfn_fname,
+                      wfn_co_fname = wfn_co_fname,
                       rho_fname = self.wfntask_ush.rho_fname,
                       vxc_dat_fname = self.wfntask_ush.vxc_dat_fname)
 
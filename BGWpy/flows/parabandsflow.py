@@ -0,0 +1,75 @@
+"""Generation of the empty bands of a flow with parabands."""
+from __future__ import print_function
+
+from ..BGW import ParabandsTask
+
+__all__ = ['ParabandsMixin']
+
+
+class ParabandsMixin(object):
+    """
+    Empty bands generated with parabands from the wavefunctions
+    of the DFT calculations, for the flows that define the nbnd
+    and has_kshift attributes and the wfntask_ksh and wfntask_ush
+    wavefunction flows.
+    """
+
+    def init_parabands(self, kwargs):
+        """
+        Read the options of parabands from the keyword arguments
+        of the flow, removing the ones that are not used by the tasks.
+
+        Keyword arguments
+        -----------------
+
+        parabands : bool (False), optional
+            Compute only a few bands with DFT and generate the empty bands
+            with parabands before epsilon and sigma.
+            Only available with the espresso flavor.
+        nbnd_dft : int, optional
+            Number of bands computed by DFT when using parabands.
+            Defaults to ibnd_max, so that vxc.dat covers the GW bands.
+        parabands_extra_lines : list, optional
+            Any other lines that should appear in the parabands input file.
+        parabands_extra_variables : dict, optional
+            Any other variables that should be declared in the parabands input file.
+        """
+        self.parabands = kwargs.pop('parabands', False)
+        self.nbnd_dft = kwargs.pop('nbnd_dft', kwargs.get('ibnd_max'))
+        self.parabands_extra_lines = kwargs.pop('parabands_extra_lines', [])
+        self.parabands_extra_variables = kwargs.pop(
+            'parabands_extra_variables', {})
+
+    def make_parabands_task(self, wfntask, **kwargs):
+        """
+        Initialize a parabands task generating the empty bands
+        from the wavefunctions of a QeBgwFlow, in the same directory.
+        """
+        return ParabandsTask(
+            dirname = wfntask.dirname,
+            nbnd = self.nbnd,
+            wfn_fname = wfntask.wfn_fname,
+            vsc_fname = wfntask.vsc_fname,
+            vkb_fname = wfntask.vkb_fname,
+            extra_lines = self.parabands_extra_lines,
+            extra_variables = self.parabands_extra_variables,
+            **kwargs)
+
+    def make_parabands_tasks(self, **kwargs):
+        """
+        Add the parabands tasks of the shifted and unshifted wavefunctions.
+        Return the file names of these wavefunctions with the empty bands.
+        """
+        self.parabandstask_ksh = self.make_parabands_task(
+            self.wfntask_ksh, **kwargs)
+        self.add_task(self.parabandstask_ksh)
+
+        if self.has_kshift:
+            self.parabandstask_ush = self.make_parabands_task(
+                self.wfntask_ush, **kwargs)
+            self.add_task(self.parabandstask_ush)
+        else:
+            self.parabandstask_ush = self.parabandstask_ksh
+
+        return (self.parabandstask_ksh.wfn_out_fname,
+                self.parabandstask_ush.wfn_out_fname)
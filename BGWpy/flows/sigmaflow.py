@@ -0,0 +1,134 @@
+"""Workflow to compute the self-energy over shards of k-points."""
+from __future__ import print_function
+
+from os.path import join as pjoin
+
+import numpy as np
+
+from ..core import Workflow
+from ..BGW import KgridTask, SigmaTask, SigmaMergeTask
+
+__all__ = ['ShardedSigmaFlow']
+
+class ShardedSigmaFlow(Workflow):
+    """
+    Self-energy computed by several independent sigma runs,
+    each over a subset of the k-points, followed by the merge
+    of the eqp0.dat, eqp1.dat and sigma_hp.log files.
+
+    All runs share the same wavefunctions and dielectric matrix files.
+    The merged files are found in the main directory,
+    as for a single SigmaTask.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+        nshards : int
+            Number of sigma runs. The k-points are split
+            in contiguous subsets of nearly equal sizes.
+        shard_kwargs : list of dict, optional
+            Keyword arguments for the SigmaTask of each shard,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
+        merge_executable : str, optional
+            Command used to merge the sigma_hp.log files.
+            See SigmaMergeTask.
+
+        All other keyword arguments are passed to each SigmaTask.
+        See SigmaTask for the mandatory ones.
+
+        Properties
+        ----------
+
+        kpts : 2D list(nkpt,3), float
+            The k-points of all shards.
+        sigma_fname : str
+            Path to the merged sigma_hp.log file.
+        eqp0_fname : str
+            Path to the merged eqp0.dat file.
+        eqp1_fname : str
+            Path to the merged eqp1.dat file.
+
+        """
+        super(ShardedSigmaFlow, self).__init__(**kwargs)
+
+        kwargs.pop('dirname', None)
+
+        nshards = kwargs.pop('nshards')
+        shard_kwargs = kwargs.pop('shard_kwargs', None) or [{}] * nshards
+        if len(shard_kwargs) != nshards:
+            raise Exception('shard_kwargs must have one entry per shard.')
+
+        merge_kwargs = dict()
+        if 'merge_executable' in kwargs:
+            merge_kwargs['merge_executable'] = kwargs.pop('merge_executable')
+
+        kpts = self.get_kpoints(**kwargs)
+        for key in SigmaTask._kpt_aliases:
+            kwargs.pop(key, None)
+
+        shards = [indices for indices in
+                  np.array_split(np.arange(len(kpts)), nshards)
+                  if len(indices)]
+
+        self.sigmatasks = list()
+        for i, indices in enumerate(shards):
+            task_kwargs = dict(kwargs)
+            task_kwargs.update(shard_kwargs[i])
+            task_kwargs.update(kpts = [kpts[j] for j in indices])
+            task = SigmaTask(
+                dirname = pjoin(self.dirname, 'shard-{:02}'.format(i + 1)),
+                **task_kwargs)
+            self.sigmatasks.append(task)
+
+        self.mergetask = SigmaMergeTask(
+            dirname = self.dirname,
+            runscript_fname = 'merge.sh',
+            sigma_dirnames = [task.dirname for task in self.sigmatasks],
+            **merge_kwargs)
+
+        self.add_tasks(self.sigmatasks + [self.mergetask])
+
+    def get_kpoints(self, **kwargs):
+        """Return the k-points, as SigmaTask would compute them."""
+        for key in SigmaTask._kpt_aliases:
+            if key in kwargs:
+                return list(kwargs[key])
+
+        kgrid_kwargs = dict()
+        for key in ('structure', 'ngkpt', 'fft', 'use_tr', 'clean_after',
+                    'kgrid_backend'):
+            if key in kwargs:
+                kgrid_kwargs[key] = kwargs[key]
+        self.kgridtask = KgridTask(dirname=self.dirname, **kgrid_kwargs)
+
+        if kwargs.get('symkpt', True):
+            kpts, wtks = self.kgridtask.get_kpoints()
+        else:
+            kpts, wtks = self.kgridtask.get_kpt_grid_nosym()
+        return list(kpts)
+
+    @property
+    def kpts(self):
+        kpts = list()
+        for task in self.sigmatasks:
+            kpts.extend(task.input.kpts)
+        return kpts
+
+    @property
+    def sigma_fname(self):
+        return self.mergetask.sigma_fname
+
+    @property
+    def eqp0_fname(self):
+        return self.mergetask.eqp0_fname
+
+    @property
+    def eqp1_fname(self):
+        return self.mergetask.eqp1_fname
@@ -0,0 +1,150 @@
+"""Workflow to sweep the parameters of a flow."""
+from __future__ import print_function
+
+import os
+import hashlib
+import itertools
+from collections import OrderedDict
+from os.path import join as pjoin
+
+from ..core import Workflow, TaskGraph
+from .gwflow import GWFlow
+
+__all__ = ['SweepFlow']
+
+class SweepFlow(Workflow):
+    """
+    A flow for each point of the product of a set of parameters,
+    in which identical tasks are executed only once.
+
+    Two directories are identical if their tasks have the same fingerprints,
+    that is, the same class, the same rendered input and runscript,
+    and the same linked files, once the links to identical directories
+    have been redirected. The first of these directories is kept, and the
+    others are replaced by a symbolic link to it. Typically, the density
+    and wavefunctions of a sweep over the GW parameters are computed once.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+        parameters : OrderedDict
+            The values of each swept keyword argument of the flow,
+            e.g. OrderedDict(ecuteps=[5., 10.], nbnd=[50, 100]).
+        flow_class : class (GWFlow)
+            The flow created for each point of the sweep.
+
+        All other keyword arguments are passed to the flow of each point.
+
+        Properties
+        ----------
+
+        points : list of dict
+            The swept keyword arguments of each point.
+        flows : list of Workflow
+            The flow of each point, in the order of points.
+        duplicates : dict
+            The directories of the duplicate tasks,
+            and the directory of the tasks that replace them.
+
+        """
+        super(SweepFlow, self).__init__(**kwargs)
+
+        kwargs.pop('dirname', None)
+
+        parameters = OrderedDict(kwargs.pop('parameters'))
+        flow_class = kwargs.pop('flow_class', GWFlow)
+
+        self.points = list()
+        self.flows = list()
+        for values in itertools.product(*parameters.values()):
+            point = OrderedDict(zip(parameters.keys(), values))
+            flow_kwargs = dict(kwargs)
+            flow_kwargs.update(point)
+            flow = flow_class(
+                dirname = pjoin(self.dirname, self.get_point_dirname(point)),
+                **flow_kwargs)
+            self.points.append(point)
+            self.flows.append(flow)
+
+        self.duplicates = OrderedDict()
+        tasks = self.merge_duplicates(TaskGraph(self.flows).tasks)
+        self.add_tasks(tasks)
+
+    @staticmethod
+    def get_point_dirname(point):
+        """Return the directory name of a point of the sweep."""
+        return '_'.join('{}-{}'.format(key, str(value).replace(' ', ''))
+                        for key, value in point.items())
+
+    def merge_duplicates(self, tasks):
+        """
+        Redirect the links to identical directories,
+        and return the tasks that must be executed.
+        """
+        groups = OrderedDict()
+        for task in tasks:
+            dirname = os.path.realpath(task.dirname)
+            groups.setdefault(dirname, list()).append(task)
+
+        unique = list()
+        first = dict()
+        for dirname, group in groups.items():
+
+            sha = hashlib.sha1()
+            for task in group:
+                self._redirect_links(task)
+                sha.update(task.get_fingerprint(check_files=False).encode())
+            fingerprint = sha.hexdigest()
+
+            if fingerprint in first:
+                self.duplicates[dirname] = first[fingerprint]
+            else:
+                first[fingerprint] = dirname
+                unique.extend(group)
+
+        return unique
+
+    def _redirect_links(self, task):
+        """Redirect the links of a task to the identical directories."""
+        for fname, dest in task.get_linked_files():
+            replacement = self._get_replacement(fname)
+            if replacement is None:
+                continue
+            if any(link[1] == dest for link in task.runscript.links):
+                task.update_link(replacement, dest)
+            else:
+                task.update_copy(replacement, dest)
+
+    def _get_replacement(self, fname):
+        """
+        Return the path of a file within the deepest duplicate directory,
+        relative to the directory that replaces it, or None.
+        """
+        for dirname in sorted(self.duplicates, key=len, reverse=True):
+            if fname.startswith(dirname.rstrip(os.path.sep) + os.path.sep):
+                return os.path.join(self.duplicates[dirname],
+                                    os.path.relpath(fname, dirname))
+        return None
+
+    def write(self):
+        super(SweepFlow, self).write()
+
+        # The duplicate directories point to the tasks that replace them,
+        # unless they contain the directory of another task.
+        dirnames = [os.path.realpath(task.dirname) for task in self.tasks]
+        for dirname, target in self.duplicates.items():
+            if os.path.lexists(dirname):
+                continue
+            if any(d.startswith(dirname + os.path.sep) for d in dirnames):
+                continue
+            parent = os.path.dirname(dirname)
+            if not os.path.exists(parent):
+                os.makedirs(parent)
+            os.symlink(os.path.relpath(target, parent), dirname)
@@ -6,11 +6,12 @@ from ..config import flavors
 from ..config import is_dft_flavor_espresso, is_dft_flavor_abinit, check_dft_flavor
 from ..external import Structure
 from ..core import Workflow
+from .wfnflow import ChunkedWfnMixin
 from ..BGW import VmtxelTask
 
 __all__ = ['VmtxelFlow']
 
-class VmtxelFlow(Workflow):
+class VmtxelFlow(ChunkedWfnMixin, Workflow):
 
     def __init__(self, **kwargs):
 
@@ -43,6 +44,8 @@ class VmtxelFlow(Workflow):
                           "This is usually a waste and you might want to choose 'nbnd_fine' according to\n" +
                           "   nbnd_fine = nbnd_occupied + nbnd_cond_fi + 1.")
         self.nbnd_fine = kwargs.pop('nbnd_fine', self.nbnd)
+
+        self.init_wfn_fi_chunks(kwargs)
     
         # ==== DFT calculations ==== #
     
@@ -89,7 +92,8 @@ class VmtxelFlow(Workflow):
 
 
         # Wavefunctions on fine k-point grids
-        self.wfntask_fi_ush = AbinitBgwFlow(
+        self.wfntask_fi_ush = self.make_wfn_fi_task(
+            AbinitBgwFlow,
             dirname = pjoin(self.dirname, '05-wfn_fi'),
             nband = self.nbnd_fine,
             ngkpt = self.ngkpt_fi,
@@ -98,7 +102,8 @@ class VmtxelFlow(Workflow):
             symkpt = False,
             **kwargs)
         
-        self.wfntask_fi_qsh = AbinitBgwFlow(
+        self.wfntask_fi_qsh = self.make_wfn_fi_task(
+            AbinitBgwFlow,
             dirname = pjoin(self.dirname, '06-wfnq_fi'),
             nband = None,
             ngkpt = self.ngkpt_fi,
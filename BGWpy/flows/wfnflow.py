@@ -0,0 +1,153 @@
+"""Workflow to compute wavefunctions over chunks of k-points."""
+from __future__ import print_function
+
+import os
+from os.path import join as pjoin
+
+import numpy as np
+
+from ..config import flavors
+from ..config import is_dft_flavor_espresso, is_dft_flavor_abinit, check_dft_flavor
+from ..core import Workflow
+from ..BGW import KgridTask, WfnMergeTask
+
+__all__ = ['ChunkedWfnFlow', 'ChunkedWfnMixin']
+
+class ChunkedWfnFlow(Workflow):
+    """
+    Wavefunctions computed by several independent DFT calculations,
+    each over a contiguous chunk of the k-points, and converted to BGW.
+    The wavefunction files of the chunks are then merged with wfnmerge.x.
+
+    The merged file is found in the main directory, with the same name
+    as the wavefunction file of a single QeBgwFlow or AbinitBgwFlow.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Keyword arguments
+        -----------------
+        (All mandatory unless specified otherwise)
+
+        dirname : str
+            Directory in which the files are written and the code is executed.
+            Will be created if needed.
+        nchunks : int
+            Number of DFT calculations. The k-points are split
+            in contiguous chunks of nearly equal sizes.
+        dft_flavor : 'espresso' | 'abinit'
+            Choice of DFT code for the wavefunctions calculations.
+        chunk_kwargs : list of dict, optional
+            Keyword arguments for the calculation of each chunk,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
+
+        All other keyword arguments are passed to the QeBgwFlow
+        or AbinitBgwFlow of each chunk.
+
+        Properties
+        ----------
+
+        wfn_fname : str
+            Path to the merged wavefunction file.
+
+        """
+        super(ChunkedWfnFlow, self).__init__(**kwargs)
+
+        kwargs.pop('dirname', None)
+
+        nchunks = kwargs.pop('nchunks')
+        chunk_kwargs = kwargs.pop('chunk_kwargs', None) or [{}] * nchunks
+        if len(chunk_kwargs) != nchunks:
+            raise Exception('chunk_kwargs must have one entry per chunk.')
+
+        self.dft_flavor = check_dft_flavor(
+            kwargs.get('dft_flavor', flavors['dft_flavor']))
+        if is_dft_flavor_espresso(self.dft_flavor):
+            from ..QE import QeBgwFlow as WfnFlow
+        elif is_dft_flavor_abinit(self.dft_flavor):
+            from ..Abinit import AbinitBgwFlow as WfnFlow
+
+        kpts, wtks = self.get_kpoints(**kwargs)
+
+        chunks = [indices for indices in
+                  np.array_split(np.arange(len(kpts)), nchunks)
+                  if len(indices)]
+
+        self.wfntasks = list()
+        for i, indices in enumerate(chunks):
+            task_kwargs = dict(kwargs)
+            task_kwargs.update(chunk_kwargs[i])
+            task_kwargs.update(
+                kpt_range = (int(indices[0]), int(indices[-1]) + 1))
+            task = WfnFlow(
+                dirname = pjoin(self.dirname, 'chunk-{:02}'.format(i + 1)),
+                **task_kwargs)
+            self.wfntasks.append(task)
+
+        self.mergetask = WfnMergeTask(
+            dirname = self.dirname,
+            runscript_fname = 'merge.sh',
+            wfn_fnames = [task.wfn_fname for task in self.wfntasks],
+            wfn_basename = os.path.basename(self.wfntasks[0].wfn_fname),
+            kpts = kpts,
+            wtks = wtks,
+            )
+
+        self.add_tasks(self.wfntasks + [self.mergetask])
+
+    def get_kpoints(self, **kwargs):
+        """Return the k-points and weights of all chunks."""
+        if 'ngkpt' not in kwargs:
+            kpts, wtks = kwargs['kpts'], kwargs['wtks']
+        elif kwargs.get('symkpt', True):
+            kpts, wtks = KgridTask(dirname=self.dirname, **kwargs).get_kpoints()
+        else:
+            kpts, wtks = KgridTask(dirname=self.dirname, **kwargs
+                                   ).get_kpt_grid_nosym()
+        wtks = np.array(wtks, dtype=float)
+        return kpts, wtks / wtks.sum()
+
+    @property
+    def wfn_fname(self):
+        return self.mergetask.wfn_fname
+
+
+class ChunkedWfnMixin(object):
+    """
+    Wavefunctions on the fine k-point grids, optionally computed
+    by chunks of k-points with a ChunkedWfnFlow, for the flows
+    that define the dft_flavor attribute.
+    """
+
+    def init_wfn_fi_chunks(self, kwargs):
+        """
+        Read the options of the chunks from the keyword arguments
+        of the flow, removing them from the keyword arguments.
+
+        Keyword arguments
+        -----------------
+
+        wfn_fi_chunks : int, optional
+            Split the k-points of the fine grids over this number of
+            independent wavefunctions calculations, merged with wfnmerge.x.
+            See ChunkedWfnFlow.
+        wfn_fi_chunk_kwargs : list of dict, optional
+            Keyword arguments for the calculation of each chunk,
+            e.g. to specify its own MPI layout (nproc, nodes, ...).
+        """
+        self.wfn_fi_chunks = kwargs.pop('wfn_fi_chunks', None)
+        self.wfn_fi_chunk_kwargs = kwargs.pop('wfn_fi_chunk_kwargs', None)
+
+    def make_wfn_fi_task(self, WfnFlow, **kwargs):
+        """
+        Initialize a wavefunctions task on a fine k-point grid,
+        computed by chunks of k-points if wfn_fi_chunks is set.
+        """
+        if not self.wfn_fi_chunks:
+            return WfnFlow(**kwargs)
+
+        kwargs['dft_flavor'] = self.dft_flavor
+        return ChunkedWfnFlow(
+            nchunks = self.wfn_fi_chunks,
+            chunk_kwargs = self.wfn_fi_chunk_kwargs,
+            **kwargs)
@@ -19,8 +19,15 @@ def get_config():
         nproc_per_node_flag = '--npernode',
         nodes = '',
         nodes_flag = '',
+        nthreads = '',
         )
     
+    config['kgrid'] = dict(
+        use_cache = True,
+        cache_dir = '~/.cache/BGWpy/kgrid',
+        backend = 'kgrid.x',
+        )
+
     config['runscript'] = dict(
         first_line = '#!/bin/sh',
         header = """
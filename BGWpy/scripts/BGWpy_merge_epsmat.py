@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""
+Merge epsmat.h5 files computed for different q-points
+into a single epsmat.h5 file.
+The q-points are ordered as the input files.
+"""
+
+def main():
+    import argparse
+    from BGWpy.extractors.epsmat import merge_epsmat_files
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('fnames', nargs='+',
+                        help='epsmat.h5 files to merge')
+    parser.add_argument('-o', dest='output', default='epsmat.h5',
+                        help='Merged file (default: epsmat.h5)')
+    parser.add_argument('--completed-only', action='store_true',
+                        help='Only keep the q-points flagged as done')
+    args = parser.parse_args()
+
+    merge_epsmat_files(args.fnames, args.output,
+                       completed_only=args.completed_only)
+
+if __name__ == '__main__':
+    main()
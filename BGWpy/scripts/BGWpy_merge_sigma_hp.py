@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""
+Merge sigma_hp.log files computed for different k-points
+into a single sigma_hp.log file.
+The k-points are ordered as the input files.
+"""
+
+def main():
+    import argparse
+    from BGWpy.extractors.gw import merge_sigma_hp_files
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('fnames', nargs='+',
+                        help='sigma_hp.log files to merge')
+    parser.add_argument('-o', dest='output', default='sigma_hp.log',
+                        help='Merged file (default: sigma_hp.log)')
+    args = parser.parse_args()
+
+    merge_sigma_hp_files(args.fnames, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""
+Execute a command and append a record of its wall time, exit code
+and peak memory to a json file. Exit with the exit code of the command.
+"""
+
+def main():
+    import sys
+    import argparse
+    from BGWpy.core.timing import time_command
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-o', dest='output', default='timing.json',
+                        help='Json file of the records (default: timing.json)')
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help='Command to execute')
+    args = parser.parse_args()
+
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        parser.error('No command given.')
+
+    sys.exit(time_command(command, args.output))
+
+if __name__ == '__main__':
+    main()
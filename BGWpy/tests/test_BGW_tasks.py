@@ -2,13 +2,16 @@ from __future__ import print_function
 import os
 from copy import copy
 
+import numpy as np
+
 from . import TestTask
 from .test_QE_tasks import TestQETasksMaker
 
 from .. import data
 from .. import Structure, QeScfTask
 from .. import EpsilonTask, SigmaTask
-from .. import KernelTask, AbsorptionTask
+from .. import KernelTask, AbsorptionTask, ParabandsTask, Qe2BgwTask
+from ..extractors.epsmat import merge_epsmat_files
 
 # Note: The tests are redundant,
 # because tests cannot be interdependent.
@@ -294,3 +297,147 @@ class TestBGWTasks(TestBGWTasksMaker):
             task.report()
             self.assertCompleted(task)
 
+
+class TestParabands(TestBGWTasksMaker):
+
+    def test_parabands(self):
+        """Test the input and links of parabands."""
+        kwargs = copy(self.common_kwargs)
+        kwargs.update(nbnd=8, vscg_flag=True, vkbg_flag=True)
+        pw2bgwtask = Qe2BgwTask(
+            dirname = os.path.join(self.tmpdir, 'Wfn'),
+            **kwargs)
+
+        self.assertEqual(pw2bgwtask.input['vscg_file'], 'VSC')
+        self.assertEqual(pw2bgwtask.input['vkbg_file'], 'VKB')
+
+        task = ParabandsTask(
+            dirname = os.path.join(self.tmpdir, 'Parabands'),
+            nbnd = 100,
+            wfn_fname = pw2bgwtask.wfn_fname,
+            vsc_fname = pw2bgwtask.vsc_fname,
+            vkb_fname = pw2bgwtask.vkb_fname,
+            )
+
+        self.assertEqual(task.input['number_bands'], 100)
+        for dest in ('WFN_in', 'VSC', 'VKB'):
+            self.assertIn(dest, [link[1] for link in task.runscript.links])
+        self.assertEqual(task.wfn_out_fname,
+                         os.path.join(self.tmpdir, 'Parabands', 'WFN_out'))
+
+        task.write()
+        self.assertTrue(os.path.exists(
+            os.path.join(task.dirname, 'parabands.inp')))
+
+
+class TestRestart(TestBGWTasksMaker):
+    """Test the restart of unfinished epsilon and sigma runs."""
+
+    qpts = [[.0,.0,.5], [.0,.5,.5], [.5,.5,.5]]
+    qshift = [.001,.0,.0]
+    kpts = [[.0,.0,.0], [.0,.0,.5], [.0,.5,.5]]
+
+    def get_epsilontask(self):
+        kwargs = copy(self.common_kwargs)
+        kwargs.update(qpts=self.qpts, qshift=self.qshift, restart=True,
+                      wfn_fname='WFN', wfnq_fname='WFNq')
+        return EpsilonTask(dirname=os.path.join(self.tmpdir, 'Epsilon'),
+                           **kwargs)
+
+    def get_sigmatask(self):
+        kwargs = copy(self.common_kwargs)
+        kwargs.update(kpts=self.kpts, ibnd_min=1, ibnd_max=2, restart=True,
+                      wfn_co_fname='WFN', rho_fname='RHO',
+                      vxc_dat_fname='vxc.dat')
+        return SigmaTask(dirname=os.path.join(self.tmpdir, 'Sigma'), **kwargs)
+
+    def write_epsmat(self, fname, qpts, qpt_done):
+        import h5py
+        nq = len(qpts)
+        with h5py.File(fname, 'w') as h5:
+            h5['eps_header/flavor'] = 2
+            h5['eps_header/params/nmatrix'] = 1
+            h5['eps_header/qpoints/nq'] = nq
+            h5['eps_header/qpoints/qpts'] = qpts
+            h5['eps_header/qpoints/qpt_done'] = qpt_done
+            h5['eps_header/qpoints/qgrid'] = [2,2,2]
+            h5['eps_header/freqs/nfreq'] = 1
+            h5['eps_header/gspace/nmtx'] = [2] * nq
+            h5['eps_header/gspace/nmtx_max'] = 2
+            h5['mf_header/gspace/ng'] = 10
+            h5['mats/matrix'] = np.ones((nq, 1, 1, 2, 2, 2))
+
+    def write(self, fname, content):
+        with open(fname, 'w') as f:
+            f.write(content)
+
+    def test_epsilon(self):
+        """Test the q-points of an epsilon restart."""
+        task = self.get_epsilontask()
+        task.write()
+        self.assertEqual(len(task.input.qpts), 3)
+
+        # Unfinished run, with qshift and the first q-point completed.
+        self.write_epsmat(task.eps0mat_fname, [self.qshift], [1])
+        self.write_epsmat(task.epsmat_fname, self.qpts, [1, 0, 0])
+        self.write(task.output_fname, 'Unfinished\n')
+
+        task = self.get_epsilontask()
+        self.assertEqual(len(task.get_completed_qpoints()), 2)
+        for i in range(2):
+            task.write()
+        self.assertIsNone(task.input.q0)
+        self.assertTrue(np.allclose(task.input.qpts, self.qpts[1:]))
+        self.assertEqual(len(task.get_restart_dirnames()), 1)
+        restart_fname = os.path.join(task.dirname, 'restart_01', 'epsmat.h5')
+        self.assertTrue(os.path.exists(restart_fname))
+        self.assertFalse(os.path.exists(task.epsmat_fname))
+
+        merge_lines = [line for line in task.runscript.main
+                       if '$EPSMAT_MERGE' in line]
+        self.assertEqual(len(merge_lines), 1)
+        self.assertIn('restart_01/epsmat.h5 epsmat.h5', merge_lines[0])
+
+        # Merge of the completed q-points with those of the new run.
+        self.write_epsmat(task.epsmat_fname, self.qpts[1:], [1, 1])
+        merge_epsmat_files([restart_fname, task.epsmat_fname],
+                           task.epsmat_fname, completed_only=True)
+        with task.get_epsmat() as epsmat:
+            self.assertTrue(np.allclose(epsmat.qpts, self.qpts))
+            self.assertTrue(np.all(epsmat.qpt_done))
+
+    def test_sigma(self):
+        """Test the k-points of a sigma restart."""
+        header = ' sigma.cplx.x\n\n'
+        block = ('       k = {:9.6f} {:9.6f} {:9.6f} ik ={:4} spin = 1\n'
+                 '\n'
+                 '   n      Emf       Eo     Eqp0     Eqp1\n'
+                 '   1   -7.528   -7.528   -7.600   -7.610\n'
+                 '   2    1.250    1.250    1.400    1.410\n'
+                 '\n')
+
+        task = self.get_sigmatask()
+        task.write()
+
+        # Unfinished run, with the second k-point interrupted.
+        self.write(task.sigma_fname, header
+                   + block.format(*(self.kpts[0] + [1]))
+                   + block.format(*(self.kpts[1] + [2])).split('   2    1.250')[0])
+        self.write(task.output_fname, 'Unfinished\n')
+
+        task = self.get_sigmatask()
+        self.assertEqual(len(task.get_completed_kpoints()), 1)
+        task.write()
+        self.assertTrue(np.allclose(task.input.kpts, self.kpts[1:]))
+
+        dirname = os.path.join(task.dirname, 'restart_01')
+        with open(os.path.join(dirname, 'sigma_hp.log'), 'r') as f:
+            self.assertEqual(f.read(),
+                             header + block.format(*(self.kpts[0] + [1])))
+        with open(os.path.join(dirname, 'eqp1.dat'), 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0].split()[-1], '2')
+        self.assertTrue(np.isclose(float(lines[2].split()[-1]), 1.41))
+        self.assertTrue(os.path.exists(os.path.join(dirname, 'sigma.out')))
+        self.assertIn('fi', task.runscript.main)
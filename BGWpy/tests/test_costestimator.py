@@ -0,0 +1,149 @@
+from __future__ import print_function
+import os
+import warnings
+
+import numpy as np
+
+from . import TestTask
+from .test_BGW_tasks import TestBGWTasksMaker
+
+from .. import data
+from .. import Structure, GWFlow, CostEstimator
+from ..BGW.costestimator import get_number_of_gvectors
+from ..BGW.costestimator import get_number_of_valence_electrons
+
+
+class TestCostEstimator(TestTask):
+    """Test the cost estimates of the BerkeleyGW calculations."""
+
+    structure = TestBGWTasksMaker.common_kwargs['structure']
+
+    def get_estimator(self, **kwargs):
+        return CostEstimator(self.structure, 8.0, **kwargs)
+
+    def get_flow(self, **kwargs):
+        dft_dirname = os.path.join(self.tmpdir, 'DFT')
+        kwargs.setdefault('pseudo_dir', data.pseudo_dir)
+        kwargs.setdefault('pseudos', data.pseudos_GaAs)
+        return GWFlow(
+            dirname = os.path.join(self.tmpdir, 'GW'),
+            structure = self.structure,
+            dft_flavor = 'abinit',
+            ngkpt = [2,2,2],
+            qshift = [.001,.0,.0],
+            ecutwfc = 8.0,
+            ecuteps = 5.0,
+            nbnd = 20,
+            ibnd_min = 1,
+            ibnd_max = 8,
+            kgrid_backend = 'numpy',
+            charge_density_fname = os.path.join(dft_dirname, 'out_DEN'),
+            vxc_fname = os.path.join(dft_dirname, 'vxc.real'),
+            wfn_fname = os.path.join(dft_dirname, 'wfn.cplx'),
+            wfnq_fname = os.path.join(dft_dirname, 'wfnq.cplx'),
+            wfn_co_fname = os.path.join(dft_dirname, 'wfn_co.cplx'),
+            rho_fname = os.path.join(dft_dirname, 'rho.real'),
+            **kwargs)
+
+    def test_gvectors(self):
+        """Test the number of G-vectors within a cutoff."""
+        # Sphere of radius 2 in a cell of reciprocal volume 1.
+        volume = (2 * np.pi) ** 3
+        self.assertEqual(get_number_of_gvectors(volume, 4.),
+                         round(4. / 3. * np.pi * 8))
+
+        estimator = self.get_estimator()
+        self.assertTrue(np.isclose(estimator.get_ngvectors(4 * 8.0),
+                                   8 * estimator.ng_wfn, rtol=1e-2))
+
+    def test_valence_electrons(self):
+        """Test the number of occupied bands read from the pseudopotentials."""
+        self.assertEqual(get_number_of_valence_electrons(
+            self.structure, data.pseudos_GaAs, data.pseudo_dir), 8.)
+        structure = Structure.from_file(data.structure_Si)
+        for pseudos in (data.pseudos_Si, 'Si.UPF'):
+            self.assertEqual(get_number_of_valence_electrons(
+                structure, pseudos, data.pseudo_dir), 8.)
+
+        self.assertEqual(self.get_flow().nbnd_occ, 4)
+        self.assertEqual(self.get_flow(nbnd_occ=6).nbnd_occ, 6)
+
+        # A missing pseudopotential gives a warning.
+        pseudos = ['missing.UPF', 'missing.UPF']
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertIsNone(self.get_flow(pseudos=pseudos).nbnd_occ)
+        self.assertTrue(any('missing.UPF' in str(w.message) for w in caught))
+
+        # The occupied bands are then required to check the cost.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with self.assertRaisesRegex(Exception, 'nbnd_occ is required'):
+                self.get_flow(pseudos=pseudos, max_memory=1.)
+
+    def test_scaling(self):
+        """Test the scaling of the estimates with the number of q-points."""
+        estimator = self.get_estimator()
+        kwargs = dict(ecuteps=5.0, nbnd=20, nkpt=8, nproc=4)
+        one = estimator.estimate('epsilon', nq=1, **kwargs)
+        two = estimator.estimate('epsilon', nq=2, **kwargs)
+        self.assertTrue(np.isclose(two['flops'], 2 * one['flops']))
+        self.assertTrue(np.isclose(two['disk'], 2 * one['disk']))
+        self.assertEqual(two['memory'], one['memory'])
+        self.assertTrue(np.isclose(
+            one['walltime'], one['flops'] / (4 * 1e9)))
+
+        kernel = estimator.estimate_kernel(5.0, 8, 4, 4)
+        self.assertTrue(np.isclose(kernel['disk'], 4 * 64 * 16 ** 2 * 16))
+
+    def test_calibrate(self):
+        """Test that the calibrated estimates match the measured ones."""
+        estimator = self.get_estimator()
+        kwargs = dict(ecuteps=5.0, nbnd=20, nbnd_sigma=8, nkpt_sigma=3,
+                      nq=8, nproc=2)
+        prefactors = estimator.calibrate('sigma', walltime=100.,
+                                         memory=2e9, **kwargs)
+        self.assertEqual(set(prefactors), {'sigma_flops', 'sigma_memory'})
+        estimate = estimator.estimate_sigma(**kwargs)
+        self.assertTrue(np.isclose(estimate['walltime'], 100.))
+        self.assertTrue(np.isclose(estimate['memory'], 2e9))
+
+        # The calibrated constants can be reused.
+        other = self.get_estimator(constants=estimator.constants)
+        self.assertTrue(np.isclose(other.estimate_sigma(**kwargs)['walltime'],
+                                   100.))
+
+        with self.assertRaises(Exception):
+            estimator.estimate('parabands')
+
+    def test_flow(self):
+        """Test the estimates of the tasks of a flow and the warnings."""
+        flow = self.get_flow()
+        estimates = flow.estimate_cost()
+        self.assertEqual(list(estimates), ['11-epsilon', '12-sigma'])
+
+        estimator = self.get_estimator()
+        nq = len(flow.epsilontask.input.qpts) + 1
+        expected = estimator.estimate_epsilon(5.0, 20, nq, 8, nbnd_occ=4)
+        self.assertTrue(np.isclose(estimates['11-epsilon']['flops'],
+                                   expected['flops']))
+
+        table = CostEstimator.format_estimates(estimates)
+        self.assertEqual(len(table.splitlines()), 3)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.get_flow(max_memory=1.)
+        messages = [str(w.message) for w in caught]
+        self.assertTrue(any(m.startswith('11-epsilon: estimated memory')
+                            for m in messages))
+        self.assertTrue(any(m.startswith('12-sigma: estimated memory')
+                            for m in messages))
+
+    def test_sharded_flow(self):
+        """Test that the tasks of the shards are estimated."""
+        flow = self.get_flow(epsilon_shards=2, sigma_shards=2)
+        estimates = flow.estimate_cost()
+        self.assertEqual(list(estimates), [
+            '11-epsilon/shard-01', '11-epsilon/shard-02',
+            '12-sigma/shard-01', '12-sigma/shard-02'])
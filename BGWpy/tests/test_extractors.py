@@ -0,0 +1,681 @@
+from __future__ import print_function
+import os
+import io
+import gzip
+import pickle
+
+import unittest
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from . import TestTask
+from ..extractors import parse_sigma_output, extract_multiple_GW_results
+from ..extractors import merge_sigma_hp_files
+from ..extractors import gw
+from ..extractors import extract_inteqp_bandstructure, extract_inteqp_eqp
+
+
+# Truncated output of sigma.x with two k-points and two spins.
+sigma_output = """\
+================================================================================
+ 14:20:02   Dealing with k =  0.000000  0.000000  0.000000                 1 / 2
+================================================================================
+
+ Unsymmetrized values for ik =   1 spin = 1
+
+     n      Emf       Eo      Vxc        X     SX-X       CH      Cor      Sig
+     1   -7.528   -7.528  -10.743  -17.398   11.023   -5.277    5.746  -11.652
+     2    5.552    5.552  -11.271  -14.017    8.528   -5.046    3.481  -10.535
+
+ Symmetrized values from band-averaging:
+
+       k =  0.000000  0.000000  0.000000 ik =   1 spin = 1
+
+     n      Emf       Eo      Vxc        X      Cor     Eqp0     Eqp1      Znk
+     1   -7.528   -7.528  -10.743  -17.398    5.746   -8.438   -8.227    0.768
+     2    5.552    5.552  -11.271  -13.770    3.408    6.461    6.309    0.833
+
+       k =  0.000000  0.000000  0.000000 ik =   1 spin = 2
+
+     n      Emf       Eo      Vxc        X      Cor     Eqp0     Eqp1      Znk
+     1   -7.428   -7.428  -10.643  -17.298    5.646   -8.338   -8.127    0.767
+     2    5.652    5.652  -11.171  -13.670    3.308    6.561    6.409    0.832
+
+================================================================================
+ 14:20:04   Dealing with k =  0.000000  0.000000  0.500000                 2 / 2
+================================================================================
+
+ Symmetrized values from band-averaging:
+
+       k =  0.000000  0.000000  0.500000 ik =   2 spin = 1
+
+     n      Emf       Eo      Vxc        X      Cor     Eqp0     Eqp1      Znk
+     1   -5.638   -5.638  -10.481  -16.562    4.883   -6.836   -6.644    0.803
+     2    2.009    2.009  -11.019  -14.282    4.166    2.912    2.743    0.813
+
+       k =  0.000000  0.000000  0.500000 ik =   2 spin = 2
+
+     n      Emf       Eo      Vxc        X      Cor     Eqp0     Eqp1      Znk
+     1   -5.538   -5.538  -10.381  -16.462    4.783   -6.736   -6.544    0.802
+     2    2.109    2.109  -10.919  -14.182    4.066    3.012    2.843    0.812
+
+================================================================================
+
+    n = band index.
+"""
+
+
+class TestSigmaOutput(TestTask):
+    """Test the parser of sigma.out."""
+
+    def check_results(self, results):
+        self.assertEqual(results['nspin'], 2)
+        self.assertEqual(results['nkpt'], 2)
+        self.assertEqual(results['nband'], 2)
+        self.assertTrue(np.all(results['n'] == [1, 2]))
+        self.assertTrue(np.allclose(results['kpt'], [[0.,0.,0.], [0.,0.,.5]]))
+        self.assertEqual(results['Eqp1'].shape, (2, 2, 2))
+        self.assertTrue(np.allclose(results['Eqp1'][:,:,0],
+                                    [[-8.227, -6.644], [-8.127, -6.544]]))
+        self.assertTrue(np.allclose(results['Znk'][1,1], [0.802, 0.812]))
+        self.assertTrue(np.allclose(results['Emf'][0,1], [-5.638, 2.009]))
+
+    def test_parse_file(self):
+        """Test parsing a file by name."""
+        fname = os.path.join(self.tmpdir, 'sigma.out')
+        with open(fname, 'w') as f:
+            f.write(sigma_output)
+        self.check_results(parse_sigma_output(fname))
+
+    def test_parse_compressed(self):
+        """Test parsing a compressed file and a binary file object."""
+        fname = os.path.join(self.tmpdir, 'sigma.out.gz')
+        with gzip.open(fname, 'wt') as f:
+            f.write(sigma_output)
+        self.check_results(parse_sigma_output(fname))
+
+        f = io.BytesIO(sigma_output.encode('utf-8'))
+        self.check_results(parse_sigma_output(f))
+
+    def test_incomplete_block(self):
+        """Test that a k-point without symmetrized values is an error."""
+        content = sigma_output.split(' Symmetrized values')[0]
+        with self.assertRaises(Exception):
+            parse_sigma_output(io.StringIO(content))
+
+
+class TestMergeSigma(TestTask):
+    """Test the merge of sigma_hp.log files."""
+
+    header = ' sigma.cplx.x\n\n'
+    block = ('       k =  0.000000  0.000000  {:8.6f} ik ={:4} spin = 1\n'
+             '\n'
+             '   n      Emf       Eo\n'
+             '   1   -7.528   -7.528\n'
+             '\n')
+
+    def write_sigma_hp(self, basename, kz):
+        fname = os.path.join(self.tmpdir, basename)
+        with open(fname, 'w') as f:
+            f.write(self.header)
+            for ik, k in enumerate(kz):
+                f.write(self.block.format(k, ik + 1))
+        return fname
+
+    def test_merge(self):
+        """Test the k-point indices of the merged file."""
+        fnames = [self.write_sigma_hp('sigma_hp_001.log', [0., .25]),
+                  self.write_sigma_hp('sigma_hp_002.log', [.5])]
+        fname = os.path.join(self.tmpdir, 'sigma_hp.log')
+        merge_sigma_hp_files(fnames, fname)
+
+        expected = self.header + ''.join(
+            self.block.format(k, ik + 1) for ik, k in enumerate([0.,.25,.5]))
+        with open(fname, 'r') as f:
+            self.assertEqual(f.read(), expected)
+
+
+class TestMultipleGWResults(TestTask):
+    """Test the extraction of GW results from several directories."""
+
+    def write_run(self, i, content=sigma_output):
+        dirname = os.path.join(self.tmpdir, 'run{}'.format(i))
+        if not os.path.exists(dirname):
+            os.mkdir(dirname)
+        with open(os.path.join(dirname, 'variables.pkl'), 'wb') as f:
+            pickle.dump(dict(ecuteps=float(i)), f)
+        with open(os.path.join(dirname, 'sigma.out'), 'w') as f:
+            f.write(content)
+        return dirname
+
+    def test_parallel_extraction(self):
+        """Test the stacked arrays of results parsed in parallel."""
+        dirnames = [self.write_run(i) for i in range(3)]
+        data = extract_multiple_GW_results(dirnames, nproc=2, use_cache=False)
+        self.assertEqual(data['ndata'], 3)
+        self.assertEqual([v['ecuteps'] for v in data['variables']],
+                         [0., 1., 2.])
+        self.assertEqual(data['arrays']['Eqp1'].shape, (3, 2, 2, 2))
+        self.assertTrue(np.all(data['arrays']['nkpt'] == 2))
+
+    def test_incremental_extraction(self):
+        """Test that only the modified directories are parsed again."""
+        dirnames = [self.write_run(i) for i in range(3)]
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        extract_multiple_GW_results(dirnames, nproc=1, cache_dir=cache_dir)
+
+        # Change a value in one of the runs
+        self.write_run(1, sigma_output.replace('0.768', '0.700'))
+        gw._GW_results_cache.clear()
+
+        parsed = list()
+        extract_GW_results = gw.extract_GW_results
+        def extract_and_record(dirname):
+            parsed.append(dirname)
+            return extract_GW_results(dirname)
+
+        gw.extract_GW_results = extract_and_record
+        try:
+            data = extract_multiple_GW_results(dirnames, nproc=1,
+                                               cache_dir=cache_dir)
+        finally:
+            gw.extract_GW_results = extract_GW_results
+
+        self.assertEqual(parsed, [dirnames[1]])
+        self.assertTrue(np.allclose(data['arrays']['Znk'][:,0,0,0],
+                                    [.768, .700, .768]))
+
+    def test_stack_different_shapes(self):
+        """Test padding of results with different numbers of k-points."""
+        one_kpt = sigma_output.split('=' * 80 + '\n 14:20:04')[0]
+        dirnames = [self.write_run(0), self.write_run(1, one_kpt)]
+        data = extract_multiple_GW_results(dirnames, nproc=1, use_cache=False)
+        self.assertEqual(data['arrays']['Eqp0'].shape, (2, 2, 2, 2))
+        self.assertTrue(np.all(np.isnan(data['arrays']['Eqp0'][1,:,1])))
+        self.assertTrue(np.all(data['arrays']['nkpt'] == [2, 1]))
+
+
+class TestInteqp(TestTask):
+    """Test the readers of inteqp.x outputs."""
+
+    nspin, nkpt, ib_min, nband = 2, 5, 3, 4
+
+    def get_energies(self):
+        """DFT energies as a function of spin, k-point and band."""
+        spin = np.arange(self.nspin)[:,None,None]
+        kpt = np.arange(self.nkpt)[None,:,None]
+        band = np.arange(self.nband)[None,None,:]
+        return 100. * spin + 10. * kpt + band
+
+    def get_kpts(self):
+        return np.array([[.1 * ik, .0, .5] for ik in range(self.nkpt)])
+
+    def write_bandstructure(self):
+        fname = os.path.join(self.tmpdir, 'bandstructure.dat')
+        eigs = self.get_energies()
+        kpts = self.get_kpts()
+        with open(fname, 'w') as f:
+            f.write('# spin band k_x k_y k_z E_MF E_QP Delta_E\n')
+            f.write('#  (Cartesian coordinates) (eV) (eV) (eV)\n')
+            for ispin in range(self.nspin):
+                for iband in range(self.nband):
+                    for ik in range(self.nkpt):
+                        e = eigs[ispin,ik,iband]
+                        f.write('{} {} {:.5f} {:.5f} {:.5f} {} {} {}\n'.format(
+                            ispin + 1, iband + self.ib_min, *kpts[ik],
+                            e, e + .5, .5))
+        return fname
+
+    def write_eqp(self):
+        fname = os.path.join(self.tmpdir, 'eqp.dat')
+        eigs = self.get_energies()
+        kpts = self.get_kpts()
+        with open(fname, 'w') as f:
+            for ik in range(self.nkpt):
+                f.write('{:.9f} {:.9f} {:.9f} {}\n'.format(
+                    *kpts[ik], self.nspin * self.nband))
+                for ispin in range(self.nspin):
+                    for iband in range(self.nband):
+                        e = eigs[ispin,ik,iband]
+                        f.write('{} {} {} {}\n'.format(
+                            ispin + 1, iband + self.ib_min, e, e + .5))
+        return fname
+
+    def check_results(self, results, bands=None, ikpts=None):
+        eigs = self.get_energies()
+        kpts = self.get_kpts()
+        if bands is not None:
+            eigs = eigs[:,:,np.array(bands) - self.ib_min]
+        if ikpts is not None:
+            eigs = eigs[:,ikpts,:]
+            kpts = kpts[ikpts]
+        self.assertEqual(results['nspin'], self.nspin)
+        self.assertEqual(results['eigs_dft_eV'].shape, eigs.shape)
+        self.assertEqual((results['nkpt'], results['nband']), eigs.shape[1:])
+        self.assertTrue(np.allclose(results['eigs_dft_eV'], eigs))
+        self.assertTrue(np.allclose(results['eigs_gw_eV'], eigs + .5))
+        self.assertTrue(np.allclose(results['delta_eigs_eV'], .5))
+        self.assertTrue(np.allclose(results['kpts'], kpts))
+
+    def test_bandstructure(self):
+        """Test reading bandstructure.dat."""
+        fname = self.write_bandstructure()
+        results = extract_inteqp_bandstructure(fname)
+        self.check_results(results)
+        self.assertEqual((results['ib_min'], results['ib_max']), (3, 6))
+
+        results = extract_inteqp_bandstructure(fname, bands=[5, 3],
+                                               ikpts=[4, 1])
+        self.check_results(results, bands=[3, 5], ikpts=[1, 4])
+
+        results = extract_inteqp_bandstructure(fname, dtype=np.float32)
+        self.assertEqual(results['eigs_gw_eV'].dtype, np.float32)
+
+        # Bands outside of the file, below and above.
+        for bands in ([2, 4], [5, 7]):
+            with self.assertRaises(ValueError):
+                extract_inteqp_bandstructure(fname, bands=bands)
+
+    def test_eqp(self):
+        """Test reading eqp.dat."""
+        fname = self.write_eqp()
+        results = extract_inteqp_eqp(fname)
+        self.check_results(results)
+        self.assertEqual((results['ib_min'], results['ib_max']), (3, 6))
+
+        results = extract_inteqp_eqp(fname, bands=[4, 5], ikpts=[0, 2, 3])
+        self.check_results(results, bands=[4, 5], ikpts=[0, 2, 3])
+
+        results = extract_inteqp_eqp(fname, bands=[6], dtype=np.float32)
+        self.check_results(results, bands=[6])
+        self.assertEqual(results['eigs_gw_eV'].dtype, np.float32)
+
+        for bands in ([2, 4], [5, 7]):
+            with self.assertRaises(ValueError):
+                extract_inteqp_eqp(fname, bands=bands)
+
+
+def write_fortran_record(f, *arrays):
+    """Write arrays in a Fortran sequential record."""
+    content = b''.join(np.ascontiguousarray(a).tobytes() for a in arrays)
+    marker = np.array([len(content)], dtype='<i4').tobytes()
+    f.write(marker + content + marker)
+
+
+class TestWfnFile(TestTask):
+    """Test the reader of WFN files in binary format."""
+
+    nspin, nkpt, nband, ng = 1, 2, 3, 7
+    ngk = [4, 5]
+
+    def write_wfn(self):
+        """Write a small complex WFN file in BerkeleyGW binary format."""
+        fname = os.path.join(self.tmpdir, 'WFN')
+        nspin, nkpt, nband = self.nspin, self.nkpt, self.nband
+        rec = write_fortran_record
+        with open(fname, 'wb') as f:
+            rec(f, np.array([b'WFN-Complex', b'01-Jan-2020', b'12:00:00'],
+                            dtype='S32'))
+            rec(f, np.array([nspin, self.ng, 2, 0, 2], dtype='<i4'),
+                np.array([40.], dtype='<f8'),
+                np.array([nkpt, nband, max(self.ngk)], dtype='<i4'),
+                np.array([10.], dtype='<f8'))
+            rec(f, np.array([12, 12, 12, 2, 2, 2], dtype='<i4'),
+                np.array([.5, .5, .5], dtype='<f8'))
+            rec(f, np.arange(20, dtype='<f8'))
+            rec(f, np.arange(20, dtype='<f8') + 100.)
+            mtrx = np.array([np.identity(3), -np.identity(3)], dtype='<i4')
+            mtrx[1,0,1] = 1  # An asymmetric matrix to test the ordering
+            rec(f, mtrx.transpose((0,2,1)))
+            rec(f, np.zeros((2,3), dtype='<f8'))
+            rec(f, np.array([0.,0.,0.]), np.array([31], dtype='<i4'),
+                np.array([.25,.25,.25]), np.array([33], dtype='<i4'))
+            rec(f, np.array(self.ngk, dtype='<i4'))
+            rec(f, np.array([.25, .75], dtype='<f8'))
+            rec(f, np.array([[0.,0.,0.], [0.,0.,.5]], dtype='<f8'))
+            rec(f, np.ones((nspin, nkpt), dtype='<i4'))
+            rec(f, 2 * np.ones((nspin, nkpt), dtype='<i4'))
+            rec(f, self.get_energies())
+            rec(f, np.ones((nspin, nkpt, nband), dtype='<f8'))
+
+            gvecs = np.arange(3 * self.ng, dtype='<i4').reshape((-1,3))
+            self.write_block(f, gvecs)
+            for ik, ngk in enumerate(self.ngk):
+                self.write_block(f, self.get_gvectors(ik))
+                for ib in range(nband):
+                    self.write_block(f, self.get_coefficients(ik)[ib])
+        return fname
+
+    @staticmethod
+    def write_block(f, data):
+        """Write data as BerkeleyGW does, in a single record."""
+        write_fortran_record(f, np.array([1], dtype='<i4'))
+        write_fortran_record(f, np.array([len(data)], dtype='<i4'))
+        write_fortran_record(f, data)
+
+    def get_energies(self):
+        shape = (self.nspin, self.nkpt, self.nband)
+        return np.arange(np.prod(shape), dtype='<f8').reshape(shape)
+
+    def get_gvectors(self, ik):
+        return (np.arange(3 * self.ngk[ik], dtype='<i4') + ik).reshape((-1,3))
+
+    def get_coefficients(self, ik):
+        """Coefficients of all bands at k-point ik, shape (nband, ngk)."""
+        shape = (self.nband, self.ngk[ik])
+        values = np.arange(np.prod(shape)).reshape(shape) + 100 * ik
+        return np.array(values + 1j * values, dtype='<c16')
+
+    def test_header(self):
+        """Test the dimensions and arrays of the header."""
+        from ..extractors import WfnFile
+        wfn = WfnFile(self.write_wfn())
+        self.assertEqual(wfn.format, 'binary')
+        self.assertEqual((wfn.sheader, wfn.flavor), ('WFN', 'complex'))
+        self.assertEqual((wfn.nspin, wfn.nkpt, wfn.nband, wfn.ng),
+                         (self.nspin, self.nkpt, self.nband, self.ng))
+        self.assertEqual(wfn.ecutwfc, 10.)
+        self.assertTrue(np.all(wfn.ngk == self.ngk))
+        self.assertTrue(np.allclose(wfn.kpts, [[0.,0.,0.], [0.,0.,.5]]))
+        self.assertTrue(np.allclose(wfn.energies, self.get_energies()))
+        self.assertTrue(np.all(wfn.atyp == [31, 33]))
+        self.assertTrue(np.allclose(wfn.apos[1], [.25,.25,.25]))
+        self.assertEqual(wfn.mtrx[1,0,1], 1)
+        self.assertEqual(wfn.mtrx[1,1,0], 0)
+        self.assertTrue(np.allclose(wfn.bvec[0], [102., 103., 104.]))
+
+    def test_coefficients(self):
+        """Test the memory-mapped G-vectors and coefficients."""
+        from ..extractors import WfnFile
+        wfn = WfnFile(self.write_wfn())
+        self.assertEqual(wfn.get_gvectors().shape, (self.ng, 3))
+        for ik in range(self.nkpt):
+            gvecs = wfn.get_kpt_gvectors(ik)
+            self.assertTrue(np.all(gvecs == self.get_gvectors(ik)))
+
+            coeffs = wfn.get_coefficients(ik)
+            self.assertEqual(coeffs.shape, (self.nband, 1, self.ngk[ik]))
+            self.assertTrue(np.allclose(coeffs[:,0,:],
+                                        self.get_coefficients(ik)))
+
+        coeffs = wfn.get_coefficients(1, bands=[2, 0])
+        self.assertTrue(np.allclose(coeffs[:,0,:],
+                                    self.get_coefficients(1)[[2, 0]]))
+
+    @unittest.skipIf(h5py is None, 'h5py is not installed')
+    def test_hdf5(self):
+        """Test the reader of WFN files in HDF5 format."""
+        from ..extractors import WfnFile
+        fname = os.path.join(self.tmpdir, 'WFN.h5')
+        nspin, nkpt, nband = self.nspin, self.nkpt, self.nband
+        with h5py.File(fname, 'w') as h5:
+            h5['mf_header/flavor'] = 2
+            kpoints = dict(nspin=nspin, nspinor=1, nrk=nkpt, mnband=nband,
+                ngkmax=max(self.ngk), ecutwfc=10., kgrid=[2,2,2],
+                shift=[.5,.5,.5], ngk=self.ngk, w=[.25,.75],
+                rk=[[0.,0.,0.], [0.,0.,.5]], ifmin=np.ones((nspin, nkpt)),
+                ifmax=2*np.ones((nspin, nkpt)), el=self.get_energies(),
+                occ=np.ones((nspin, nkpt, nband)))
+            gspace = dict(ng=self.ng, ecutrho=40., FFTgrid=[12,12,12],
+                components=np.zeros((self.ng, 3), dtype=int))
+            symmetry = dict(ntran=1, cell_symmetry=0,
+                mtrx=[np.identity(3, dtype=int)], tnp=np.zeros((1,3)))
+            crystal = dict(nat=1, celvol=1., alat=1., recvol=1., blat=1.,
+                avec=np.identity(3), adot=np.identity(3), bvec=np.identity(3),
+                bdot=np.identity(3), apos=np.zeros((1,3)), atyp=[14])
+            for group, values in (('kpoints', kpoints), ('gspace', gspace),
+                                  ('symmetry', symmetry), ('crystal', crystal)):
+                for key, val in values.items():
+                    h5['mf_header/{}/{}'.format(group, key)] = val
+
+            gvecs = np.concatenate([self.get_gvectors(ik)
+                                    for ik in range(nkpt)])
+            coeffs = np.concatenate([self.get_coefficients(ik)
+                                     for ik in range(nkpt)], axis=1)
+            h5['wfns/gvecs'] = gvecs
+            h5['wfns/coeffs'] = np.stack([coeffs.real, coeffs.imag],
+                                         axis=-1)[:,None,:,:]
+
+        wfn = WfnFile(fname)
+        self.assertEqual(wfn.format, 'hdf5')
+        self.assertEqual((wfn.nkpt, wfn.nband), (nkpt, nband))
+        self.assertTrue(np.all(wfn.get_kpt_gvectors(1) == self.get_gvectors(1)))
+        coeffs = wfn.get_coefficients(1, bands=[2, 0])
+        self.assertTrue(np.allclose(coeffs[:,0,:],
+                                    self.get_coefficients(1)[[2, 0]]))
+
+
+@unittest.skipIf(h5py is None, 'h5py is not installed')
+class TestEpsmatFile(TestTask):
+    """Test the reader of epsmat.h5 files."""
+
+    nq, nfreq, nmtx_max, ng = 2, 3, 4, 6
+    nmtx = [3, 4]
+
+    def get_matrix(self, iq, ifreq):
+        """epsinv[G, G'] = iq + 0.1 * ifreq + G + 10j * G'."""
+        g = np.arange(self.nmtx_max)
+        return iq + .1 * ifreq + g[:,None] + 10j * g[None,:]
+
+    def write_epsmat(self, basename='epsmat.h5', iqs=(0, 1)):
+        """Write the file for a subset of the q-points."""
+        iqs = list(iqs)
+        nq = len(iqs)
+        nmtx = [self.nmtx[iq] for iq in iqs]
+        nmtx_max = max(nmtx)
+        fname = os.path.join(self.tmpdir, basename)
+        with h5py.File(fname, 'w') as h5:
+            h5['eps_header/flavor'] = 2
+            h5['eps_header/params/nmatrix'] = 1
+            h5['eps_header/qpoints/nq'] = nq
+            h5['eps_header/qpoints/qpts'] = np.array(
+                [[0.,0.,.5], [0.,.5,.5]])[iqs]
+            h5['eps_header/qpoints/qgrid'] = [2,2,2]
+            h5['eps_header/freqs/nfreq'] = self.nfreq
+            h5['eps_header/freqs/freqs'] = [[0.,0.], [1.,.1], [2.,.1]]
+            h5['eps_header/gspace/nmtx'] = nmtx
+            h5['eps_header/gspace/nmtx_max'] = nmtx_max
+            gind = np.zeros((2, self.ng), dtype=int)
+            gind[0,:3] = [1, 3, 5]
+            gind[1,:4] = [2, 1, 4, 6]
+            h5['eps_header/gspace/gind_eps2rho'] = gind[iqs]
+            h5['mf_header/gspace/ng'] = self.ng
+            h5['mf_header/gspace/components'] = np.arange(3 * self.ng
+                                                          ).reshape((-1,3))
+
+            matrix = np.zeros((nq, 1, self.nfreq, nmtx_max, nmtx_max, 2))
+            for i, iq in enumerate(iqs):
+                for ifreq in range(self.nfreq):
+                    # Stored as [G', G]
+                    epsinv = self.get_matrix(iq, ifreq).T[:nmtx_max,:nmtx_max]
+                    matrix[i,0,ifreq,:,:,0] = epsinv.real
+                    matrix[i,0,ifreq,:,:,1] = epsinv.imag
+            h5.create_dataset('mats/matrix', data=matrix,
+                              chunks=(1, 1, 1, 2, 2, 2))
+        return fname
+
+    def test_header(self):
+        """Test the q-points, frequencies and dimensions."""
+        from ..extractors import EpsmatFile
+        with EpsmatFile(self.write_epsmat()) as epsmat:
+            self.assertEqual((epsmat.nq, epsmat.nfreq), (self.nq, self.nfreq))
+            self.assertTrue(np.all(epsmat.nmtx == self.nmtx))
+            self.assertEqual(epsmat.ng, self.ng)
+            self.assertTrue(np.allclose(epsmat.qpts[1], [0.,.5,.5]))
+            self.assertTrue(np.allclose(epsmat.freqs, [0., 1+.1j, 2+.1j]))
+            self.assertTrue(np.all(epsmat.get_gvectors(0) ==
+                                   [[0,1,2], [6,7,8], [12,13,14]]))
+
+    def test_matrix(self):
+        """Test the blocks of the inverse dielectric matrix."""
+        from ..extractors import EpsmatFile
+        with EpsmatFile(self.write_epsmat()) as epsmat:
+            expected = self.get_matrix(1, 2)
+            epsinv = epsmat.get_matrix(1, 2)
+            self.assertTrue(np.allclose(epsinv, expected))
+
+            epsinv = epsmat.get_matrix(1, 2, rows=slice(1,3), cols=slice(2,4))
+            self.assertTrue(np.allclose(epsinv, expected[1:3,2:4]))
+
+            # The matrix of the first q-point is smaller
+            self.assertEqual(epsmat.get_matrix(0).shape, (3, 3))
+
+            blocks = list(epsmat.iter_matrix(1, 2, chunksize=3))
+            self.assertEqual([b[1].shape for b in blocks], [(4, 3), (4, 1)])
+            self.assertTrue(np.allclose(np.hstack([b[1] for b in blocks]),
+                                        expected))
+
+            diagonal = epsmat.get_diagonal(1, 2, chunksize=3)
+            self.assertTrue(np.allclose(diagonal, np.diagonal(expected)))
+
+    def test_merge(self):
+        """Test the merge of files computed for different q-points."""
+        from ..extractors import EpsmatFile, merge_epsmat_files
+        fnames = [self.write_epsmat('epsmat_001.h5', iqs=[0]),
+                  self.write_epsmat('epsmat_002.h5', iqs=[1])]
+        fname = os.path.join(self.tmpdir, 'epsmat.h5')
+        merge_epsmat_files(fnames, fname)
+        self.assertFalse(os.path.exists(fname + '.tmp'))
+
+        with EpsmatFile(fname) as epsmat:
+            self.assertEqual((epsmat.nq, epsmat.nmtx_max), (2, self.nmtx_max))
+            self.assertTrue(np.all(epsmat.nmtx == self.nmtx))
+            self.assertTrue(np.allclose(epsmat.qpts, [[0.,0.,.5], [0.,.5,.5]]))
+            self.assertTrue(np.all(epsmat.get_gvectors(1) ==
+                                   [[3,4,5], [0,1,2], [9,10,11], [15,16,17]]))
+            for iq in range(2):
+                nmtx = self.nmtx[iq]
+                self.assertTrue(np.allclose(epsmat.get_matrix(iq, 2),
+                                self.get_matrix(iq, 2)[:nmtx,:nmtx]))
+
+    def test_merge_inconsistent(self):
+        """Test that files with different grids are not merged."""
+        from ..extractors import merge_epsmat_files
+        fnames = [self.write_epsmat('epsmat_001.h5', iqs=[0]),
+                  self.write_epsmat('epsmat_002.h5', iqs=[1])]
+        with h5py.File(fnames[1], 'a') as h5:
+            h5['eps_header/qpoints/qgrid'][()] = [4,4,4]
+        with self.assertRaises(Exception):
+            merge_epsmat_files(fnames, os.path.join(self.tmpdir, 'epsmat.h5'))
+
+
+# Truncated timing reports of epsilon.x, kernel.x, pw.x and abinit.
+epsilon_timing = """\
+ Writing dielectric matrix to file
+ Ok
+
+
+                              CPU (s)        WALL (s)           #
+
+INPUT:                          0.020           0.027           1
+INPUT(Q) I/O                    0.001           0.001         102
+MTXEL (FFT):                    0.059           0.061         104
+CHI SUM (TOTAL):                0.057           0.056           3
+EPSINV (I/O)                    0.014           0.013           3
+
+TOTAL:                          0.205           0.213
+"""
+
+kernel_timing = """\
+                             CPU (s)        WALL (s)          #
+
+ INPUT:          (min.)        0.003           0.006          1
+                 (PE 0)        0.003           0.007
+                 (max.)        0.004           0.008
+ MTXEL COMM:     (min.)        0.016           0.023         64
+                 (PE 0)        0.016           0.023
+                 (max.)        0.029           0.031
+
+ TOTAL:          (min.)        0.450           0.457
+                 (PE 0)        0.450           0.457
+                 (max.)        0.451           0.459
+"""
+
+pw_timing = """\
+     init_run     :      0.06s CPU      0.06s WALL (       1 calls)
+     electrons    :   1m47.23s CPU   1m55.85s WALL (       1 calls)
+
+     Called by electrons:
+     c_bands      :      0.06s CPU      0.06s WALL (      14 calls)
+
+     PWSCF        :  1h 2m CPU         1h 3m WALL
+
+
+   This run was terminated on:  14:20:02  18Oct2026
+"""
+
+abinit_timing = """\
+- For major independent code sections, cpu and wall times (sec),
+-  as well as % of the time and number of calls for node 0
+
+- routine                        cpu     %       wall     %      number of calls  Gflops    Speedup Efficacity
+-                                                                  (-1=no count)
+- fourwf%(pot)                 0.396  10.1      0.397  10.1           1296      -1.00        1.00       1.00
+- others (120)                 0.104   2.7      0.106   2.7             -1      -1.00        0.98       0.98
+-<END_TIMER>
+-
+- subtotal                     0.500  12.8      0.503  12.8                                  0.99       0.99
+
+ Calculation completed.
+.Delivered   0 WARNINGs and   0 COMMENTs to log file.
++Overall time at end (sec) : cpu=          3.9  wall=          4.0
+"""
+
+
+class TestTiming(TestTask):
+    """Test the extraction of the timing reports."""
+
+    def test_bgw(self):
+        """Test the timing table of a BerkeleyGW calculation."""
+        from ..extractors import read_bgw_timing
+        timing = read_bgw_timing(io.StringIO(epsilon_timing))
+        self.assertEqual(list(timing), ['INPUT', 'INPUT(Q) I/O', 'MTXEL (FFT)',
+                                        'CHI SUM (TOTAL)', 'EPSINV (I/O)',
+                                        'TOTAL'])
+        self.assertEqual(dict(timing['INPUT(Q) I/O']),
+                         dict(cpu=.001, wall=.001, ncalls=102))
+        self.assertEqual(timing['TOTAL']['wall'], .213)
+        self.assertIsNone(timing['TOTAL']['ncalls'])
+
+        # Not completed.
+        self.assertEqual(read_bgw_timing(io.StringIO(sigma_output)), {})
+
+    def test_bgw_processes(self):
+        """Test a timing table with the times of several processes."""
+        from ..extractors import read_bgw_timing
+        fname = os.path.join(self.tmpdir, 'kernel.out.gz')
+        with gzip.open(fname, 'wt') as f:
+            f.write(kernel_timing)
+        timing = read_bgw_timing(fname)
+        self.assertEqual(list(timing), ['INPUT', 'MTXEL COMM', 'TOTAL'])
+        self.assertEqual(dict(timing['INPUT']), dict(
+            cpu=.003, wall=.007, ncalls=1, cpu_min=.003, wall_min=.006,
+            cpu_max=.004, wall_max=.008))
+        self.assertEqual(timing['TOTAL']['wall_max'], .459)
+
+    def test_qe(self):
+        """Test the timing report of pw.x."""
+        from ..extractors import read_qe_timing
+        timing = read_qe_timing(io.StringIO(pw_timing))
+        self.assertEqual(list(timing),
+                         ['init_run', 'electrons', 'c_bands', 'PWSCF'])
+        self.assertTrue(np.isclose(timing['electrons']['wall'], 115.85))
+        self.assertEqual(timing['c_bands']['ncalls'], 14)
+        self.assertEqual(dict(timing['PWSCF']),
+                         dict(cpu=3720., wall=3780., ncalls=None))
+
+    def test_abinit(self):
+        """Test the timing summary of abinit."""
+        from ..extractors import read_abinit_timing
+        timing = read_abinit_timing(io.StringIO(abinit_timing))
+        self.assertEqual(list(timing),
+                         ['Overall', 'fourwf%(pot)', 'others (120)'])
+        self.assertEqual(dict(timing['Overall']),
+                         dict(cpu=3.9, wall=4.0, ncalls=None))
+        self.assertEqual(dict(timing['fourwf%(pot)']),
+                         dict(cpu=.396, wall=.397, ncalls=1296))
+        self.assertEqual(timing['others (120)']['ncalls'], -1)
@@ -1,11 +1,26 @@
 from __future__ import print_function
+import io
 import os
+import sys
+import time
+import unittest
 from copy import copy
+from collections import OrderedDict
+from unittest import mock
 
+import numpy as np
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from . import TestTask
 from .test_BGW_tasks import TestBGWTasksMaker
 
 from .. import data
 from .. import Structure, GWFlow, BSEFlow
+from .. import ShardedEpsilonFlow, ShardedSigmaFlow, BandConvergenceFlow
+from .. import SweepFlow
 
 class TestFlows(TestBGWTasksMaker):
 
@@ -60,3 +75,350 @@ class TestFlows(TestBGWTasksMaker):
         for task in flow.tasks:
             self.assertCompleted(task)
         
+
+
+def get_script(basename):
+    return '{} {}'.format(sys.executable, os.path.join(
+        os.path.dirname(__file__), '..', 'scripts', basename))
+
+def run_merge_task(task):
+    """Run a task calling a script which imports BGWpy."""
+    # BGWpy might not be installed.
+    topdir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    with mock.patch.dict(os.environ, PYTHONPATH=topdir):
+        return task.run()
+
+
+class TestShardedEpsilonFlow(TestTask):
+    """Test the split of the q-points of epsilon and the merge."""
+
+    def get_flow(self):
+        return ShardedEpsilonFlow(
+            dirname = os.path.join(self.tmpdir, 'Epsilon'),
+            structure = TestBGWTasksMaker.common_kwargs['structure'],
+            ngkpt = [2,2,2],
+            qshift = [.001,.0,.0],
+            ecuteps = 5.0,
+            wfn_fname = os.path.join(self.tmpdir, 'Wfn', 'wfn.cplx'),
+            wfnq_fname = os.path.join(self.tmpdir, 'Wfnq', 'wfn.cplx'),
+            kgrid_backend = 'numpy',
+            nshards = 2,
+            shard_kwargs = [dict(nproc=4), dict(nproc=2)],
+            merge_executable = get_script('BGWpy_merge_epsmat.py'),
+            )
+
+    def test_shards(self):
+        """Test the q-points and MPI layout of each shard."""
+        flow = self.get_flow()
+        first, second = flow.epsilontasks
+
+        # The 2x2x2 grid of GaAs has 3 irreducible q-points.
+        self.assertEqual(len(first.input.qpts), 1)
+        self.assertEqual(len(second.input.qpts), 1)
+        self.assertIn(' 1.0 1\n', str(first.input))
+        self.assertNotIn(' 1.0 1\n', str(second.input))
+        self.assertEqual((first.nproc, second.nproc), (4, 2))
+
+        graph = flow.get_graph()
+        self.assertEqual(graph.get_dependencies(flow.mergetask),
+                         [first, second])
+
+    @unittest.skipIf(h5py is None, 'h5py is not installed')
+    def test_merge(self):
+        """Test the merge of the epsmat.h5 files of the shards."""
+        flow = self.get_flow()
+        flow.write()
+        for i, task in enumerate(flow.epsilontasks):
+            with h5py.File(task.epsmat_fname, 'w') as h5:
+                h5['eps_header/qpoints/nq'] = 1
+                h5['eps_header/qpoints/qpts'] = task.input.qpts
+                h5['eps_header/qpoints/qgrid'] = [2,2,2]
+                h5['eps_header/gspace/nmtx'] = [i + 1]
+                h5['eps_header/gspace/nmtx_max'] = i + 1
+                h5['mats/matrix'] = np.full((1,1,1,i+1,i+1,2), i + 1.)
+
+        self.assertEqual(run_merge_task(flow.mergetask), 0)
+        self.assertCompleted(flow.mergetask)
+
+        with h5py.File(flow.epsmat_fname, 'r') as h5:
+            self.assertEqual(h5['eps_header/qpoints/nq'][()], 2)
+            self.assertEqual(h5['eps_header/gspace/nmtx_max'][()], 2)
+            self.assertTrue(np.all(h5['eps_header/gspace/nmtx'][()] == [1,2]))
+            self.assertEqual(h5['mats/matrix'].shape, (2,1,1,2,2,2))
+            self.assertTrue(np.all(h5['mats/matrix'][0,0,0,:,:,0] ==
+                                   [[1.,0.], [0.,0.]]))
+
+
+    def test_report(self):
+        """Test the status of the merge when checking the file times."""
+        flow = self.get_flow()
+        flow.write()
+        report = io.StringIO()
+        flow.report(file=report, check_time=True)
+        self.assertIn('Unstarted', report.getvalue())
+
+        for task in flow.epsilontasks:
+            open(task.epsmat_fname, 'w').close()
+        open(flow.epsmat_fname, 'w').close()
+        self.assertEqual(flow.mergetask.get_status(check_time=True),
+                         flow.mergetask._STATUS_COMPLETED)
+
+        later = time.time() + 10
+        os.utime(flow.epsilontasks[1].epsmat_fname, (later, later))
+        self.assertEqual(flow.mergetask.get_status(check_time=True),
+                         flow.mergetask._STATUS_UNSTARTED)
+        self.assertEqual(flow.mergetask.get_status(),
+                         flow.mergetask._STATUS_COMPLETED)
+
+
+class TestShardedSigmaFlow(TestTask):
+    """Test the split of the k-points of sigma and the merge."""
+
+    kpts = [[0.,0.,0.], [0.,0.,.5], [0.,.5,.5]]
+
+    def get_flow(self):
+        epsilon_dirname = os.path.join(self.tmpdir, 'Epsilon')
+        return ShardedSigmaFlow(
+            dirname = os.path.join(self.tmpdir, 'Sigma'),
+            ibnd_min = 1,
+            ibnd_max = 2,
+            kpts = self.kpts,
+            wfn_co_fname = os.path.join(self.tmpdir, 'Wfn', 'wfn.cplx'),
+            rho_fname = os.path.join(self.tmpdir, 'Wfn', 'rho.real'),
+            vxc_fname = os.path.join(self.tmpdir, 'Wfn', 'vxc.real'),
+            eps0mat_fname = os.path.join(epsilon_dirname, 'eps0mat.h5'),
+            epsmat_fname = os.path.join(epsilon_dirname, 'epsmat.h5'),
+            nshards = 2,
+            shard_kwargs = [dict(nproc=4), dict(nproc=2)],
+            merge_executable = get_script('BGWpy_merge_sigma_hp.py'),
+            )
+
+    def test_shards(self):
+        """Test the k-points and links of each shard."""
+        flow = self.get_flow()
+        first, second = flow.sigmatasks
+        self.assertEqual(first.input.kpts, self.kpts[:2])
+        self.assertEqual(second.input.kpts, self.kpts[2:])
+        self.assertEqual(flow.kpts, self.kpts)
+        self.assertEqual((first.nproc, second.nproc), (4, 2))
+        for task in flow.sigmatasks:
+            self.assertIn(['../../Epsilon/epsmat.h5', 'epsmat.h5'],
+                          task.runscript.links)
+
+        graph = flow.get_graph()
+        self.assertEqual(graph.get_dependencies(flow.mergetask),
+                         [first, second])
+
+    def test_merge(self):
+        """Test the merge of the eqp and sigma_hp.log files."""
+        flow = self.get_flow()
+        flow.write()
+        for task in flow.sigmatasks:
+            nkpt = len(task.input.kpts)
+            eqp = ''.join('{:13.9f}{:13.9f}{:13.9f}{:8}\n'.format(
+                          *(k + [1])) + '       1       1    -1.0    -2.0\n'
+                          for k in task.input.kpts)
+            for fname in (task.eqp0_fname, task.eqp1_fname):
+                with open(fname, 'w') as f:
+                    f.write(eqp)
+            with open(task.sigma_fname, 'w') as f:
+                f.write('  header {}\n\n'.format(task.dirname))
+                for ik, k in enumerate(task.input.kpts):
+                    f.write('       k ={:10.6f}{:10.6f}{:10.6f} ik ={:4}'
+                            ' spin = 1\n\n'.format(*(k + [ik + 1])))
+                    f.write('   n   Emf\n   1  -1.0\n\n')
+
+        self.assertEqual(run_merge_task(flow.mergetask), 0)
+        self.assertCompleted(flow.mergetask)
+
+        with open(flow.eqp1_fname, 'r') as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(np.allclose([float(x) for x in lines[4].split()[:3]],
+                                    self.kpts[2]))
+
+        with open(flow.sigma_fname, 'r') as f:
+            content = f.read()
+        self.assertEqual(content.count('header'), 1)
+        self.assertIn(flow.sigmatasks[0].dirname, content)
+        self.assertEqual(content.count(' ik =   3 spin'), 1)
+        self.assertIn('  0.000000  0.500000  0.500000 ik =   3', content)
+
+
+    def test_report(self):
+        """Test the status of the merge when checking the file times."""
+        flow = self.get_flow()
+        flow.write()
+        report = io.StringIO()
+        flow.report(file=report, check_time=True)
+        self.assertIn('Unstarted', report.getvalue())
+
+        for task in flow.sigmatasks:
+            open(task.sigma_fname, 'w').close()
+        open(flow.sigma_fname, 'w').close()
+        self.assertEqual(flow.mergetask.get_status(check_time=True),
+                         flow.mergetask._STATUS_COMPLETED)
+
+        later = time.time() + 10
+        os.utime(flow.sigmatasks[0].sigma_fname, (later, later))
+        self.assertEqual(flow.mergetask.get_status(check_time=True),
+                         flow.mergetask._STATUS_UNSTARTED)
+
+
+class TestBandConvergenceFlow(TestTask):
+    """Test the variants of a band convergence study."""
+
+    def get_flow(self):
+        dft_dirname = os.path.join(self.tmpdir, 'DFT')
+        return BandConvergenceFlow(
+            dirname = os.path.join(self.tmpdir, 'Convergence'),
+            structure = TestBGWTasksMaker.common_kwargs['structure'],
+            dft_flavor = 'abinit',
+            ngkpt = [2,2,2],
+            qshift = [.001,.0,.0],
+            ecuteps = 5.0,
+            ibnd_min = 1,
+            ibnd_max = 8,
+            nbnd_values = [20, 40],
+            ecuteps_values = [5.0, 10.0],
+            kgrid_backend = 'numpy',
+            charge_density_fname = os.path.join(dft_dirname, 'out_DEN'),
+            vxc_fname = os.path.join(dft_dirname, 'vxc.real'),
+            wfn_fname = os.path.join(dft_dirname, 'wfn.cplx'),
+            wfnq_fname = os.path.join(dft_dirname, 'wfnq.cplx'),
+            wfn_co_fname = os.path.join(dft_dirname, 'wfn_co.cplx'),
+            rho_fname = os.path.join(dft_dirname, 'rho.real'),
+            )
+
+    def test_variants(self):
+        """Test the bands, cutoffs and dependencies of each variant."""
+        flow = self.get_flow()
+        self.assertEqual(flow.variants,
+                         [(20, 5.0), (20, 10.0), (40, 5.0), (40, 10.0)])
+
+        for (nbnd, ecuteps), epsilontask, sigmatask in zip(
+                flow.variants, flow.epsilontasks, flow.sigmatasks):
+            self.assertEqual(epsilontask.input['number_bands'], nbnd)
+            self.assertEqual(epsilontask.input['epsilon_cutoff'], ecuteps)
+            self.assertEqual(sigmatask.input['number_bands'], nbnd)
+            self.assertIn(['../../../DFT/wfn.cplx', 'WFN'],
+                          epsilontask.runscript.links)
+
+        # The variants only depend on the wavefunctions.
+        graph = flow.get_graph()
+        for epsilontask, sigmatask in zip(flow.epsilontasks, flow.sigmatasks):
+            self.assertEqual(graph.get_dependencies(epsilontask), [])
+            self.assertEqual(graph.get_dependencies(sigmatask), [epsilontask])
+
+
+class TestSweepFlow(TestTask):
+    """Test the deduplication of the tasks of a parameter sweep."""
+
+    def get_flow(self):
+        dft_dirname = os.path.join(self.tmpdir, 'DFT')
+        return SweepFlow(
+            dirname = os.path.join(self.tmpdir, 'Sweep'),
+            parameters = OrderedDict(ecuteps=[5.0, 10.0], ibnd_max=[4, 8]),
+            structure = TestBGWTasksMaker.common_kwargs['structure'],
+            dft_flavor = 'abinit',
+            ngkpt = [2,2,2],
+            qshift = [.001,.0,.0],
+            nbnd = 20,
+            ibnd_min = 1,
+            kgrid_backend = 'numpy',
+            charge_density_fname = os.path.join(dft_dirname, 'out_DEN'),
+            vxc_fname = os.path.join(dft_dirname, 'vxc.real'),
+            wfn_fname = os.path.join(dft_dirname, 'wfn.cplx'),
+            wfnq_fname = os.path.join(dft_dirname, 'wfnq.cplx'),
+            wfn_co_fname = os.path.join(dft_dirname, 'wfn_co.cplx'),
+            rho_fname = os.path.join(dft_dirname, 'rho.real'),
+            )
+
+    def test_duplicates(self):
+        """Test that epsilon is computed once per cutoff."""
+        flow = self.get_flow()
+        self.assertEqual(len(flow.flows), 4)
+        self.assertEqual(len(flow.tasks), 6)
+
+        for point, subflow in zip(flow.points, flow.flows):
+            self.assertIn(subflow.sigmatask, flow.tasks)
+            if point['ibnd_max'] == 8:
+                self.assertNotIn(subflow.epsilontask, flow.tasks)
+                self.assertIn(['../../ecuteps-{}_ibnd_max-4/11-epsilon/'
+                               'epsmat.h5'.format(point['ecuteps']),
+                               'epsmat.h5'], subflow.sigmatask.runscript.links)
+
+        graph = flow.get_graph()
+        for i in (1, 3):
+            self.assertEqual(graph.get_dependencies(flow.flows[i].sigmatask),
+                             [flow.flows[i-1].epsilontask])
+
+        flow.write()
+        duplicate = os.path.join(flow.flows[1].dirname, '11-epsilon')
+        self.assertTrue(os.path.islink(duplicate))
+        self.assertTrue(os.path.exists(
+            os.path.join(duplicate, 'epsilon.inp')))
+
+
+class TestChunkedWfn(TestTask):
+    """Test the chunks of k-points and the merge of the wavefunctions."""
+
+    def test_kpt_range(self):
+        """Test the k-points of a chunk of the grid."""
+        from ..DFT import DFTTask
+        kwargs = dict(ngkpt=[2,2,2], kshift=[.5,.5,.5], symkpt=False,
+                      structure=TestBGWTasksMaker.common_kwargs['structure'])
+        task = DFTTask(os.path.join(self.tmpdir, 'DFT'), **kwargs)
+        kpts, wtks = task.get_kpts(**kwargs)
+        chunk, wtks_chunk = task.get_kpts(kpt_range=(3, 6), **kwargs)
+        self.assertTrue(np.allclose(chunk, kpts[3:6]))
+        self.assertEqual(len(wtks_chunk), 3)
+
+    def test_wfnmerge(self):
+        """Test the input and links of wfnmerge.x."""
+        from .. import WfnMergeTask
+        kpts = [[0.,0.,0.], [0.,0.,.5], [0.,.5,.5]]
+        task = WfnMergeTask(
+            dirname = os.path.join(self.tmpdir, 'Wfn'),
+            wfn_fnames = [os.path.join(self.tmpdir, 'Wfn', d, 'wfn.cplx')
+                          for d in ('chunk-01', 'chunk-02')],
+            kpts = kpts,
+            wtks = [.25, .25, .5],
+            )
+        lines = str(task.input).splitlines()
+        self.assertEqual(lines[:5],
+                         ['wfn.cplx.tmp', '3', '2', 'WFN_001', 'WFN_002'])
+        self.assertTrue(np.allclose([float(x) for x in lines[7].split()],
+                                    [0., .5, .5, .5]))
+        self.assertIn(['chunk-02/wfn.cplx', 'WFN_002'], task.runscript.links)
+        self.assertEqual(task.wfn_fname,
+                         os.path.join(self.tmpdir, 'Wfn', 'wfn.cplx'))
+
+    def test_report(self):
+        """Test the status of the merge when checking the file times."""
+        from .. import WfnMergeTask
+        dirname = os.path.join(self.tmpdir, 'Wfn')
+        task = WfnMergeTask(
+            dirname = dirname,
+            wfn_fnames = [os.path.join(dirname, d, 'wfn.cplx')
+                          for d in ('chunk-01', 'chunk-02')],
+            kpts = [[0.,0.,0.], [0.,0.,.5]],
+            wtks = [.5, .5],
+            )
+        task.write()
+        report = io.StringIO()
+        task.report(file=report, check_time=True)
+        self.assertIn('Unstarted', report.getvalue())
+
+        for d in ('chunk-01', 'chunk-02'):
+            os.makedirs(os.path.join(dirname, d))
+            open(os.path.join(dirname, d, 'wfn.cplx'), 'w').close()
+        open(task.wfn_fname, 'w').close()
+        self.assertEqual(task.get_status(check_time=True),
+                         task._STATUS_COMPLETED)
+
+        later = time.time() + 10
+        os.utime(os.path.join(dirname, 'chunk-02', 'wfn.cplx'), (later, later))
+        self.assertEqual(task.get_status(check_time=True),
+                         task._STATUS_UNSTARTED)
@@ -0,0 +1,168 @@
+from __future__ import print_function
+import os
+
+import numpy as np
+
+from . import TestTask
+
+from .. import data
+from .. import Structure
+from ..BGW import KgridTask, get_kpt_grid_nosym, iter_kpt_grid_nosym
+
+class TestKgridCache(TestTask):
+    """Test the cache of kgrid.x results."""
+
+    structure = Structure.from_file(data.structure_GaAs)
+
+    def get_kgridtask(self, **kwargs):
+        kwargs.setdefault('ngkpt', [2,2,2])
+        kwargs.setdefault('kshift', [.5,.5,.5])
+        return KgridTask(
+            structure = self.structure,
+            executable = 'this-is-not-kgrid.x',
+            dirname = os.path.join(self.tmpdir, 'Kgrid'),
+            use_cache = True,
+            cache_dir = os.path.join(self.tmpdir, 'cache'),
+            kgrid_backend = 'kgrid.x',
+            **kwargs)
+
+    def test_cache_hit(self):
+        """Test that cached results are returned without running kgrid.x."""
+        kpoints = [[.25,.25,.25], [.25,.25,.75], [.25,.75,.75], [.75,.75,.75]]
+        weights = [1., 3., 3., 1.]
+        syms = np.identity(3, dtype=int).reshape((1,9))
+        taus = np.zeros((1,3))
+
+        task = self.get_kgridtask()
+        task.write_cache((kpoints, weights), (syms, taus))
+        assert os.path.exists(task.cache_fname)
+        KgridTask._memory_cache.clear()
+
+        task = self.get_kgridtask()
+        self.assertEqual(task.get_kpoints(), (kpoints, weights))
+        read_syms, read_taus = task.get_symmetries()
+        self.assertTrue(np.all(read_syms == syms))
+        self.assertTrue(np.allclose(read_taus, taus))
+
+    def test_cache_miss(self):
+        """Test that a different grid is not found in the cache."""
+        task = self.get_kgridtask()
+        task.write_cache(([[0.,0.,0.]], [1.]),
+                         (np.identity(3, dtype=int).reshape((1,9)), np.zeros((1,3))))
+
+        task = self.get_kgridtask(kshift=[.0,.0,.0])
+        self.assertIsNone(task.read_cache())
+        with self.assertRaises(OSError):
+            task.get_kpoints()
+
+
+class TestKgridNumpy(TestTask):
+    """Test the numpy backend against kgrid.x results for GaAs."""
+
+    structure = Structure.from_file(data.structure_GaAs)
+
+    def get_kgridtask(self, **kwargs):
+        kwargs.setdefault('ngkpt', [2,2,2])
+        return KgridTask(
+            structure = self.structure,
+            executable = 'this-is-not-kgrid.x',
+            dirname = os.path.join(self.tmpdir, 'Kgrid'),
+            kgrid_backend = 'numpy',
+            **kwargs)
+
+    def test_shifted_grid(self):
+        """Test the irreducible points of a shifted grid."""
+        task = self.get_kgridtask(kshift=[.5,.5,.5])
+        kpoints, weights = task.get_kpoints()
+        self.assertEqual(kpoints, [[.25,.25,.25], [.25,.25,.75],
+                                   [.25,.75,.75], [.75,.75,.75]])
+        self.assertEqual(weights, [1., 3., 3., 1.])
+
+    def test_unshifted_grid(self):
+        """Test the irreducible points of an unshifted grid."""
+        task = self.get_kgridtask(kshift=[.0,.0,.0])
+        kpoints, weights = task.get_kpoints()
+        self.assertEqual(kpoints, [[.0,.0,.0], [.0,.0,.5], [.0,.5,.5]])
+        self.assertEqual(weights, [1., 4., 3.])
+
+    def test_anisotropic_shifted_grid(self):
+        """Test that only the operations mapping the grid onto itself are used."""
+        task = self.get_kgridtask(ngkpt=[2,2,1], kshift=[.5,.5,.0])
+        self.assertEqual(len(task.get_kpoint_operations()), 24)
+        ops = task.get_grid_operations()
+        self.assertEqual(len(ops), 4)
+
+        # The operations form a group.
+        keys = set(tuple(op.ravel()) for op in ops)
+        for a in ops:
+            for b in ops:
+                self.assertIn(tuple(np.dot(a, b).ravel()), keys)
+
+        # As given by kgrid.x, where [.25,.25,0] and [.75,.75,0]
+        # are not equivalent although a rotation relates them.
+        kpoints, weights = task.get_kpoints()
+        self.assertEqual(kpoints, [[.25,.25,.0], [.25,.75,.0], [.75,.75,.0]])
+        self.assertEqual(weights, [1., 2., 1.])
+
+    def test_qshifted_grid(self):
+        """Test the irreducible points of a grid shifted by a small q."""
+        qshift = [.001,.0,.0]
+        reference = [
+            ([0.001, 0.50, 0.25], 6.), ([0.251, 0.00, 0.00], 1.),
+            ([0.251, 0.25, 0.25], 3.), ([0.251, 0.25, 0.75], 6.),
+            ([0.251, 0.50, 0.00], 3.), ([0.251, 0.75, 0.75], 3.),
+            ([0.501, 0.00, 0.75], 3.), ([0.751, 0.00, 0.00], 1.),
+            ([0.751, 0.00, 0.50], 3.), ([0.751, 0.75, 0.75], 3.),
+            ]
+        task = self.get_kgridtask(kshift=[.5,.5,.5], qshift=qshift)
+        kpoints, weights = task.get_kpoints()
+        self.assertEqual(len(kpoints), len(reference))
+        self.assertEqual(sum(weights), 32.)
+
+        # The representatives may differ from those of kgrid.x,
+        # but each one must be equivalent to a point with the same weight.
+        ops = task.get_kpoint_operations()
+        little = [op for op in ops if np.allclose(np.dot(op, qshift), qshift)]
+        allpoints = np.array(kpoints + [k for k, w in reference]) - qshift
+        irep = task.find_representatives(allpoints, np.array(little))
+        self.assertEqual(sorted(irep[len(kpoints):]), list(range(len(kpoints))))
+        for i, (k, w) in enumerate(reference):
+            self.assertEqual(weights[irep[len(kpoints) + i]], w)
+
+    def test_symmetries(self):
+        """Test the symmetries in the convention of kgrid.x."""
+        task = self.get_kgridtask()
+        syms, taus = task.get_symmetries()
+        self.assertEqual(syms.shape, (24, 9))
+        self.assertTrue(np.allclose(taus, 0.))
+
+        # Convert to abinit convention, as done by AbinitTask.
+        symrel = np.linalg.inv(syms.reshape((-1,3,3)).transpose((0,2,1)))
+        symrel = np.rint(symrel).astype(int).tolist()
+        for sym in ([[1,0,0],[0,1,0],[0,0,1]],
+                    [[1,0,-1],[0,1,-1],[0,0,-1]],
+                    [[0,1,-1],[0,0,-1],[1,0,-1]]):
+            self.assertIn(sym, symrel)
+
+
+class TestKgridNosym(TestTask):
+    """Test the k-point grids generated without symmetry."""
+
+    def test_grid_order(self):
+        """Test that the last index runs fastest."""
+        kpts, wtks = get_kpt_grid_nosym([2,3,4], kshift=[.5,.5,.5],
+                                        qshift=[.001,.0,.0])
+        self.assertEqual(kpts.shape, (24, 3))
+        self.assertTrue(np.allclose(kpts[1], [.251, 1./6, 3./8]))
+        self.assertTrue(np.allclose(kpts[4], [.251, .5, 1./8]))
+        self.assertTrue(np.allclose(kpts[-1], [.751, 5./6, 7./8]))
+        self.assertTrue(np.all(wtks == 1.))
+
+    def test_chunks(self):
+        """Test that the chunks reproduce the full grid."""
+        kpts, wtks = get_kpt_grid_nosym([3,3,3], kshift=[.5,.0,.0])
+        chunks = list(iter_kpt_grid_nosym([3,3,3], kshift=[.5,.0,.0],
+                                          chunksize=10))
+        self.assertEqual([len(c[0]) for c in chunks], [10, 10, 7])
+        self.assertTrue(np.all(np.concatenate([c[0] for c in chunks]) == kpts))
+        self.assertTrue(np.all(np.concatenate([c[1] for c in chunks]) == wtks))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Benchmark the parser of sigma.out on a synthetic output
+with a large number of k-points.
+
+Usage:
+    python benchmark_sigma_output.py [nkpt] [nband] [nspin]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+from BGWpy.extractors import parse_sigma_output
+
+
+def write_synthetic_sigma_output(fname, nkpt=10000, nband=16, nspin=1):
+    """Write a sigma.out file with random values."""
+    rng = np.random.RandomState(0)
+    sep = 80 * '=' + '\n'
+    labels = ('     n      Emf       Eo      Vxc        X      Cor'
+              '     Eqp0     Eqp1      Znk\n')
+    row = '{:6d}' + 8 * ' {:8.3f}' + '\n'
+    with open(fname, 'w') as f:
+        for ik in range(1, nkpt + 1):
+            k = rng.rand(3)
+            f.write(sep)
+            f.write(' 00:00:00   Dealing with k = {:9.6f} {:9.6f} {:9.6f}'
+                    .format(*k) + '{:18d} / {}\n'.format(ik, nkpt))
+            f.write(sep + '\n')
+            f.write(' Symmetrized values from band-averaging:\n\n')
+            for ispin in range(1, nspin + 1):
+                f.write('       k = {:9.6f} {:9.6f} {:9.6f}'.format(*k) +
+                        ' ik = {:3d} spin = {}\n\n'.format(ik, ispin))
+                f.write(labels)
+                values = rng.uniform(-20, 20, (nband, 8))
+                for n in range(nband):
+                    f.write(row.format(n + 1, *values[n]))
+                f.write('\n')
+        f.write(sep)
+
+
+def main(nkpt=10000, nband=16, nspin=1):
+    tmpdir = tempfile.mkdtemp()
+    fname = os.path.join(tmpdir, 'sigma.out')
+    write_synthetic_sigma_output(fname, nkpt, nband, nspin)
+    size = os.path.getsize(fname) / 1024.**2
+
+    start = time.time()
+    results = parse_sigma_output(fname)
+    elapsed = time.time() - start
+
+    assert results['Eqp1'].shape == (nspin, nkpt, nband)
+    print('nkpt = {}, nband = {}, nspin = {} ({:.1f} MB)'.format(
+          nkpt, nband, nspin, size))
+    print('parse_sigma_output: {:.3f} s ({:.1f} MB/s)'.format(
+          elapsed, size / elapsed))
+
+    os.remove(fname)
+    os.rmdir(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])